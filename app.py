@@ -1,11 +1,13 @@
 # app.py
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, Response, stream_with_context
 from database.connection import db
 from services.user_service import UserService
 from services.music_service import MusicService
+from services.listen_writer import listen_writer
 from utils.security import login_required, admin_required
-from database.queries.tracks import GET_TRACKS_FOR_CATALOG, SEARCH_TRACKS_FOR_CATALOG
 import logging
+import csv
+import io
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
@@ -119,44 +121,21 @@ def logout():
 @app.route('/catalog')
 @login_required
 def catalog():
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     search_query = request.args.get('q', '')
     genre_filter = request.args.get('genre', '')
 
     per_page = 6
-    offset = (page - 1) * per_page
 
     try:
-        if search_query:
-            # Поиск треков
-            tracks = db.execute_query(
-                SEARCH_TRACKS_FOR_CATALOG,
-                (f'%{search_query}%', f'%{search_query}%', f'%{search_query}%', per_page, offset)
-            )
-            # Получаем общее количество для пагинации
-            count_query = """
-            SELECT COUNT(*) 
-            FROM tracks t
-            JOIN artists a ON t.artist_id = a.artist_id
-            JOIN albums al ON t.album_id = al.album_id
-            WHERE t.track_title ILIKE %s OR a.artist_name ILIKE %s OR al.album_title ILIKE %s
-            """
-            total_count = \
-            db.execute_query(count_query, (f'%{search_query}%', f'%{search_query}%', f'%{search_query}%'))[0][0]
-        else:
-            # Все треки
-            tracks = db.execute_query(
-                GET_TRACKS_FOR_CATALOG,
-                (per_page, offset)
-            )
-            # Общее количество треков
-            total_count = db.execute_query("SELECT COUNT(*) FROM tracks")[0][0]
+        page = music_service.get_catalog_page(search_query, per_page, cursor)
+        total_count = page['total_count']
 
         total_pages = (total_count + per_page - 1) // per_page
 
         # Преобразуем результат в список словарей для удобства
         tracks_list = []
-        for track in tracks:
+        for track in page['tracks']:
             tracks_list.append({
                 'track_id': track['track_id'],
                 'track_name': track['track_name'],
@@ -171,7 +150,9 @@ def catalog():
 
         return render_template('user/catalog.html',
                                tracks=tracks_list,
-                               current_page=page,
+                               next_cursor=page['next_cursor'],
+                               prev_cursor=page['prev_cursor'],
+                               total_count=total_count,
                                total_pages=total_pages,
                                search_query=search_query,
                                genre_filter=genre_filter)
@@ -180,7 +161,9 @@ def catalog():
         print(f"Error in catalog: {e}")
         return render_template('user/catalog.html',
                                tracks=[],
-                               current_page=1,
+                               next_cursor=None,
+                               prev_cursor=None,
+                               total_count=0,
                                total_pages=1,
                                search_query=search_query,
                                genre_filter=genre_filter)
@@ -208,16 +191,14 @@ def library():
 def statistics():
     """Статистика пользователя"""
     try:
-        user_stats = user_service.get_user_stats(session['user_id'])
-        top_genres = music_service.get_user_top_genres(session['user_id'])
-        top_artists = music_service.get_user_top_artists(session['user_id'])
-        listening_history = music_service.get_listening_history(session['user_id'], limit=20)
+        # Все виджеты страницы - одним запросом
+        stats = music_service.get_statistics(session['user_id'], history_limit=20)
 
         return render_template('user/statistics.html',
-                               user_stats=user_stats or {},
-                               top_genres=top_genres or [],
-                               top_artists=top_artists or [],
-                               listening_history=listening_history or [])
+                               user_stats=stats.user_stats(),
+                               top_genres=stats.top_genres,
+                               top_artists=stats.top_artists,
+                               listening_history=stats.listening_history)
 
     except Exception as e:
         logger.error(f"Error in statistics: {e}")
@@ -241,28 +222,49 @@ def add_to_favorites():
     if not track_id:
         return jsonify({'success': False, 'error': 'No track ID'})
 
-    # Проверяем, не добавлен ли уже трек
-    existing = db.execute_query(
-        "SELECT 1 FROM favorite_tracks WHERE user_id = %s AND track_id = %s",
-        (session['user_id'], track_id),
-        fetch_one=True
-    )
+    # INSERT ... ON CONFLICT DO NOTHING: проверка и вставка одним запросом
+    result = music_service.add_favorite_track(session['user_id'], track_id)
 
-    if existing:
+    if result is None:
+        return jsonify({'success': False, 'error': 'Database error'})
+    if not result:
         return jsonify({'success': False, 'error': 'Already in favorites'})
+    return jsonify({'success': True})
+
+# API endpoints
+@app.route('/api/search')
+@login_required
+def api_search():
+    """Автодополнение поиска (static/assets/js/app.js)"""
+    query = request.args.get('q', '')
+    limit = request.args.get('limit', 10, type=int)
+    return jsonify(music_service.autocomplete(query, limit))
 
-    # Добавляем в избранное
-    result = db.execute_query(
-        "INSERT INTO favorite_tracks (user_id, track_id) VALUES (%s, %s)",
-        (session['user_id'], track_id)
-    )
 
-    if result:
-        return jsonify({'success': True})
-    else:
-        return jsonify({'success': False, 'error': 'Database error'})
+@app.route('/api/recommendations')
+@login_required
+def recommendations():
+    """Рекомендации для текущего пользователя"""
+    limit = request.args.get('limit', 20, type=int)
+    return jsonify(music_service.get_recommendations(session['user_id'], limit))
+
+
+@app.route('/api/track/<int:track_id>/similar')
+@login_required
+def similar_tracks(track_id):
+    """Похожие треки по совместным прослушиваниям"""
+    limit = request.args.get('limit', 20, type=int)
+    return jsonify(music_service.get_similar_tracks(track_id, limit))
+
+
+@app.route('/api/track/<int:track_id>/similar-sounding')
+@login_required
+def similar_sounding_tracks(track_id):
+    """Похожие по звучанию треки (по аудио-характеристикам)"""
+    limit = request.args.get('limit', 20, type=int)
+    return jsonify(music_service.get_similar_sounding_tracks(track_id, limit))
+
 
-# API endpoints
 @app.route('/api/track/<int:track_id>/play')
 @login_required
 def play_track(track_id):
@@ -319,6 +321,61 @@ def create_playlist():
         return jsonify({'success': False, 'error': 'Internal server error'})
 
 
+@app.route('/api/admin/db/pool')
+@admin_required
+def db_pool_stats():
+    """Статистика пула соединений с БД"""
+    return jsonify(db.get_pool_stats())
+
+
+@app.route('/api/admin/db/cache')
+@admin_required
+def db_cache_stats():
+    """Счетчики кэша результатов запросов"""
+    return jsonify(db.get_cache_stats())
+
+
+@app.route('/api/admin/db/queries')
+@admin_required
+def db_query_stats():
+    """Топ-N SQL запросов по суммарному времени (или ?order=calls|max_ms|errors)"""
+    limit = request.args.get('limit', 20, type=int)
+    order_by = request.args.get('order', 'total_ms')
+    if order_by not in ('total_ms', 'calls', 'avg_ms', 'max_ms', 'errors', 'rows', 'slow_calls'):
+        order_by = 'total_ms'
+    return jsonify(db.get_query_stats(limit, order_by))
+
+
+@app.route('/api/admin/listens')
+@admin_required
+def listen_writer_stats():
+    """Очередь фоновой записи прослушиваний: глубина, потери, время записи"""
+    return jsonify(listen_writer.stats())
+
+
+@app.route('/admin/users/export')
+@admin_required
+def export_users():
+    """Выгрузка всех пользователей в CSV (потоково, без загрузки в память)"""
+    columns = ['user_id', 'username', 'email', 'first_name', 'last_name',
+               'role_id', 'date_registered', 'last_login', 'is_active']
+
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction='ignore')
+        writer.writeheader()
+        for user in user_service.iter_all_users():
+            writer.writerow(user)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+        yield buffer.getvalue()
+
+    return Response(stream_with_context(generate()),
+                    mimetype='text/csv',
+                    headers={'Content-Disposition': 'attachment; filename=users.csv'})
+
+
 # Админ панель (временно закомментируем, если нет шаблонов)
 """
 @app.route('/admin')
@@ -338,16 +395,15 @@ def admin_users():
 @app.route('/admin/tracks')
 @admin_required
 def admin_tracks():
-    page = int(request.args.get('page', 1))
+    after_track_id = request.args.get('after', 0, type=int)
     limit = 20
-    offset = (page - 1) * limit
 
-    tracks = music_service.get_all_tracks(limit, offset)
+    tracks = music_service.get_all_tracks(limit, after_track_id)
     total_tracks = music_service.get_tracks_count()
 
     return render_template('admin/tracks.html',
                            tracks=tracks,
-                           page=page,
+                           next_after=tracks[-1]['track_id'] if len(tracks) == limit else None,
                            total_tracks=total_tracks)
 """
 
@@ -0,0 +1,103 @@
+# benchmark_audio.py
+"""Замер задержки поиска похожих по звучанию треков в зависимости от размера каталога
+
+Характеристики генерируются синтетически (БД и Spotify не нужны): треки
+группируются вокруг нескольких сотен "стилей". Для IVF считается полнота
+(recall) top-N относительно точного полного перебора. Пример:
+    python benchmark_audio.py --sizes 100000 1000000 --queries 500
+"""
+from services.audio_features import AudioFeatureIndex
+from config import config
+import argparse
+import time
+
+import numpy as np
+
+
+def generate_features(size, rng, styles=300, batch_size=5000):
+    """Синтетические строки audio_features пачками (как при загрузке из БД)"""
+    centers = {
+        'danceability': rng.uniform(0.2, 0.9, styles),
+        'energy': rng.uniform(0.1, 1.0, styles),
+        'loudness': rng.uniform(-20, -3, styles),
+        'speechiness': rng.uniform(0.02, 0.4, styles),
+        'acousticness': rng.uniform(0.0, 1.0, styles),
+        'instrumentalness': rng.uniform(0.0, 0.9, styles),
+        'liveness': rng.uniform(0.05, 0.5, styles),
+        'valence': rng.uniform(0.05, 0.95, styles),
+        'tempo': rng.uniform(70, 180, styles),
+    }
+    for start in range(0, size, batch_size):
+        count = min(batch_size, size - start)
+        style = rng.integers(styles, size=count)
+        columns = {name: values[style] + rng.normal(0, 0.08 * np.ptp(values), count)
+                   for name, values in centers.items()}
+        columns['key'] = rng.integers(-1, 12, size=count)
+        columns['mode'] = rng.integers(0, 2, size=count)
+        yield [
+            dict({name: float(values[i]) for name, values in columns.items()},
+                 track_id=start + i + 1, key=int(columns['key'][i]), mode=int(columns['mode'][i]))
+            for i in range(count)
+        ]
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * fraction))
+    return sorted_values[index]
+
+
+def measure(function, queries):
+    """Время каждого вызова, мс (отсортировано) и результаты"""
+    timings, results = [], []
+    for query in queries:
+        started = time.perf_counter()
+        results.append(function(query))
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return timings, results
+
+
+def report(name, size, build_seconds, timings, recall=None):
+    recall_text = f"{recall:>8.3f}" if recall is not None else f"{'-':>8}"
+    print(f"{name:<12} {size:>9} {build_seconds:>9.2f}s "
+          f"{percentile(timings, 0.50):>9.3f} {percentile(timings, 0.95):>9.3f} "
+          f"{percentile(timings, 0.99):>9.3f} {timings[-1]:>9.3f} {recall_text}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the audio feature similarity index')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--queries', type=int, default=300)
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--nprobe', type=int, default=config.AUDIO_INDEX_NPROBE)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"{'index':<12} {'tracks':>9} {'build':>10} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'p99 ms':>9} {'max ms':>9} {'recall':>8}")
+
+    for size in args.sizes:
+        rng = np.random.default_rng(args.seed)
+        index = AudioFeatureIndex(ivf_min_tracks=size + 1, nprobe=args.nprobe)
+        started = time.perf_counter()
+        for batch in generate_features(size, rng):
+            index.add_tracks(batch)
+        build_seconds = time.perf_counter() - started
+
+        queries = [int(track_id) for track_id in rng.integers(1, size + 1, size=args.queries)]
+        timings, exact = measure(lambda q: index.similar(q, args.limit), queries)
+        report('brute force', size, build_seconds, timings)
+
+        started = time.perf_counter()
+        index.build_ivf()
+        build_seconds = time.perf_counter() - started
+        timings, approximate = measure(lambda q: index.similar(q, args.limit), queries)
+        recall = np.mean([
+            len({track_id for track_id, _ in found} & {track_id for track_id, _ in truth}) / max(1, len(truth))
+            for found, truth in zip(approximate, exact)
+        ])
+        report(f'ivf/{args.nprobe}', size, build_seconds, timings, recall)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+# benchmark_recommender.py
+"""Замер обучения ALS и пропускной способности пакетной выдачи
+
+Прослушивания генерируются синтетически (БД не нужна): у пользователя есть
+"любимый" кластер треков, популярность треков - с длинным хвостом. У каждого
+пользователя один трек откладывается, качество - доля пользователей, у
+которых он попал в top-N (hit rate), в сравнении с выдачей по популярности.
+Пример:
+    python benchmark_recommender.py --users 100000 --tracks 50000 --factors 64
+"""
+from services.als_model import ALSModel, top_n_columns
+from services.recommendation_engine import build_matrix
+from config import config
+import argparse
+import time
+
+import numpy as np
+import scipy.sparse as sp
+
+
+def generate_play_counts(n_users, n_tracks, clusters, rng):
+    """Синтетическая матрица числа прослушиваний (пользователи x треки)"""
+    track_cluster = rng.integers(clusters, size=n_tracks)
+    # Популярность по закону Ципфа, порядок треков случайный
+    popularity = 1.0 / (rng.permutation(n_tracks) + 1.0) ** 0.8
+
+    user_cluster = rng.integers(clusters, size=n_users)
+    tracks_per_user = np.clip(rng.lognormal(np.log(30), 1.0, size=n_users), 1, 500).astype(np.int64)
+    users = np.repeat(np.arange(n_users), tracks_per_user)
+    tracks = np.empty(len(users), dtype=np.int64)
+
+    # 80% прослушиваний - из своего кластера, остальное - из всего каталога
+    own = rng.random(len(users)) < 0.8
+    for cluster in range(clusters):
+        members = np.flatnonzero(track_cluster == cluster)
+        picks = np.flatnonzero(own & (user_cluster[users] == cluster))
+        cumulative = np.cumsum(popularity[members])
+        tracks[picks] = members[np.searchsorted(cumulative, rng.random(len(picks)) * cumulative[-1])]
+    others = np.flatnonzero(~own)
+    cumulative = np.cumsum(popularity)
+    tracks[others] = np.searchsorted(cumulative, rng.random(len(others)) * cumulative[-1])
+
+    counts = rng.geometric(0.3, size=len(users)).astype(np.float64)
+    _, _, matrix = build_matrix(users, tracks, counts)
+    return matrix
+
+
+def hold_out(matrix, rng):
+    """Отложить по одному треку у пользователей, у которых их хотя бы два
+
+    Returns:
+        tuple: (обучающая матрица, строки пользователей, отложенные треки)
+    """
+    matrix = matrix.copy()
+    lengths = np.diff(matrix.indptr)
+    users = np.flatnonzero(lengths >= 2)
+    positions = matrix.indptr[users] + (rng.random(len(users)) * lengths[users]).astype(np.int64)
+    held = matrix.indices[positions].copy()
+    matrix.data[positions] = 0
+    matrix.eliminate_zeros()
+    return matrix, users, held
+
+
+def hit_rate(top_by_user, users, held):
+    """Доля пользователей, у которых отложенный трек попал в их top-N"""
+    return float(np.mean((top_by_user[users] == held[:, None]).any(axis=1)))
+
+
+def popularity_top(train, top_n, block_size):
+    """Выдача по популярности (без уже известных треков) - базовая линия"""
+    popularity = np.asarray(train.sum(axis=0), dtype=np.float32).ravel()
+    top = np.empty((train.shape[0], top_n), dtype=np.int64)
+    for start in range(0, train.shape[0], block_size):
+        stop = min(start + block_size, train.shape[0])
+        scores = np.tile(popularity, (stop - start, 1))
+        known = train[start:stop]
+        scores[np.repeat(np.arange(stop - start), np.diff(known.indptr)), known.indices] = -np.inf
+        top[start:stop] = top_n_columns(scores, top_n)[0]
+    return top
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark ALS training and batch scoring')
+    parser.add_argument('--users', type=int, default=50000)
+    parser.add_argument('--tracks', type=int, default=20000)
+    parser.add_argument('--clusters', type=int, default=50)
+    parser.add_argument('--factors', type=int, default=config.ALS_FACTORS)
+    parser.add_argument('--iterations', type=int, default=config.ALS_ITERATIONS)
+    parser.add_argument('--top-n', type=int, default=config.RECOMMENDATIONS_PER_USER)
+    parser.add_argument('--block-sizes', type=int, nargs='+', default=[256, 1024, 4096])
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    started = time.perf_counter()
+    matrix = generate_play_counts(args.users, args.tracks, args.clusters, rng)
+    train, users, held = hold_out(matrix, rng)
+    print(f"data: {train.shape[0]} users x {train.shape[1]} tracks, {train.nnz} pairs "
+          f"({time.perf_counter() - started:.1f}s to generate)")
+
+    model = ALSModel(factors=args.factors, regularization=config.ALS_REGULARIZATION,
+                     alpha=config.ALS_ALPHA, iterations=args.iterations, seed=args.seed)
+    started = time.perf_counter()
+    model.fit(sp.csr_matrix(train))
+    train_seconds = time.perf_counter() - started
+    print(f"train: {args.iterations} iterations, {args.factors} factors: {train_seconds:.2f}s "
+          f"({train_seconds / args.iterations:.3f}s per iteration)")
+
+    print(f"{'block':>7} {'seconds':>9} {'users/s':>11}")
+    top = None
+    for block_size in args.block_sizes:
+        top = np.empty((train.shape[0], min(args.top_n, train.shape[1])), dtype=np.int64)
+        started = time.perf_counter()
+        for start, columns, _ in model.score_users(args.top_n, exclude=train, block_size=block_size):
+            top[start:start + len(columns)] = columns
+        seconds = time.perf_counter() - started
+        print(f"{block_size:>7} {seconds:>9.2f} {train.shape[0] / seconds:>11.0f}")
+
+    baseline = popularity_top(train, top.shape[1], args.block_sizes[-1])
+    print(f"hit rate@{top.shape[1]}: als {hit_rate(top, users, held):.3f}, "
+          f"popularity {hit_rate(baseline, users, held):.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+# benchmark_search.py
+"""Замер задержки индексов поиска в памяти в зависимости от размера каталога
+
+Каталог генерируется синтетически (БД не нужна), запросы - реальные
+названия с внесенными опечатками. Пример:
+    python benchmark_search.py --sizes 10000 100000 500000 --queries 2000
+"""
+from services.fuzzy_search import FuzzyTrackIndex
+from services.autocomplete import AutocompleteIndex
+from config import config
+import argparse
+import random
+import string
+import time
+
+# Индексы строятся так же, как из БД: через load() порциями по столько строк
+LOAD_BATCH_SIZE = 5000
+
+CONSONANTS = 'bcdfghjklmnprstvwz'
+VOWELS = 'aeiouy'
+
+
+def random_word(rng):
+    return ''.join(rng.choice(CONSONANTS) + rng.choice(VOWELS) for _ in range(rng.randint(1, 4)))
+
+
+class Vocabulary:
+    """Словарь каталога: растет с размером каталога (закон Хипса),
+    частоты слов неравномерные - часть слов встречается намного чаще"""
+
+    def __init__(self, size, rng):
+        self.rng = rng
+        self.words = [random_word(rng) for _ in range(int(20 * size ** 0.6))]
+
+    def word(self):
+        # Частые слова в начале списка, но хвост тоже используется
+        return self.words[int(len(self.words) * self.rng.random() ** 3)]
+
+    def name(self, words):
+        return ' '.join(self.word() for _ in range(self.rng.randint(1, words))).title()
+
+
+def generate_catalog(size, rng):
+    """Синтетический каталог: ~10 треков на альбом, ~5 альбомов на исполнителя"""
+    vocabulary = Vocabulary(size, rng)
+    artists = [vocabulary.name(2) for _ in range(max(1, size // 50))]
+    albums = [(vocabulary.name(3), rng.choice(artists)) for _ in range(max(1, size // 10))]
+    tracks = []
+    for track_id in range(1, size + 1):
+        album_name, artist_name = rng.choice(albums)
+        tracks.append({
+            'track_id': track_id,
+            'track_name': vocabulary.name(4),
+            'artist_name': artist_name,
+            'album_name': album_name,
+            'duration_ms': rng.randint(90000, 400000),
+            'preview_url': None,
+            'full_track_url': None,
+            'cover_url': None,
+            # Популярность с длинным хвостом, как у реального каталога
+            'popularity': min(100, int(rng.paretovariate(1.5) * 10)),
+        })
+    return tracks
+
+
+def add_typo(text, rng):
+    """Одна случайная опечатка: пропуск, замена, вставка или перестановка"""
+    if len(text) < 4:
+        return text
+    i = rng.randrange(1, len(text) - 1)
+    kind = rng.choice(('delete', 'replace', 'insert', 'swap'))
+    if kind == 'delete':
+        return text[:i] + text[i + 1:]
+    if kind == 'replace':
+        return text[:i] + rng.choice(string.ascii_lowercase) + text[i + 1:]
+    if kind == 'insert':
+        return text[:i] + rng.choice(string.ascii_lowercase) + text[i:]
+    return text[:i - 1] + text[i] + text[i - 1] + text[i + 1:]
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * fraction))
+    return sorted_values[index]
+
+
+def measure(function, queries):
+    """Время каждого вызова, мс (отсортировано)"""
+    timings = []
+    for query in queries:
+        started = time.perf_counter()
+        function(query)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return timings
+
+
+def report(name, size, build_seconds, timings):
+    print(f"{name:<14} {size:>9} {build_seconds:>9.2f}s "
+          f"{percentile(timings, 0.50):>9.3f} {percentile(timings, 0.95):>9.3f} "
+          f"{percentile(timings, 0.99):>9.3f} {timings[-1]:>9.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark in-memory search indexes')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 50000, 100000, 250000])
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"Fuzzy: max distance {config.FUZZY_MAX_DISTANCE}, budget {config.FUZZY_LATENCY_BUDGET_MS} ms")
+    print(f"{'index':<14} {'tracks':>9} {'build':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+
+    for size in args.sizes:
+        rng = random.Random(args.seed)
+        catalog = generate_catalog(size, rng)
+
+        samples = [rng.choice(catalog) for _ in range(args.queries)]
+        typo_queries = [
+            add_typo(rng.choice((track['artist_name'], track['track_name'])).lower(), rng)
+            for track in samples
+        ]
+        prefix_queries = [track['track_name'][:rng.randint(1, 8)] for track in samples]
+
+        fuzzy = FuzzyTrackIndex(config.FUZZY_MAX_DISTANCE, config.FUZZY_LATENCY_BUDGET_MS)
+        started = time.perf_counter()
+        fuzzy.load(batch_size=LOAD_BATCH_SIZE, rows=catalog)
+        build_seconds = time.perf_counter() - started
+        report('fuzzy', size, build_seconds, measure(lambda q: fuzzy.search(q, 20), typo_queries))
+        stats = fuzzy.stats()
+        print(f"{'':<14} budget exceeded: {stats['budget_exceeded']}/{args.queries}, "
+              f"words: {stats['words']}, deletes: {stats['deletes']}")
+
+        autocomplete = AutocompleteIndex(top_k=config.AUTOCOMPLETE_TOP_K)
+        started = time.perf_counter()
+        autocomplete.load(batch_size=LOAD_BATCH_SIZE, rows=catalog)
+        build_seconds = time.perf_counter() - started
+        report('autocomplete', size, build_seconds,
+               measure(lambda q: autocomplete.complete(q), prefix_queries))
+
+
+if __name__ == '__main__':
+    main()
@@ -16,9 +16,103 @@ class Config:
     DB_USER = os.getenv('DB_USER', 'postgres')
     DB_PASSWORD = os.getenv('DB_PASSWORD', 'password')
 
+    # Пул соединений
+    DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', 1))
+    DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', 10))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 5))
+    DB_POOL_HEALTHCHECK_IDLE = float(os.getenv('DB_POOL_HEALTHCHECK_IDLE', 30))
+
+    # Кэш результатов запросов
+    QUERY_CACHE_ENABLED = os.getenv('QUERY_CACHE_ENABLED', 'True').lower() == 'true'
+    QUERY_CACHE_MAX_ENTRIES = int(os.getenv('QUERY_CACHE_MAX_ENTRIES', 1024))
+    CATALOG_CACHE_TTL = float(os.getenv('CATALOG_CACHE_TTL', 60))
+    STATS_CACHE_TTL = float(os.getenv('STATS_CACHE_TTL', 300))
+    # Ниже этого числа строк количество треков считается точно, выше - по pg_class
+    EXACT_COUNT_THRESHOLD = int(os.getenv('EXACT_COUNT_THRESHOLD', 10000))
+
+    # Реплики для чтения: DSN через ';', например
+    # "host=replica1 dbname=music_service user=postgres;host=replica2 dbname=music_service user=postgres"
+    DB_REPLICA_DSNS = [dsn.strip() for dsn in os.getenv('DB_REPLICA_DSNS', '').split(';') if dsn.strip()]
+    # round_robin или least_busy
+    DB_REPLICA_STRATEGY = os.getenv('DB_REPLICA_STRATEGY', 'round_robin')
+
+    # Сколько строк серверный курсор отдает за один round trip
+    DB_ITERSIZE = int(os.getenv('DB_ITERSIZE', 2000))
+
+    # Метрики запросов и лог медленных запросов
+    QUERY_METRICS_ENABLED = os.getenv('QUERY_METRICS_ENABLED', 'True').lower() == 'true'
+    SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 200))
+    SLOW_QUERY_EXPLAIN_SAMPLE = float(os.getenv('SLOW_QUERY_EXPLAIN_SAMPLE', 0.1))
+
+    # Индексы поиска в памяти процесса (автодополнение и нечеткий поиск)
+    AUTOCOMPLETE_TOP_K = int(os.getenv('AUTOCOMPLETE_TOP_K', 10))
+    # Как часто индексы подгружают из БД новые треки, сек
+    SEARCH_INDEX_REFRESH_SECONDS = float(os.getenv('SEARCH_INDEX_REFRESH_SECONDS', 60))
+    # Нечеткий поиск: максимальное расстояние Дамерау-Левенштейна и бюджет времени, мс
+    FUZZY_MAX_DISTANCE = int(os.getenv('FUZZY_MAX_DISTANCE', 2))
+    FUZZY_LATENCY_BUDGET_MS = float(os.getenv('FUZZY_LATENCY_BUDGET_MS', 20))
+
+    # Фоновая запись прослушиваний (services/listen_writer.py)
+    LISTEN_WRITER_ENABLED = os.getenv('LISTEN_WRITER_ENABLED', 'True').lower() == 'true'
+    LISTEN_BATCH_SIZE = int(os.getenv('LISTEN_BATCH_SIZE', 500))
+    LISTEN_FLUSH_INTERVAL = float(os.getenv('LISTEN_FLUSH_INTERVAL', 1.0))
+    LISTEN_QUEUE_SIZE = int(os.getenv('LISTEN_QUEUE_SIZE', 10000))
+    # Сколько запрос ждет места в переполненной очереди, прежде чем событие отбросится, сек
+    LISTEN_ENQUEUE_TIMEOUT = float(os.getenv('LISTEN_ENQUEUE_TIMEOUT', 0.05))
+
+    # Секционирование listening_history (database/partitions.py)
+    LISTEN_PARTITIONS_AHEAD = int(os.getenv('LISTEN_PARTITIONS_AHEAD', 3))
+    # Сколько закрытых месяцев сырой истории хранить; старые секции - в архив или удаляются
+    LISTEN_RETENTION_MONTHS = int(os.getenv('LISTEN_RETENTION_MONTHS', 12))
+    LISTEN_RETENTION_MODE = os.getenv('LISTEN_RETENTION_MODE', 'archive')  # archive или drop
+    # Глубина истории прослушиваний на страницах (ограничивает просматриваемые секции)
+    HISTORY_LOOKBACK_DAYS = int(os.getenv('HISTORY_LOOKBACK_DAYS', 180))
+
+    # Рекомендации (services/recommendation_engine.py)
+    RECOMMENDATIONS_PER_USER = int(os.getenv('RECOMMENDATIONS_PER_USER', 50))
+    SIMILAR_TRACKS_PER_TRACK = int(os.getenv('SIMILAR_TRACKS_PER_TRACK', 50))
+    # Вес "в избранном" относительно ln(1 + число прослушиваний)
+    RECOMMENDER_FAVORITE_WEIGHT = float(os.getenv('RECOMMENDER_FAVORITE_WEIGHT', 2.0))
+    # Сколько самых весомых треков пользователя учитывать (ограничивает размер матрицы совместных прослушиваний)
+    RECOMMENDER_MAX_ITEMS_PER_USER = int(os.getenv('RECOMMENDER_MAX_ITEMS_PER_USER', 500))
+    # Чьи рекомендации пользователям попадают в recommendation_cache: item (совместные прослушивания) или als
+    RECOMMENDER_USER_MODEL = os.getenv('RECOMMENDER_USER_MODEL', 'item')
+
+    # Матричная факторизация ALS (services/als_model.py)
+    ALS_FACTORS = int(os.getenv('ALS_FACTORS', 64))
+    ALS_REGULARIZATION = float(os.getenv('ALS_REGULARIZATION', 0.05))
+    # Уверенность c = 1 + alpha * ln(1 + число прослушиваний)
+    ALS_ALPHA = float(os.getenv('ALS_ALPHA', 10.0))
+    ALS_ITERATIONS = int(os.getenv('ALS_ITERATIONS', 15))
+    # Каталог с контрольными точками факторов (.npy, читаются через mmap)
+    ALS_MODEL_DIR = os.getenv('ALS_MODEL_DIR', 'models/als')
+
+    # Похожие по звучанию треки (services/audio_features.py)
+    AUDIO_FEATURES_BATCH_SIZE = int(os.getenv('AUDIO_FEATURES_BATCH_SIZE', 100))  # максимум Spotify - 100
+    # С какого размера каталога строится IVF-индекс (иначе - полный перебор)
+    AUDIO_INDEX_IVF_MIN_TRACKS = int(os.getenv('AUDIO_INDEX_IVF_MIN_TRACKS', 50000))
+    # Сколько ближайших кластеров IVF просматривать (больше - точнее и медленнее)
+    AUDIO_INDEX_NPROBE = int(os.getenv('AUDIO_INDEX_NPROBE', 16))
+
     # Spotify API
     SPOTIFY_CLIENT_ID = os.getenv('SPOTIFY_CLIENT_ID', 'your_spotify_client_id_here')
     SPOTIFY_CLIENT_SECRET = os.getenv('SPOTIFY_CLIENT_SECRET', 'your_spotify_client_secret_here')
+    # Адреса API (можно направить на локальную заглушку для проверок)
+    SPOTIFY_API_URL = os.getenv('SPOTIFY_API_URL', 'https://api.spotify.com/v1')
+    SPOTIFY_AUTH_URL = os.getenv('SPOTIFY_AUTH_URL', 'https://accounts.spotify.com/api/token')
+    # Общий лимит запросов процесса (token bucket): запросов в секунду и допустимый всплеск
+    SPOTIFY_RATE_LIMIT = float(os.getenv('SPOTIFY_RATE_LIMIT', 10.0))
+    SPOTIFY_RATE_BURST = int(os.getenv('SPOTIFY_RATE_BURST', 10))
+    # Сколько повторов после ответа 429 (ожидание - по Retry-After)
+    SPOTIFY_MAX_RETRIES = int(os.getenv('SPOTIFY_MAX_RETRIES', 5))
+    # Окно сбора одиночных get_track/get_artist/... в пакетный запрос, мс (0 - выключено)
+    SPOTIFY_COALESCE_WINDOW_MS = float(os.getenv('SPOTIFY_COALESCE_WINDOW_MS', 20))
+    # Соединений keep-alive в пуле HTTP-сессии (не меньше числа потоков наполнения)
+    SPOTIFY_HTTP_POOL_SIZE = int(os.getenv('SPOTIFY_HTTP_POOL_SIZE', 10))
+    # Кэш ответов на диске: off, cache (TTL + ETag), record (записать прогон), replay (без сети)
+    SPOTIFY_CACHE_MODE = os.getenv('SPOTIFY_CACHE_MODE', 'cache')
+    SPOTIFY_CACHE_DIR = os.getenv('SPOTIFY_CACHE_DIR', '.cache/spotify')
+    SPOTIFY_CACHE_TTL = int(os.getenv('SPOTIFY_CACHE_TTL', 86400))
 
     # App settings
     DEBUG = os.getenv('DEBUG', 'True').lower() == 'true'
@@ -28,6 +122,14 @@ class Config:
     # Data population settings
     MAX_TRACKS_PER_ARTIST = int(os.getenv('MAX_TRACKS_PER_ARTIST', 50))
     MAX_ARTISTS_TO_POPULATE = int(os.getenv('MAX_ARTISTS_TO_POPULATE', 200))
+    # Параллельные потоки наполнения из Spotify (лимит запросов у них общий)
+    POPULATE_WORKERS = int(os.getenv('POPULATE_WORKERS', 4))
+    # Режим refresh перезапрашивает треки неизменившегося артиста не реже раза в N дней
+    POPULATE_REFRESH_DAYS = int(os.getenv('POPULATE_REFRESH_DAYS', 7))
+    # Размер очередей между стадиями конвейера наполнения (backpressure)
+    POPULATE_QUEUE_SIZE = int(os.getenv('POPULATE_QUEUE_SIZE', 200))
+    LISTENS_PER_USER = int(os.getenv('LISTENS_PER_USER', 50))
+    ACTIVITY_TRACK_POOL = int(os.getenv('ACTIVITY_TRACK_POOL', 500))
 
 
 # Создаем экземпляр конфигурации
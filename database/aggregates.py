@@ -0,0 +1,43 @@
+# database/aggregates.py
+"""Пересчет агрегатов прослушиваний (migrations/003_listening_aggregates.sql)
+
+Обычно агрегаты обновляет триггер на listening_history. Пересчет нужен,
+если история менялась в обход INSERT (удаления, правка жанров треков).
+
+Запуск:
+    python -m database.aggregates            # все пользователи
+    python -m database.aggregates --user 42  # один пользователь
+"""
+import argparse
+import logging
+import time
+
+from database.connection import db
+from database.queries.analytics import REBUILD_LISTENING_AGGREGATES
+
+logger = logging.getLogger(__name__)
+
+
+def rebuild_aggregates(user_id=None):
+    """Пересчитать агрегаты одного пользователя или всех; True при успехе"""
+    target = f"user {user_id}" if user_id is not None else "all users"
+    logger.info(f"🔄 Rebuilding listening aggregates for {target}...")
+    started = time.perf_counter()
+    try:
+        with db.transaction() as tx:
+            tx.execute(REBUILD_LISTENING_AGGREGATES, (user_id,))
+    except Exception as e:
+        logger.error(f"❌ Rebuild of listening aggregates failed: {e}")
+        return False
+    logger.info(f"✅ Listening aggregates rebuilt in {time.perf_counter() - started:.1f}s")
+    return True
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description='Rebuild per-user listening aggregates')
+    parser.add_argument('--user', type=int, default=None, help='rebuild only this user')
+    args = parser.parse_args()
+
+    rebuild_aggregates(args.user)
@@ -0,0 +1,129 @@
+# database/bulk.py
+"""Массовая загрузка данных: COPY FROM STDIN и многострочный VALUES"""
+import io
+from datetime import date, datetime
+
+import psycopg2.extras
+from psycopg2 import sql
+
+# Размер блока, которым psycopg2 читает данные для COPY
+COPY_BUFFER_SIZE = 64 * 1024
+
+
+def _copy_value(value):
+    """Значение в текстовом формате COPY"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return (str(value)
+            .replace('\\', '\\\\')
+            .replace('\t', '\\t')
+            .replace('\n', '\\n')
+            .replace('\r', '\\r'))
+
+
+def _copy_line(row):
+    """Строка таблицы в текстовом формате COPY"""
+    return '\t'.join(_copy_value(value) for value in row) + '\n'
+
+
+class IteratorFile(io.TextIOBase):
+    """Файлоподобная обертка над итератором строк для copy_expert
+
+    Строки забираются из генератора по мере того, как их читает psycopg2,
+    поэтому весь набор данных никогда не лежит в памяти целиком.
+    """
+
+    def __init__(self, lines):
+        self._lines = iter(lines)
+        self._buffer = []
+        self._buffered = 0
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while size < 0 or self._buffered < size:
+            try:
+                line = next(self._lines)
+            except StopIteration:
+                break
+            self._buffer.append(line)
+            self._buffered += len(line)
+
+        data = ''.join(self._buffer)
+        if 0 <= size < len(data):
+            data, rest = data[:size], data[size:]
+            self._buffer = [rest]
+            self._buffered = len(rest)
+        else:
+            self._buffer = []
+            self._buffered = 0
+        return data
+
+
+def _identifier(name):
+    """Имя таблицы (возможно, со схемой) как безопасный идентификатор"""
+    return sql.Identifier(*name.split('.'))
+
+
+def copy_rows(cur, table, columns, rows):
+    """
+    Загрузить строки в таблицу через COPY FROM STDIN
+
+    Args:
+        cur: Курсор psycopg2
+        table (str): Имя таблицы
+        columns (list): Колонки в порядке значений в строках
+        rows (iterable): Кортежи значений (можно генератор)
+
+    Returns:
+        int: Количество загруженных строк
+    """
+    statement = sql.SQL("COPY {} ({}) FROM STDIN").format(
+        _identifier(table),
+        sql.SQL(', ').join(sql.Identifier(column) for column in columns)
+    )
+    cur.copy_expert(statement, IteratorFile(_copy_line(row) for row in rows),
+                    size=COPY_BUFFER_SIZE)
+    return cur.rowcount
+
+
+def insert_values(cur, query, rows, template=None, page_size=1000, fetch=False):
+    """
+    Многострочный INSERT ... VALUES %s через execute_values
+
+    Args:
+        cur: Курсор psycopg2
+        query (str): Запрос с единственным плейсхолдером VALUES %s
+        rows (iterable): Кортежи значений
+        template (str): Шаблон одной строки, например '(%s, %s, now())'
+        page_size (int): Сколько строк отправлять одним запросом
+        fetch (bool): Вернуть строки из RETURNING
+
+    Returns:
+        list[dict] строк RETURNING (fetch=True) или количество строк
+    """
+    if fetch:
+        results = psycopg2.extras.execute_values(
+            cur, query, rows, template=template, page_size=page_size, fetch=True
+        )
+        return [dict(row) for row in results]
+
+    total = 0
+    # execute_values отдает rowcount только последней страницы, поэтому
+    # отправляем страницы сами и суммируем
+    page = []
+    for row in rows:
+        page.append(row)
+        if len(page) >= page_size:
+            psycopg2.extras.execute_values(cur, query, page, template=template, page_size=page_size)
+            total += cur.rowcount
+            page = []
+    if page:
+        psycopg2.extras.execute_values(cur, query, page, template=template, page_size=page_size)
+        total += cur.rowcount
+    return total
@@ -0,0 +1,149 @@
+# database/cache.py
+"""Кэш результатов запросов: TTL, LRU и инвалидация по тегам таблиц"""
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+_READ_TABLES_RE = re.compile(r'\b(?:from|join)\s+(?:only\s+)?([a-z_][\w.]*)', re.I)
+_WRITE_TABLES_RE = re.compile(
+    r'\b(?:insert\s+into|update|delete\s+from|truncate(?:\s+table)?|copy)\s+(?:only\s+)?([a-z_][\w.]*)',
+    re.I
+)
+# Слова, которые регулярка может принять за таблицу (ON CONFLICT DO UPDATE SET, FROM STDIN ...)
+_NOT_TABLES = {'set', 'stdin', 'stdout', 'lateral', 'unnest', 'generate_series', 'select'}
+
+
+def _tables(regex, query):
+    return {name.lower() for name in regex.findall(query)} - _NOT_TABLES
+
+
+def read_tables(query):
+    """Таблицы, из которых читает запрос (теги по умолчанию)"""
+    return _tables(_READ_TABLES_RE, query)
+
+
+def written_tables(query):
+    """Таблицы, которые изменяет запрос"""
+    return _tables(_WRITE_TABLES_RE, query)
+
+
+def _copy_result(value):
+    """Копия результата, чтобы вызывающий не испортил закэшированные строки"""
+    if isinstance(value, list):
+        return [dict(row) if isinstance(row, dict) else row for row in value]
+    if isinstance(value, dict):
+        return dict(value)
+    return value
+
+
+class QueryCache:
+    """Потокобезопасный LRU-кэш результатов с TTL и тегами
+
+    Кэш живет внутри процесса: записи, сделанные другими процессами
+    (например, run.py), сюда не доходят, и их видимость ограничена TTL.
+    """
+
+    def __init__(self, max_entries=1024, enabled=True):
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> (expires_at, value, tags)
+        self._tag_index = {}            # tag -> set(key)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(query, params, fetch_one):
+        """Ключ кэша для запроса с параметрами"""
+        if params is None:
+            frozen = ()
+        elif isinstance(params, dict):
+            frozen = tuple(sorted(params.items()))
+        else:
+            frozen = tuple(tuple(p) if isinstance(p, list) else p for p in params)
+        return query, frozen, bool(fetch_one)
+
+    def get(self, key):
+        """(True, value) при попадании, (False, None) при промахе"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            expires_at, value, _ = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return True, _copy_result(value)
+
+    def set(self, key, value, ttl, tags):
+        """Положить результат в кэш"""
+        tags = frozenset(tags)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, _copy_result(value), tags)
+            for tag in tags:
+                self._tag_index.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key):
+        """Удалить запись (вызывать под self._lock)"""
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tag_index.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tag_index[tag]
+
+    def invalidate_tags(self, tags):
+        """Сбросить все записи, помеченные любым из тегов"""
+        removed = 0
+        with self._lock:
+            for tag in tags:
+                for key in list(self._tag_index.get(tag, ())):
+                    if key in self._entries:
+                        self._remove(key)
+                        removed += 1
+            self.invalidations += removed
+        if removed:
+            logger.debug(f"Query cache: invalidated {removed} entries for {sorted(tags)}")
+        return removed
+
+    def clear(self):
+        """Очистить кэш полностью"""
+        with self._lock:
+            self._entries.clear()
+            self._tag_index.clear()
+
+    def stats(self):
+        """Счетчики попаданий/промахов и размер кэша"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
@@ -1,9 +1,20 @@
 # database/connection.py
 import psycopg2
 import psycopg2.extras
+from contextlib import contextmanager
 from config import config
+from database.pool import ConnectionPool, PoolTimeout
+from database import bulk
+from database.metrics import QueryMetrics
+from database.cache import QueryCache, read_tables, written_tables
+import atexit
+import itertools
 import logging
+import re
 import sys
+import threading
+import time
+import uuid
 
 # Настройка логирования
 logging.basicConfig(
@@ -14,6 +25,122 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# Статистика выполнения запросов (общая для всех соединений процесса)
+query_metrics = QueryMetrics(
+    enabled=config.QUERY_METRICS_ENABLED,
+    slow_threshold_ms=config.SLOW_QUERY_MS,
+    explain_sample_rate=config.SLOW_QUERY_EXPLAIN_SAMPLE
+)
+
+
+_READ_ONLY_RE = re.compile(r'^\s*(select|with)\b', re.I)
+_WRITE_RE = re.compile(r'\b(insert|update|delete|merge|for\s+update|for\s+share|nextval|setval)\b', re.I)
+
+# Маркер: запрос не удалось выполнить на реплике, нужно повторить на primary
+_REPLICA_FAILED = object()
+
+
+# Кэш результатов для запросов, явно помеченных cache_ttl
+query_cache = QueryCache(
+    max_entries=config.QUERY_CACHE_MAX_ENTRIES,
+    enabled=config.QUERY_CACHE_ENABLED
+)
+
+
+def _is_read_only(query):
+    """Запрос только читает данные и может уйти на реплику"""
+    return bool(_READ_ONLY_RE.match(query)) and not _WRITE_RE.search(query)
+
+
+def _execute(cur, query, params=None):
+    """cur.execute с учетом времени, строк и ошибок в query_metrics
+
+    Без параметров запрос уходит как есть, поэтому знак % в нем (LIKE-шаблоны,
+    оператор pg_trgm, файлы миграций) не нужно экранировать.
+    """
+    with query_metrics.track(query, params) as tracker:
+        cur.execute(query, params)
+        tracker.rows = max(cur.rowcount, 0)
+
+
+def _execute_batch(cur, query, params_list, page_size):
+    """execute_batch с учетом в query_metrics"""
+    with query_metrics.track(query) as tracker:
+        psycopg2.extras.execute_batch(cur, query, params_list, page_size=page_size)
+        tracker.rows = len(params_list)
+
+
+def _copy_rows(cur, table, columns, rows):
+    """COPY FROM STDIN с учетом в query_metrics"""
+    with query_metrics.track(f"COPY {table} ({', '.join(columns)}) FROM STDIN") as tracker:
+        tracker.rows = bulk.copy_rows(cur, table, columns, rows)
+    return tracker.rows
+
+
+def _insert_values(cur, query, rows, template, page_size, fetch):
+    """Многострочный INSERT с учетом в query_metrics"""
+    with query_metrics.track(query) as tracker:
+        result = bulk.insert_values(cur, query, rows, template, page_size, fetch)
+        tracker.rows = len(result) if fetch else result
+    return result
+
+
+def _cursor_result(cur, query, fetch=False, fetch_one=False):
+    """Результат выполненного запроса в формате execute_query"""
+    if fetch_one:
+        result = cur.fetchone()
+        return dict(result) if result else None
+    elif fetch:
+        results = cur.fetchall()
+        return [dict(row) for row in results]
+    # Для INSERT возвращаем ID новой записи
+    if query.strip().upper().startswith('INSERT'):
+        if cur.rowcount > 0 and 'RETURNING' in query.upper():
+            return cur.fetchone()[0]
+    return cur.rowcount
+
+
+class Transaction:
+    """Несколько запросов на одном соединении с одним COMMIT
+
+    В отличие от DatabaseConnection.execute_query ошибки не глотаются,
+    а пробрасываются наружу, чтобы db.transaction() откатил всю операцию.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        # Таблицы, измененные в транзакции: их теги кэша сбрасываются после COMMIT
+        self.written_tables = set()
+
+    def execute(self, query, params=None, fetch=False, fetch_one=False):
+        """Выполнить запрос внутри транзакции (результат как у execute_query)"""
+        with self.conn.cursor() as cur:
+            logger.debug(f"Executing query in transaction: {query[:100]}...")
+            _execute(cur, query, params)
+            if not _is_read_only(query):
+                self.written_tables |= written_tables(query)
+            return _cursor_result(cur, query, fetch, fetch_one)
+
+    def execute_many(self, query, params_list, page_size=1000):
+        """Выполнить один запрос с множеством параметров внутри транзакции"""
+        params_list = list(params_list)
+        with self.conn.cursor() as cur:
+            _execute_batch(cur, query, params_list, page_size)
+            self.written_tables |= written_tables(query)
+            return len(params_list)
+
+    def copy_rows(self, table, columns, rows):
+        """COPY FROM STDIN внутри транзакции (см. database.bulk.copy_rows)"""
+        self.written_tables.add(table.lower())
+        with self.conn.cursor() as cur:
+            return _copy_rows(cur, table, columns, rows)
+
+    def insert_values(self, query, rows, template=None, page_size=1000, fetch=False):
+        """Многострочный INSERT внутри транзакции (см. database.bulk.insert_values)"""
+        self.written_tables |= written_tables(query)
+        with self.conn.cursor() as cur:
+            return _insert_values(cur, query, rows, template, page_size, fetch)
+
 
 class DatabaseConnection:
     """Класс для работы с базой данных PostgreSQL"""
@@ -35,17 +162,74 @@ class DatabaseConnection:
             'user': config.DB_USER,
             'password': config.DB_PASSWORD
         }
-        logger.info("Database connection initialized")
+        self.pool = ConnectionPool(
+            self.connection_params,
+            min_size=config.DB_POOL_MIN_SIZE,
+            max_size=config.DB_POOL_MAX_SIZE,
+            timeout=config.DB_POOL_TIMEOUT,
+            healthcheck_idle=config.DB_POOL_HEALTHCHECK_IDLE
+        )
+        # Реплики только для чтения: запросы с fetch/fetch_one вне транзакции
+        self.replica_pools = [
+            ConnectionPool(
+                dsn,
+                min_size=config.DB_POOL_MIN_SIZE,
+                max_size=config.DB_POOL_MAX_SIZE,
+                timeout=config.DB_POOL_TIMEOUT,
+                healthcheck_idle=config.DB_POOL_HEALTHCHECK_IDLE,
+                name=f'replica{index}'
+            )
+            for index, dsn in enumerate(config.DB_REPLICA_DSNS)
+        ]
+        self._replica_cycle = itertools.cycle(self.replica_pools)
+        self._local = threading.local()
+
+        # min_size соединений открываем сразу, закрываем при выходе процесса
+        for pool in [self.pool] + self.replica_pools:
+            pool.warmup()
+        atexit.register(self.close)
+
+        self.metrics = query_metrics
+        self.metrics.explain_runner = self._explain_query
+        self.cache = query_cache
+        logger.info(f"Database connection initialized ({len(self.replica_pools)} read replicas)")
 
-    def get_connection(self):
-        """Получить соединение с базой данных"""
+    def _read_pool(self, query):
+        """Выбрать пул реплики для читающего запроса (None - идти на primary)"""
+        if not self.replica_pools or getattr(self._local, 'force_primary', 0):
+            return None
+        if not _is_read_only(query):
+            return None
+        if config.DB_REPLICA_STRATEGY == 'least_busy':
+            return min(self.replica_pools, key=lambda pool: pool.load())
+        return next(self._replica_cycle)
+
+    @contextmanager
+    def primary_reads(self):
+        """
+        Читать с primary внутри блока (read-your-own-writes)
+
+        Пример:
+            db.execute_query(INSERT ...)
+            with db.primary_reads():
+                db.execute_query(SELECT ..., fetch=True)
+        """
+        self._local.force_primary = getattr(self._local, 'force_primary', 0) + 1
         try:
-            conn = psycopg2.connect(
-                **self.connection_params,
-                cursor_factory=psycopg2.extras.DictCursor
-            )
-            logger.debug("Database connection established")
+            yield
+        finally:
+            self._local.force_primary -= 1
+
+    def get_connection(self, pool=None):
+        """Взять соединение из пула (вернуть через release_connection)"""
+        pool = pool or self.pool
+        try:
+            conn = pool.getconn()
+            logger.debug(f"Database connection acquired from pool '{pool.name}'")
             return conn
+        except PoolTimeout as e:
+            logger.error(f"Database pool exhausted: {e}")
+            return None
         except psycopg2.OperationalError as e:
             logger.error(f"Database connection failed: {e}")
             return None
@@ -53,7 +237,20 @@ class DatabaseConnection:
             logger.error(f"Unexpected error during connection: {e}")
             return None
 
-    def execute_query(self, query, params=None, fetch=False, fetch_one=False):
+    def release_connection(self, conn, close=False, pool=None):
+        """Вернуть соединение в пул"""
+        try:
+            (pool or self.pool).putconn(conn, close=close)
+        except Exception as e:
+            logger.error(f"Error returning connection to pool: {e}")
+
+    def close(self):
+        """Закрыть свободные соединения всех пулов"""
+        for pool in [self.pool] + self.replica_pools:
+            pool.closeall()
+
+    def execute_query(self, query, params=None, fetch=False, fetch_one=False,
+                      cache_ttl=None, cache_tags=None):
         """
         Выполнить SQL запрос
 
@@ -62,10 +259,33 @@ class DatabaseConnection:
             params (tuple): Параметры для запроса
             fetch (bool): Возвращать ли результаты
             fetch_one (bool): Возвращать только одну запись
+            cache_ttl (float): Кэшировать результат чтения на столько секунд
+            cache_tags (set): Теги инвалидации (по умолчанию - таблицы из FROM/JOIN)
 
         Returns:
             Результаты запроса или количество affected rows
         """
+        if cache_ttl and (fetch or fetch_one) and self.cache.enabled:
+            key = self.cache.make_key(query, params, fetch_one)
+            hit, result = self.cache.get(key)
+            if hit:
+                return result
+            result = self._run_query(query, params, fetch, fetch_one)
+            if result is not None:
+                self.cache.set(key, result, cache_ttl, cache_tags or read_tables(query))
+            return result
+
+        return self._run_query(query, params, fetch, fetch_one)
+
+    def _run_query(self, query, params, fetch, fetch_one):
+        """Выполнение запроса для execute_query (без кэша)"""
+        if fetch or fetch_one:
+            read_pool = self._read_pool(query)
+            if read_pool is not None:
+                result = self._execute_on_replica(read_pool, query, params, fetch, fetch_one)
+                if result is not _REPLICA_FAILED:
+                    return result
+
         conn = self.get_connection()
         if not conn:
             logger.error("No database connection available")
@@ -74,21 +294,12 @@ class DatabaseConnection:
         try:
             with conn.cursor() as cur:
                 logger.debug(f"Executing query: {query[:100]}...")
-                cur.execute(query, params or ())
+                _execute(cur, query, params)
 
-                if fetch_one:
-                    result = cur.fetchone()
-                    return dict(result) if result else None
-                elif fetch:
-                    results = cur.fetchall()
-                    return [dict(row) for row in results]
-                else:
+                if not fetch and not fetch_one:
                     conn.commit()
-                    # Для INSERT возвращаем ID новой записи
-                    if query.strip().upper().startswith('INSERT'):
-                        if cur.rowcount > 0 and 'RETURNING' in query.upper():
-                            return cur.fetchone()[0]
-                    return cur.rowcount
+                    self._invalidate(written_tables(query))
+                return _cursor_result(cur, query, fetch, fetch_one)
 
         except psycopg2.Error as e:
             logger.error(f"Database error: {e}")
@@ -101,34 +312,252 @@ class DatabaseConnection:
             conn.rollback()
             return None
         finally:
-            conn.close()
+            self.release_connection(conn)
+
+    def _execute_on_replica(self, pool, query, params, fetch, fetch_one):
+        """Выполнить читающий запрос на реплике; _REPLICA_FAILED - повторить на primary"""
+        conn = self.get_connection(pool)
+        if not conn:
+            logger.warning(f"Replica '{pool.name}' unavailable, falling back to primary")
+            return _REPLICA_FAILED
 
-    def execute_many(self, query, params_list):
-        """Выполнить один запрос с множеством параметров"""
+        close = False
+        try:
+            with conn.cursor() as cur:
+                logger.debug(f"Executing query on '{pool.name}': {query[:100]}...")
+                _execute(cur, query, params)
+                return _cursor_result(cur, query, fetch, fetch_one)
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+            logger.warning(f"Replica '{pool.name}' failed ({e}), retrying on primary")
+            close = True
+            return _REPLICA_FAILED
+        except psycopg2.Error as e:
+            logger.error(f"Database error: {e}")
+            logger.error(f"Query: {query}")
+            logger.error(f"Params: {params}")
+            conn.rollback()
+            return None
+        finally:
+            self.release_connection(conn, close=close, pool=pool)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Единица работы: все запросы на одном соединении из пула и один COMMIT
+
+        Пример:
+            with db.transaction() as tx:
+                user_id = tx.execute("INSERT ... RETURNING user_id", params)
+                tx.execute("INSERT INTO playlists ...", (user_id,))
+
+        При любом исключении внутри блока транзакция откатывается,
+        а исключение пробрасывается дальше.
+        """
+        conn = self.get_connection()
+        if not conn:
+            raise psycopg2.OperationalError("No database connection available")
+
+        try:
+            tx = Transaction(conn)
+            yield tx
+            conn.commit()
+            self._invalidate(tx.written_tables)
+        except Exception:
+            try:
+                conn.rollback()
+            except psycopg2.Error as e:
+                logger.error(f"Rollback failed: {e}")
+            raise
+        finally:
+            self.release_connection(conn)
+
+    def iter_query(self, query, params=None, itersize=None):
+        """
+        Выполнить SELECT через серверный (именованный) курсор и отдавать строки лениво
+
+        Строки подтягиваются с сервера пачками по itersize, поэтому память не
+        зависит от размера выборки. Соединение занято, пока генератор не
+        исчерпан или не закрыт (используйте contextlib.closing при досрочном выходе).
+
+        Args:
+            query (str): SQL запрос
+            params (tuple): Параметры для запроса
+            itersize (int): Сколько строк забирать с сервера за раз
+
+        Yields:
+            dict: Очередная строка результата
+        """
+        pool = self._read_pool(query)
+        conn = self.get_connection(pool) if pool else None
+        if not conn:
+            pool = self.pool
+            conn = self.get_connection(pool)
+        if not conn:
+            logger.error("No database connection available")
+            return
+
+        # В метрики идет только время ожидания БД, без времени обработки строк вызывающим
+        db_time = 0.0
+        rows = 0
+        try:
+            with conn.cursor(name=f"iter_{uuid.uuid4().hex}") as cur:
+                cur.itersize = itersize or config.DB_ITERSIZE
+                logger.debug(f"Streaming query: {query[:100]}...")
+                started = time.perf_counter()
+                cur.execute(query, params or ())
+                iterator = iter(cur)
+                while True:
+                    try:
+                        row = next(iterator)
+                    except StopIteration:
+                        break
+                    finally:
+                        db_time += time.perf_counter() - started
+                    rows += 1
+                    yield dict(row)
+                    started = time.perf_counter()
+            query_metrics.record(query, db_time * 1000, rows, params=params)
+        except psycopg2.Error as e:
+            query_metrics.record(query, db_time * 1000, rows, error=True)
+            logger.error(f"Database error in iter_query: {e}")
+            logger.error(f"Query: {query}")
+            raise
+        finally:
+            self.release_connection(conn, pool=pool)
+
+    def execute_many(self, query, params_list, page_size=1000):
+        """
+        Выполнить один запрос с множеством параметров
+
+        Запросы уходят пачками по page_size через execute_batch, а не по
+        одному, как при cursor.executemany.
+
+        Returns:
+            Количество обработанных наборов параметров или None при ошибке
+        """
         conn = self.get_connection()
         if not conn:
             return None
 
+        params_list = list(params_list)
         try:
             with conn.cursor() as cur:
-                cur.executemany(query, params_list)
+                _execute_batch(cur, query, params_list, page_size)
                 conn.commit()
-                return cur.rowcount
+                self._invalidate(written_tables(query))
+                return len(params_list)
         except psycopg2.Error as e:
             logger.error(f"Database error in execute_many: {e}")
             conn.rollback()
             return None
         finally:
-            conn.close()
+            self.release_connection(conn)
+
+    def copy_rows(self, table, columns, rows):
+        """
+        Загрузить строки через COPY FROM STDIN одним потоком
+
+        Args:
+            table (str): Имя таблицы
+            columns (list): Колонки в порядке значений
+            rows (iterable): Кортежи значений, можно генератор
+
+        Returns:
+            Количество загруженных строк или None при ошибке
+        """
+        conn = self.get_connection()
+        if not conn:
+            logger.error("No database connection available")
+            return None
+
+        try:
+            with conn.cursor() as cur:
+                count = _copy_rows(cur, table, columns, rows)
+                conn.commit()
+                self._invalidate({table.lower()})
+                return count
+        except psycopg2.Error as e:
+            logger.error(f"Database error in copy_rows ({table}): {e}")
+            conn.rollback()
+            return None
+        finally:
+            self.release_connection(conn)
+
+    def insert_values(self, query, rows, template=None, page_size=1000, fetch=False):
+        """
+        Многострочный INSERT ... VALUES %s (опционально с RETURNING)
+
+        Args:
+            query (str): Запрос вида "INSERT INTO t (a, b) VALUES %s [RETURNING id]"
+            rows (iterable): Кортежи значений
+            template (str): Шаблон одной строки VALUES
+            page_size (int): Строк в одном запросе
+            fetch (bool): Вернуть строки RETURNING
+
+        Returns:
+            list[dict] (fetch=True), количество строк или None при ошибке
+        """
+        conn = self.get_connection()
+        if not conn:
+            logger.error("No database connection available")
+            return None
+
+        try:
+            with conn.cursor() as cur:
+                result = _insert_values(cur, query, rows, template, page_size, fetch)
+                conn.commit()
+                self._invalidate(written_tables(query))
+                return result
+        except psycopg2.Error as e:
+            logger.error(f"Database error in insert_values: {e}")
+            logger.error(f"Query: {query}")
+            conn.rollback()
+            return None
+        finally:
+            self.release_connection(conn)
 
     def check_connection(self):
         """Проверить подключение к базе данных"""
         conn = self.get_connection()
         if conn:
-            conn.close()
+            self.release_connection(conn)
             return True
         return False
 
+    def get_pool_stats(self):
+        """Статистика пулов соединений (занято, ожидают, время выдачи)"""
+        return {
+            'primary': self.pool.stats(),
+            'replicas': [pool.stats() for pool in self.replica_pools]
+        }
+
+    def _invalidate(self, tables):
+        """Сбросить закэшированные результаты, зависящие от измененных таблиц"""
+        if tables:
+            self.cache.invalidate_tags(tables)
+
+    def get_cache_stats(self):
+        """Счетчики кэша результатов запросов"""
+        return self.cache.stats()
+
+    def get_query_stats(self, limit=20, order_by='total_ms'):
+        """Топ-N запросов по суммарному времени выполнения"""
+        return self.metrics.top(limit, order_by)
+
+    def _explain_query(self, query, params=None):
+        """EXPLAIN (ANALYZE, BUFFERS) для медленного запроса (в метриках не учитывается)"""
+        conn = self.get_connection()
+        if not conn:
+            return None
+
+        try:
+            with conn.cursor() as cur:
+                cur.execute("EXPLAIN (ANALYZE, BUFFERS) " + query, params or ())
+                return '\n'.join(row[0] for row in cur.fetchall())
+        finally:
+            conn.rollback()
+            self.release_connection(conn)
+
 
 # Создаем глобальный экземпляр для использования во всем приложении
 db = DatabaseConnection()
\ No newline at end of file
@@ -0,0 +1,213 @@
+# database/metrics.py
+"""Метрики SQL запросов: гистограммы времени, счетчики и лог медленных запросов"""
+import hashlib
+import logging
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+slow_logger = logging.getLogger('database.slow_query')
+
+# Границы корзин гистограммы, мс (последняя - все, что дольше)
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float('inf'))
+
+_COMMENT_RE = re.compile(r'--[^\n]*|/\*.*?\*/', re.S)
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?\b')
+_PARAM_RE = re.compile(r'%\(\w+\)s|%s')
+_IN_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_VALUE = r'(?:\?|null|true|false|default)'
+_TUPLE = rf'\(\s*{_VALUE}(?:\s*,\s*{_VALUE})*\s*\)'
+_VALUES_RE = re.compile(rf'values\s*{_TUPLE}(?:\s*,\s*{_TUPLE})*')
+_SPACE_RE = re.compile(r'\s+')
+
+
+def normalize_query(query):
+    """Привести запрос к виду без литералов и лишних пробелов"""
+    text = _COMMENT_RE.sub(' ', query)
+    text = _STRING_RE.sub('?', text)
+    text = _PARAM_RE.sub('?', text)
+    text = _NUMBER_RE.sub('?', text)
+    text = _SPACE_RE.sub(' ', text).strip().rstrip(';').lower()
+    text = _VALUES_RE.sub('values (...)', text)
+    text = _IN_LIST_RE.sub('(...)', text)
+    return text
+
+
+def _percentile(buckets, total, fraction):
+    """Оценка перцентиля по гистограмме (верхняя граница корзины)"""
+    if not total:
+        return 0.0
+    threshold = total * fraction
+    seen = 0
+    for bound, count in zip(LATENCY_BUCKETS_MS, buckets):
+        seen += count
+        if seen >= threshold:
+            return bound
+    return LATENCY_BUCKETS_MS[-1]
+
+
+class _Tracker:
+    """Замер одного выполнения запроса"""
+
+    __slots__ = ('rows',)
+
+    def __init__(self):
+        self.rows = 0
+
+
+class QueryMetrics:
+    """Потокобезопасный сборщик статистики по отпечаткам запросов"""
+
+    def __init__(self, enabled=True, slow_threshold_ms=200.0, explain_sample_rate=0.0,
+                 explain_runner=None):
+        self.enabled = enabled
+        self.slow_threshold_ms = slow_threshold_ms
+        self.explain_sample_rate = explain_sample_rate
+        # Функция (query, params) -> текст плана; задается DatabaseConnection
+        self.explain_runner = explain_runner
+
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._fingerprints = {}
+        self._explain_in_flight = False
+
+    def fingerprint(self, query):
+        """Стабильный отпечаток запроса: (fingerprint, нормализованный текст)"""
+        cached = self._fingerprints.get(query)
+        if cached:
+            return cached
+        normalized = normalize_query(query)
+        result = (hashlib.sha1(normalized.encode()).hexdigest()[:16], normalized)
+        if len(self._fingerprints) < 10000:
+            self._fingerprints[query] = result
+        return result
+
+    @contextmanager
+    def track(self, query, params=None):
+        """
+        Замерить выполнение запроса
+
+        Пример:
+            with query_metrics.track(query, params) as tracker:
+                cur.execute(query, params)
+                tracker.rows = cur.rowcount
+        """
+        tracker = _Tracker()
+        if not self.enabled:
+            yield tracker
+            return
+
+        started = time.perf_counter()
+        try:
+            yield tracker
+        except Exception:
+            self.record(query, (time.perf_counter() - started) * 1000, tracker.rows, error=True)
+            raise
+        self.record(query, (time.perf_counter() - started) * 1000, tracker.rows, params=params)
+
+    def record(self, query, duration_ms, rows=0, error=False, params=None):
+        """Учесть одно выполнение запроса"""
+        fingerprint, normalized = self.fingerprint(query)
+
+        with self._lock:
+            entry = self._stats.get(fingerprint)
+            if entry is None:
+                entry = self._stats[fingerprint] = {
+                    'fingerprint': fingerprint,
+                    'query': normalized,
+                    'calls': 0,
+                    'errors': 0,
+                    'rows': 0,
+                    'total_ms': 0.0,
+                    'min_ms': None,
+                    'max_ms': 0.0,
+                    'slow_calls': 0,
+                    'buckets': [0] * len(LATENCY_BUCKETS_MS),
+                    'last_explain': None,
+                }
+            entry['calls'] += 1
+            entry['rows'] += rows or 0
+            entry['total_ms'] += duration_ms
+            entry['max_ms'] = max(entry['max_ms'], duration_ms)
+            entry['min_ms'] = duration_ms if entry['min_ms'] is None else min(entry['min_ms'], duration_ms)
+            if error:
+                entry['errors'] += 1
+            for index, bound in enumerate(LATENCY_BUCKETS_MS):
+                if duration_ms <= bound:
+                    entry['buckets'][index] += 1
+                    break
+
+            is_slow = not error and duration_ms >= self.slow_threshold_ms
+            if is_slow:
+                entry['slow_calls'] += 1
+
+        if is_slow:
+            slow_logger.warning(
+                f"Slow query {fingerprint}: {duration_ms:.1f} ms, rows={rows}: {normalized[:300]}"
+            )
+            self._maybe_explain(fingerprint, query, params)
+
+    def _maybe_explain(self, fingerprint, query, params):
+        """Снять EXPLAIN (ANALYZE, BUFFERS) для части медленных SELECT в фоне"""
+        if not self.explain_runner or random.random() >= self.explain_sample_rate:
+            return
+        # EXPLAIN ANALYZE выполняет запрос повторно, поэтому только чтение
+        if not query.lstrip().upper().startswith(('SELECT', 'WITH')):
+            return
+
+        with self._lock:
+            if self._explain_in_flight:
+                return
+            self._explain_in_flight = True
+
+        def run():
+            try:
+                plan = self.explain_runner(query, params)
+                if plan:
+                    with self._lock:
+                        if fingerprint in self._stats:
+                            self._stats[fingerprint]['last_explain'] = plan
+                    slow_logger.warning(f"EXPLAIN for slow query {fingerprint}:\n{plan}")
+            except Exception as e:
+                logger.error(f"Failed to EXPLAIN slow query {fingerprint}: {e}")
+            finally:
+                with self._lock:
+                    self._explain_in_flight = False
+
+        threading.Thread(target=run, name='slow-query-explain', daemon=True).start()
+
+    def top(self, limit=20, order_by='total_ms'):
+        """Топ-N запросов по суммарному времени (или другому полю)"""
+        with self._lock:
+            entries = [dict(entry, buckets=list(entry['buckets'])) for entry in self._stats.values()]
+
+        for entry in entries:
+            calls = entry['calls']
+            entry['avg_ms'] = round(entry['total_ms'] / calls, 3) if calls else 0.0
+
+        entries.sort(key=lambda entry: entry.get(order_by) or 0, reverse=True)
+        result = []
+        for entry in entries[:limit]:
+            calls = entry['calls']
+            for name, fraction in (('p50_ms', 0.50), ('p95_ms', 0.95), ('p99_ms', 0.99)):
+                # Для последней (бесконечной) корзины берем фактический максимум
+                value = _percentile(entry['buckets'], calls, fraction)
+                entry[name] = round(entry['max_ms'], 3) if value == float('inf') else value
+            entry['histogram'] = {
+                ('le_inf' if bound == float('inf') else f'le_{bound}ms'): count
+                for bound, count in zip(LATENCY_BUCKETS_MS, entry.pop('buckets'))
+            }
+            entry['total_ms'] = round(entry['total_ms'], 3)
+            entry['max_ms'] = round(entry['max_ms'], 3)
+            entry['min_ms'] = round(entry['min_ms'] or 0.0, 3)
+            result.append(entry)
+        return result
+
+    def reset(self):
+        """Сбросить накопленную статистику"""
+        with self._lock:
+            self._stats.clear()
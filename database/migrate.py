@@ -0,0 +1,56 @@
+# database/migrate.py
+"""Применение SQL-миграций поверх database/schema.sql
+
+Запуск: python -m database.migrate
+"""
+import glob
+import logging
+import os
+
+from database.connection import db
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), 'migrations')
+
+CREATE_MIGRATIONS_TABLE = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version VARCHAR(255) PRIMARY KEY,
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+
+def pending_migrations():
+    """Файлы миграций, которые еще не применены (по порядку имен)"""
+    db.execute_query(CREATE_MIGRATIONS_TABLE)
+    applied = db.execute_query("SELECT version FROM schema_migrations", fetch=True) or []
+    applied_versions = {row['version'] for row in applied}
+
+    files = sorted(glob.glob(os.path.join(MIGRATIONS_DIR, '*.sql')))
+    return [path for path in files
+            if os.path.splitext(os.path.basename(path))[0] not in applied_versions]
+
+
+def apply_migrations():
+    """Применить все новые миграции, каждую в своей транзакции"""
+    for path in pending_migrations():
+        version = os.path.splitext(os.path.basename(path))[0]
+        with open(path, encoding='utf-8') as f:
+            sql = f.read()
+
+        logger.info(f"📦 Applying migration {version}...")
+        try:
+            with db.transaction() as tx:
+                tx.execute(sql)
+                tx.execute("INSERT INTO schema_migrations (version) VALUES (%s)", (version,))
+        except Exception as e:
+            logger.error(f"❌ Migration {version} failed: {e}")
+            return False
+        logger.info(f"✅ Migration {version} applied")
+
+    return True
+
+
+if __name__ == "__main__":
+    apply_migrations()
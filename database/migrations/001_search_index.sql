@@ -0,0 +1,77 @@
+-- 001: полнотекстовый поиск (tsvector) и триграммные индексы для каталога
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE tracks ADD COLUMN IF NOT EXISTS search_vector tsvector;
+
+-- Вектор трека: название (A), исполнитель (B), альбом (C).
+-- Конфигурация 'simple': названия многоязычные, стемминг только мешает.
+CREATE OR REPLACE FUNCTION tracks_search_vector_update() RETURNS trigger AS $$
+DECLARE
+    v_album_name TEXT;
+    v_artist_name TEXT;
+BEGIN
+    SELECT al.album_name, a.artist_name
+    INTO v_album_name, v_artist_name
+    FROM albums al
+    JOIN artists a ON a.artist_id = al.artist_id
+    WHERE al.album_id = NEW.album_id;
+
+    NEW.search_vector :=
+        setweight(to_tsvector('simple', coalesce(NEW.track_name, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(v_artist_name, '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce(v_album_name, '')), 'C');
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_tracks_search_vector ON tracks;
+CREATE TRIGGER trg_tracks_search_vector
+    BEFORE INSERT OR UPDATE OF track_name, album_id ON tracks
+    FOR EACH ROW EXECUTE FUNCTION tracks_search_vector_update();
+
+-- Переименование исполнителя или альбома пересчитывает векторы его треков
+CREATE OR REPLACE FUNCTION tracks_search_vector_refresh_artist() RETURNS trigger AS $$
+BEGIN
+    UPDATE tracks SET track_name = track_name
+    WHERE album_id IN (SELECT album_id FROM albums WHERE artist_id = NEW.artist_id);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_artists_search_vector ON artists;
+CREATE TRIGGER trg_artists_search_vector
+    AFTER UPDATE OF artist_name ON artists
+    FOR EACH ROW WHEN (OLD.artist_name IS DISTINCT FROM NEW.artist_name)
+    EXECUTE FUNCTION tracks_search_vector_refresh_artist();
+
+CREATE OR REPLACE FUNCTION tracks_search_vector_refresh_album() RETURNS trigger AS $$
+BEGIN
+    UPDATE tracks SET track_name = track_name WHERE album_id = NEW.album_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_albums_search_vector ON albums;
+CREATE TRIGGER trg_albums_search_vector
+    AFTER UPDATE OF album_name, artist_id ON albums
+    FOR EACH ROW WHEN (OLD.album_name IS DISTINCT FROM NEW.album_name
+                       OR OLD.artist_id IS DISTINCT FROM NEW.artist_id)
+    EXECUTE FUNCTION tracks_search_vector_refresh_album();
+
+-- Заполнение для уже существующих треков одним UPDATE (триггер по track_name не срабатывает)
+UPDATE tracks t
+SET search_vector =
+    setweight(to_tsvector('simple', coalesce(t.track_name, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(a.artist_name, '')), 'B') ||
+    setweight(to_tsvector('simple', coalesce(al.album_name, '')), 'C')
+FROM albums al
+JOIN artists a ON a.artist_id = al.artist_id
+WHERE al.album_id = t.album_id
+  AND t.search_vector IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_tracks_search_vector ON tracks USING gin (search_vector);
+CREATE INDEX IF NOT EXISTS idx_tracks_name_trgm ON tracks USING gin (track_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_artists_name_trgm ON artists USING gin (artist_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_albums_name_trgm ON albums USING gin (album_name gin_trgm_ops);
+
+ANALYZE tracks;
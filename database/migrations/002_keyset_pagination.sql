@@ -0,0 +1,8 @@
+-- 002: индекс для keyset-пагинации каталога по (popularity_score, track_id)
+UPDATE tracks SET popularity_score = 0 WHERE popularity_score IS NULL;
+ALTER TABLE tracks ALTER COLUMN popularity_score SET NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_tracks_popularity_keyset ON tracks (popularity_score, track_id);
+
+-- Чтобы оценка количества строк в pg_class была актуальной сразу
+ANALYZE tracks;
@@ -0,0 +1,172 @@
+-- 003: агрегаты прослушиваний по пользователям, обновляемые при вставке в listening_history
+-- Страницы профиля и статистики читают отсюда top-k строк вместо пересчета всей истории.
+
+CREATE TABLE IF NOT EXISTS user_listening_totals (
+    user_id INTEGER PRIMARY KEY REFERENCES users(user_id) ON DELETE CASCADE,
+    total_listens BIGINT NOT NULL DEFAULT 0,
+    total_duration_ms BIGINT NOT NULL DEFAULT 0,
+    unique_tracks INTEGER NOT NULL DEFAULT 0,
+    last_listened_at TIMESTAMP
+);
+
+-- Нужна, чтобы инкрементально считать уникальные треки
+CREATE TABLE IF NOT EXISTS user_track_listens (
+    user_id INTEGER REFERENCES users(user_id) ON DELETE CASCADE,
+    track_id INTEGER REFERENCES tracks(track_id) ON DELETE CASCADE,
+    listen_count INTEGER NOT NULL DEFAULT 0,
+    total_duration_ms BIGINT NOT NULL DEFAULT 0,
+    last_listened_at TIMESTAMP,
+    PRIMARY KEY (user_id, track_id)
+);
+
+CREATE TABLE IF NOT EXISTS user_artist_listens (
+    user_id INTEGER REFERENCES users(user_id) ON DELETE CASCADE,
+    artist_id INTEGER REFERENCES artists(artist_id) ON DELETE CASCADE,
+    listen_count INTEGER NOT NULL DEFAULT 0,
+    unique_tracks INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, artist_id)
+);
+
+CREATE TABLE IF NOT EXISTS user_genre_listens (
+    user_id INTEGER REFERENCES users(user_id) ON DELETE CASCADE,
+    genre_id INTEGER REFERENCES genres(genre_id) ON DELETE CASCADE,
+    listen_count INTEGER NOT NULL DEFAULT 0,
+    unique_tracks INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, genre_id)
+);
+
+-- Топ-k пользователя читается по индексу без сортировки
+CREATE INDEX IF NOT EXISTS idx_user_track_listens_top ON user_track_listens (user_id, listen_count DESC);
+CREATE INDEX IF NOT EXISTS idx_user_artist_listens_top ON user_artist_listens (user_id, listen_count DESC);
+CREATE INDEX IF NOT EXISTS idx_user_genre_listens_top ON user_genre_listens (user_id, listen_count DESC);
+
+-- Один запуск на оператор INSERT/COPY: вся пачка из listen_writer
+-- агрегируется одним проходом по таблице переходов new_rows.
+-- Исполнитель трека берется через альбом (albums.artist_id), жанры - из track_genres.
+-- Новая ли пара (user_id, track_id), берется из самого upsert (xmax = 0 у вставленной
+-- строки): проверка NOT EXISTS до upsert гоняется с параллельными вставками и
+-- обе пачки посчитали бы трек новым.
+CREATE OR REPLACE FUNCTION listening_aggregates_on_insert() RETURNS trigger AS $$
+BEGIN
+    WITH per_track AS (
+        SELECT
+            n.user_id,
+            n.track_id,
+            COUNT(*) AS listens,
+            COALESCE(SUM(n.listen_duration_ms), 0) AS duration_ms,
+            MAX(n.listened_at) AS last_at
+        FROM new_rows n
+        GROUP BY n.user_id, n.track_id
+    ),
+    tracks_upsert AS (
+        INSERT INTO user_track_listens AS utl
+            (user_id, track_id, listen_count, total_duration_ms, last_listened_at)
+        SELECT user_id, track_id, listens, duration_ms, last_at
+        FROM per_track
+        ORDER BY user_id, track_id
+        ON CONFLICT (user_id, track_id) DO UPDATE SET
+            listen_count = utl.listen_count + EXCLUDED.listen_count,
+            total_duration_ms = utl.total_duration_ms + EXCLUDED.total_duration_ms,
+            last_listened_at = GREATEST(utl.last_listened_at, EXCLUDED.last_listened_at)
+        RETURNING user_id, track_id, (xmax = 0) AS is_new
+    ),
+    upserted AS (
+        SELECT p.user_id, p.track_id, p.listens, p.duration_ms, p.last_at, u.is_new
+        FROM per_track p
+        JOIN tracks_upsert u ON u.user_id = p.user_id AND u.track_id = p.track_id
+    ),
+    totals_upsert AS (
+        INSERT INTO user_listening_totals AS ult
+            (user_id, total_listens, total_duration_ms, unique_tracks, last_listened_at)
+        SELECT user_id, SUM(listens), SUM(duration_ms), COUNT(*) FILTER (WHERE is_new), MAX(last_at)
+        FROM upserted
+        GROUP BY user_id
+        ORDER BY user_id
+        ON CONFLICT (user_id) DO UPDATE SET
+            total_listens = ult.total_listens + EXCLUDED.total_listens,
+            total_duration_ms = ult.total_duration_ms + EXCLUDED.total_duration_ms,
+            unique_tracks = ult.unique_tracks + EXCLUDED.unique_tracks,
+            last_listened_at = GREATEST(ult.last_listened_at, EXCLUDED.last_listened_at)
+    ),
+    artists_upsert AS (
+        INSERT INTO user_artist_listens AS ual (user_id, artist_id, listen_count, unique_tracks)
+        SELECT p.user_id, al.artist_id, SUM(p.listens), COUNT(*) FILTER (WHERE p.is_new)
+        FROM upserted p
+        JOIN tracks t ON t.track_id = p.track_id
+        JOIN albums al ON al.album_id = t.album_id
+        GROUP BY p.user_id, al.artist_id
+        ORDER BY p.user_id, al.artist_id
+        ON CONFLICT (user_id, artist_id) DO UPDATE SET
+            listen_count = ual.listen_count + EXCLUDED.listen_count,
+            unique_tracks = ual.unique_tracks + EXCLUDED.unique_tracks
+    )
+    INSERT INTO user_genre_listens AS ugl (user_id, genre_id, listen_count, unique_tracks)
+    SELECT p.user_id, tg.genre_id, SUM(p.listens), COUNT(*) FILTER (WHERE p.is_new)
+    FROM upserted p
+    JOIN track_genres tg ON tg.track_id = p.track_id
+    GROUP BY p.user_id, tg.genre_id
+    ORDER BY p.user_id, tg.genre_id
+    ON CONFLICT (user_id, genre_id) DO UPDATE SET
+        listen_count = ugl.listen_count + EXCLUDED.listen_count,
+        unique_tracks = ugl.unique_tracks + EXCLUDED.unique_tracks;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS listening_history_aggregates ON listening_history;
+CREATE TRIGGER listening_history_aggregates
+    AFTER INSERT ON listening_history
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION listening_aggregates_on_insert();
+
+-- Полный пересчет из listening_history (всех пользователей или одного).
+-- Нужен после изменения истории в обход INSERT (удаление, правка жанров
+-- треков) и для первоначального заполнения. Вставки на время пересчета
+-- блокируются, чтобы не потерять и не посчитать дважды новые прослушивания.
+CREATE OR REPLACE FUNCTION rebuild_listening_aggregates(p_user_id INTEGER DEFAULT NULL)
+RETURNS void AS $$
+BEGIN
+    LOCK TABLE listening_history IN SHARE MODE;
+
+    DELETE FROM user_genre_listens WHERE p_user_id IS NULL OR user_id = p_user_id;
+    DELETE FROM user_artist_listens WHERE p_user_id IS NULL OR user_id = p_user_id;
+    DELETE FROM user_track_listens WHERE p_user_id IS NULL OR user_id = p_user_id;
+    DELETE FROM user_listening_totals WHERE p_user_id IS NULL OR user_id = p_user_id;
+
+    INSERT INTO user_track_listens (user_id, track_id, listen_count, total_duration_ms, last_listened_at)
+    SELECT user_id, track_id, COUNT(*), COALESCE(SUM(listen_duration_ms), 0), MAX(listened_at)
+    FROM listening_history
+    WHERE p_user_id IS NULL OR user_id = p_user_id
+    GROUP BY user_id, track_id;
+
+    INSERT INTO user_listening_totals (user_id, total_listens, total_duration_ms, unique_tracks, last_listened_at)
+    SELECT user_id, SUM(listen_count), SUM(total_duration_ms), COUNT(*), MAX(last_listened_at)
+    FROM user_track_listens
+    WHERE p_user_id IS NULL OR user_id = p_user_id
+    GROUP BY user_id;
+
+    INSERT INTO user_artist_listens (user_id, artist_id, listen_count, unique_tracks)
+    SELECT utl.user_id, al.artist_id, SUM(utl.listen_count), COUNT(*)
+    FROM user_track_listens utl
+    JOIN tracks t ON t.track_id = utl.track_id
+    JOIN albums al ON al.album_id = t.album_id
+    WHERE p_user_id IS NULL OR utl.user_id = p_user_id
+    GROUP BY utl.user_id, al.artist_id;
+
+    INSERT INTO user_genre_listens (user_id, genre_id, listen_count, unique_tracks)
+    SELECT utl.user_id, tg.genre_id, SUM(utl.listen_count), COUNT(*)
+    FROM user_track_listens utl
+    JOIN track_genres tg ON tg.track_id = utl.track_id
+    WHERE p_user_id IS NULL OR utl.user_id = p_user_id
+    GROUP BY utl.user_id, tg.genre_id;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Заполняем по уже накопленной истории
+SELECT rebuild_listening_aggregates();
+
+ANALYZE user_listening_totals;
+ANALYZE user_track_listens;
+ANALYZE user_artist_listens;
+ANALYZE user_genre_listens;
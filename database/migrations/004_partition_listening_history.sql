@@ -0,0 +1,140 @@
+-- 004: listening_history секционируется по месяцам (RANGE по listened_at),
+-- дневные свертки по закрытым месяцам и хранение старых секций.
+-- Обслуживание (новые секции, свертки, удаление/архив) - database/partitions.py
+
+-- 1. Старая таблица уходит в сторону, ее последовательность переезжает к новой
+ALTER TABLE listening_history RENAME TO listening_history_legacy;
+ALTER SEQUENCE listening_history_listen_id_seq OWNED BY NONE;
+
+CREATE TABLE listening_history (
+    listen_id BIGINT NOT NULL DEFAULT nextval('listening_history_listen_id_seq'),
+    user_id INTEGER NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    track_id INTEGER NOT NULL REFERENCES tracks(track_id) ON DELETE CASCADE,
+    listened_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    listen_duration_ms INTEGER NOT NULL,
+    completion_percentage FLOAT,
+    -- Ключ секционирования обязан входить в первичный ключ
+    PRIMARY KEY (listen_id, listened_at)
+) PARTITION BY RANGE (listened_at);
+
+ALTER SEQUENCE listening_history_listen_id_seq AS BIGINT OWNED BY listening_history.listen_id;
+
+-- Страховка: строки вне созданных месяцев не теряются
+CREATE TABLE listening_history_default PARTITION OF listening_history DEFAULT;
+
+-- Схема для отсоединенных старых секций (политика хранения 'archive')
+CREATE SCHEMA IF NOT EXISTS archive;
+
+-- 2. Создание месячных секций с p_from по p_to (включительно по месяцам).
+-- Если в DEFAULT уже лежат строки этого месяца, они переносятся в новую
+-- секцию напрямую (минуя родителя, поэтому триггеры агрегатов не срабатывают).
+CREATE OR REPLACE FUNCTION ensure_listening_partitions(p_from DATE, p_to DATE)
+RETURNS INTEGER AS $$
+DECLARE
+    month_start DATE := date_trunc('month', p_from)::date;
+    month_end DATE;
+    partition_name TEXT;
+    created INTEGER := 0;
+BEGIN
+    WHILE month_start <= p_to LOOP
+        month_end := (month_start + INTERVAL '1 month')::date;
+        partition_name := format('listening_history_y%sm%s',
+                                 to_char(month_start, 'YYYY'), to_char(month_start, 'MM'));
+
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format('CREATE TABLE %I (LIKE listening_history INCLUDING DEFAULTS)', partition_name);
+            EXECUTE format(
+                'WITH moved AS (DELETE FROM listening_history_default
+                                WHERE listened_at >= %L AND listened_at < %L RETURNING *)
+                 INSERT INTO %I SELECT * FROM moved',
+                month_start, month_end, partition_name);
+            EXECUTE format('ALTER TABLE listening_history ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                           partition_name, month_start, month_end);
+            created := created + 1;
+        END IF;
+
+        month_start := month_end;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 3. Секции под существующую историю и на три месяца вперед, затем перенос данных
+SELECT ensure_listening_partitions(
+    COALESCE((SELECT MIN(listened_at)::date FROM listening_history_legacy), CURRENT_DATE),
+    (CURRENT_DATE + INTERVAL '3 months')::date
+);
+
+INSERT INTO listening_history (listen_id, user_id, track_id, listened_at, listen_duration_ms, completion_percentage)
+SELECT listen_id, user_id, track_id, COALESCE(listened_at, CURRENT_TIMESTAMP), listen_duration_ms, completion_percentage
+FROM listening_history_legacy;
+
+-- Агрегаты (003) уже посчитаны по этим строкам, триггер вешаем после переноса
+DROP TABLE listening_history_legacy CASCADE;
+
+CREATE INDEX idx_listening_history_user_date ON listening_history (user_id, listened_at);
+CREATE INDEX idx_listening_history_track ON listening_history (track_id);
+
+CREATE TRIGGER listening_history_aggregates
+    AFTER INSERT ON listening_history
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION listening_aggregates_on_insert();
+
+-- 4. Дневные свертки: по трекам и по пользователям
+CREATE TABLE IF NOT EXISTS listening_daily_track_stats (
+    day DATE NOT NULL,
+    track_id INTEGER NOT NULL REFERENCES tracks(track_id) ON DELETE CASCADE,
+    listens INTEGER NOT NULL,
+    unique_users INTEGER NOT NULL,
+    total_duration_ms BIGINT NOT NULL,
+    PRIMARY KEY (day, track_id)
+);
+
+CREATE TABLE IF NOT EXISTS listening_daily_user_stats (
+    day DATE NOT NULL,
+    user_id INTEGER NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    listens INTEGER NOT NULL,
+    unique_tracks INTEGER NOT NULL,
+    total_duration_ms BIGINT NOT NULL,
+    PRIMARY KEY (day, user_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_listening_daily_user_stats_user ON listening_daily_user_stats (user_id, day);
+
+-- Состояние месячных секций: когда свернута, когда удалена/архивирована
+CREATE TABLE IF NOT EXISTS listening_partition_log (
+    month DATE PRIMARY KEY,
+    rolled_up_at TIMESTAMP,
+    retired_at TIMESTAMP,
+    retired_to VARCHAR(20)
+);
+
+-- Свертка одного месяца (повторный запуск пересчитывает его заново)
+CREATE OR REPLACE FUNCTION rollup_listening_month(p_month DATE)
+RETURNS void AS $$
+DECLARE
+    month_start TIMESTAMP := date_trunc('month', p_month);
+    month_end TIMESTAMP := date_trunc('month', p_month) + INTERVAL '1 month';
+BEGIN
+    DELETE FROM listening_daily_track_stats WHERE day >= month_start AND day < month_end;
+    DELETE FROM listening_daily_user_stats WHERE day >= month_start AND day < month_end;
+
+    INSERT INTO listening_daily_track_stats (day, track_id, listens, unique_users, total_duration_ms)
+    SELECT listened_at::date, track_id, COUNT(*), COUNT(DISTINCT user_id), COALESCE(SUM(listen_duration_ms), 0)
+    FROM listening_history
+    WHERE listened_at >= month_start AND listened_at < month_end
+    GROUP BY listened_at::date, track_id;
+
+    INSERT INTO listening_daily_user_stats (day, user_id, listens, unique_tracks, total_duration_ms)
+    SELECT listened_at::date, user_id, COUNT(*), COUNT(DISTINCT track_id), COALESCE(SUM(listen_duration_ms), 0)
+    FROM listening_history
+    WHERE listened_at >= month_start AND listened_at < month_end
+    GROUP BY listened_at::date, user_id;
+
+    INSERT INTO listening_partition_log (month, rolled_up_at)
+    VALUES (month_start::date, CURRENT_TIMESTAMP)
+    ON CONFLICT (month) DO UPDATE SET rolled_up_at = EXCLUDED.rolled_up_at;
+END;
+$$ LANGUAGE plpgsql;
+
+ANALYZE listening_history;
@@ -0,0 +1,11 @@
+-- 005: готовые рекомендации (services/recommendation_engine.py)
+-- Одна строка на пользователя ('user') или трек ('track'): списки в массивах,
+-- чтобы выдача была одним чтением по первичному ключу.
+CREATE TABLE IF NOT EXISTS recommendation_cache (
+    kind VARCHAR(10) NOT NULL CHECK (kind IN ('user', 'track')),
+    subject_id INTEGER NOT NULL,
+    track_ids INTEGER[] NOT NULL,
+    scores REAL[] NOT NULL,
+    generated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (kind, subject_id)
+);
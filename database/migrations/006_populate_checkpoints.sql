@@ -0,0 +1,24 @@
+-- 006: контрольные точки наполнения каталога из Spotify (services/data_populator.py)
+-- Прогон, прерванный на середине, продолжается с того же места: артисты,
+-- отмеченные в populate_checkpoints этим прогоном, пропускаются.
+CREATE TABLE IF NOT EXISTS populate_runs (
+    run_id SERIAL PRIMARY KEY,
+    mode VARCHAR(10) NOT NULL CHECK (mode IN ('full', 'refresh')),
+    status VARCHAR(10) NOT NULL DEFAULT 'running' CHECK (status IN ('running', 'completed', 'failed')),
+    started_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP,
+    artists_total INTEGER NOT NULL DEFAULT 0,
+    artists_done INTEGER NOT NULL DEFAULT 0
+);
+
+-- Последняя обработка артиста: каким прогоном, когда и с каким отпечатком
+-- данных Spotify (по отпечатку режим refresh понимает, что артист изменился)
+CREATE TABLE IF NOT EXISTS populate_checkpoints (
+    spotify_artist_id VARCHAR(100) PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES populate_runs(run_id),
+    fingerprint VARCHAR(40) NOT NULL,
+    tracks_loaded INTEGER NOT NULL DEFAULT 0,
+    processed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_populate_checkpoints_run ON populate_checkpoints (run_id);
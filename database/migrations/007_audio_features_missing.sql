@@ -0,0 +1,7 @@
+-- 007: треки, для которых Spotify не вернул аудио-характеристики (null на их месте)
+-- services/audio_features.py больше не запрашивает их при каждом прогоне.
+-- Чтобы проверить трек заново, достаточно удалить его строку.
+CREATE TABLE IF NOT EXISTS audio_features_missing (
+    track_id INTEGER PRIMARY KEY REFERENCES tracks(track_id) ON DELETE CASCADE,
+    checked_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,157 @@
+# database/partitions.py
+"""Обслуживание месячных секций listening_history
+
+- создает секции на LISTEN_PARTITIONS_AHEAD месяцев вперед;
+- сворачивает закрытые месяцы в дневные таблицы
+  listening_daily_track_stats / listening_daily_user_stats;
+- секции старше LISTEN_RETENTION_MONTHS (только уже свернутые) отсоединяет
+  и переносит в схему archive или удаляет (LISTEN_RETENTION_MODE).
+
+Агрегаты пользователей (migrations/003) хранят итоги за все время и от
+удаления сырых секций не меняются; но rebuild_listening_aggregates после
+этого посчитает только оставшуюся историю.
+
+Запуск (например, из cron раз в сутки):
+    python -m database.partitions                 # все шаги
+    python -m database.partitions --ensure --rollup
+"""
+import argparse
+import logging
+import re
+from datetime import date
+
+from psycopg2 import sql
+
+from config import config
+from database.connection import db
+from database.queries import partitions as partition_queries
+
+logger = logging.getLogger(__name__)
+
+_PARTITION_RE = re.compile(r'^listening_history_y(\d{4})m(\d{2})$')
+
+
+def _add_months(month, count):
+    """Первое число месяца, сдвинутого на count месяцев"""
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _current_month():
+    return date.today().replace(day=1)
+
+
+def ensure_partitions(months_back=0, months_ahead=None, start_month=None, end_month=None):
+    """
+    Создать недостающие секции от (текущий месяц - months_back) до + months_ahead
+
+    Args:
+        start_month (date): Первый месяц диапазона вместо текущий - months_back
+        end_month (date): Последний месяц диапазона (включительно) вместо текущий + months_ahead
+    """
+    months_ahead = config.LISTEN_PARTITIONS_AHEAD if months_ahead is None else months_ahead
+    current = _current_month()
+    start_month = start_month.replace(day=1) if start_month else _add_months(current, -months_back)
+    end_month = end_month.replace(day=1) if end_month else _add_months(current, months_ahead)
+    with db.transaction() as tx:
+        result = tx.execute(
+            partition_queries.ENSURE_PARTITIONS,
+            (start_month, end_month),
+            fetch_one=True
+        )
+    created = result['created'] if result else 0
+    if created:
+        logger.info(f"🗂️ Created {created} listening_history partitions")
+    return created
+
+
+def list_partitions():
+    """Месячные секции: [(имя, первое число месяца)] по возрастанию"""
+    rows = db.execute_query(partition_queries.LIST_PARTITIONS, fetch=True) or []
+    partitions = []
+    for row in rows:
+        match = _PARTITION_RE.match(row['partition_name'])
+        if match:
+            partitions.append((row['partition_name'], date(int(match.group(1)), int(match.group(2)), 1)))
+    return partitions
+
+
+def _partition_log():
+    rows = db.execute_query(partition_queries.GET_PARTITION_LOG, fetch=True) or []
+    return {row['month']: row for row in rows}
+
+
+def rollup_closed_partitions(force=False):
+    """Свернуть закрытые (прошедшие) месяцы, которые еще не сворачивались"""
+    current = _current_month()
+    log = _partition_log()
+    rolled = 0
+    for name, month in list_partitions():
+        if month >= current:
+            continue
+        if not force and log.get(month) and log[month]['rolled_up_at']:
+            continue
+        with db.transaction() as tx:
+            tx.execute(partition_queries.ROLLUP_MONTH, (month,))
+        rolled += 1
+        logger.info(f"📊 Rolled up {name}")
+    return rolled
+
+
+def apply_retention(keep_months=None, mode=None):
+    """Отсоединить секции старше keep_months закрытых месяцев: в архив или удалить"""
+    keep_months = config.LISTEN_RETENTION_MONTHS if keep_months is None else keep_months
+    mode = mode or config.LISTEN_RETENTION_MODE
+    if mode not in ('archive', 'drop'):
+        raise ValueError(f"Unknown retention mode: {mode}")
+
+    cutoff = _add_months(_current_month(), -keep_months)
+    log = _partition_log()
+    retired = 0
+    for name, month in list_partitions():
+        if month >= cutoff:
+            break
+        if not (log.get(month) and log[month]['rolled_up_at']):
+            # Сырые данные нельзя терять без свертки
+            logger.warning(f"⚠️ {name} is not rolled up yet, skipping retention")
+            continue
+
+        partition = sql.Identifier(name)
+        with db.transaction() as tx:
+            statements = [sql.SQL("ALTER TABLE listening_history DETACH PARTITION {}").format(partition)]
+            if mode == 'archive':
+                statements.append(sql.SQL("ALTER TABLE {} SET SCHEMA archive").format(partition))
+            else:
+                statements.append(sql.SQL("DROP TABLE {}").format(partition))
+            for statement in statements:
+                tx.execute(statement.as_string(tx.conn))
+            tx.execute(partition_queries.MARK_RETIRED, (month, mode))
+        retired += 1
+        logger.info(f"🧹 {name}: {'moved to archive' if mode == 'archive' else 'dropped'}")
+    return retired
+
+
+def run_maintenance():
+    """Все шаги обслуживания по порядку"""
+    ensure_partitions()
+    rollup_closed_partitions()
+    apply_retention()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description='listening_history partition maintenance')
+    parser.add_argument('--ensure', action='store_true', help='create upcoming monthly partitions')
+    parser.add_argument('--rollup', action='store_true', help='roll up closed months into daily tables')
+    parser.add_argument('--retention', action='store_true', help='archive or drop expired partitions')
+    parser.add_argument('--force-rollup', action='store_true', help='recompute already rolled up months')
+    args = parser.parse_args()
+
+    run_all = not (args.ensure or args.rollup or args.retention)
+    if run_all or args.ensure:
+        ensure_partitions()
+    if run_all or args.rollup:
+        rollup_closed_partitions(force=args.force_rollup)
+    if run_all or args.retention:
+        apply_retention()
@@ -0,0 +1,249 @@
+# database/pool.py
+import os
+import threading
+import time
+import logging
+from collections import deque
+
+import psycopg2
+import psycopg2.extras
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    """Не удалось получить соединение из пула за отведенное время"""
+
+
+class ConnectionPool:
+    """Потокобезопасный пул соединений PostgreSQL
+
+    - держит от min_size до max_size соединений;
+    - ждет свободное соединение не дольше timeout секунд;
+    - проверяет соединение при выдаче (закрытое или долго простаивавшее);
+    - после fork() в дочернем процессе создает соединения заново.
+    """
+
+    def __init__(self, connection_params, min_size=1, max_size=10, timeout=5.0,
+                 healthcheck_idle=30.0, name='primary'):
+        self.connection_params = connection_params
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.healthcheck_idle = healthcheck_idle
+        self.name = name
+
+        self._cond = threading.Condition(threading.Lock())
+        self._reset_state()
+
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _reset_state(self):
+        """Сбросить внутреннее состояние пула"""
+        self._pid = os.getpid()
+        self._idle = deque()          # (conn, время возврата в пул)
+        self._in_use = set()
+        self._opening = 0
+        self._waiting = 0
+        # Соединения, унаследованные от родительского процесса. Их нельзя
+        # закрывать в потомке (это оборвет сессию родителя), поэтому просто
+        # держим ссылки, чтобы сборщик мусора их не трогал.
+        self._orphans = []
+
+        self._checkouts = 0
+        self._timeouts = 0
+        self._created = 0
+        self._discarded = 0
+        self._checkout_time_total = 0.0
+        self._checkout_time_max = 0.0
+
+    def _after_fork(self):
+        """Вызывается в дочернем процессе после fork()"""
+        inherited = [conn for conn, _ in self._idle] + list(self._in_use)
+        self._cond = threading.Condition(threading.Lock())
+        self._reset_state()
+        self._orphans = inherited
+
+    def _check_pid(self):
+        """Подстраховка для окружений без os.register_at_fork"""
+        if self._pid != os.getpid():
+            self._after_fork()
+
+    def _connect(self):
+        """Открыть новое физическое соединение"""
+        if isinstance(self.connection_params, str):
+            conn = psycopg2.connect(self.connection_params,
+                                    cursor_factory=psycopg2.extras.DictCursor)
+        else:
+            conn = psycopg2.connect(**self.connection_params,
+                                    cursor_factory=psycopg2.extras.DictCursor)
+        logger.debug(f"Pool '{self.name}': new connection established")
+        return conn
+
+    def _is_healthy(self, conn, idle_since):
+        """Проверить соединение перед выдачей"""
+        if conn.closed:
+            return False
+        if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            return False
+        if time.monotonic() - idle_since < self.healthcheck_idle:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        """Закрыть соединение, не возвращая его в пул"""
+        self._discarded += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def warmup(self):
+        """Открыть min_size соединений заранее"""
+        self._check_pid()
+        with self._cond:
+            missing = self.min_size - len(self._idle) - len(self._in_use) - self._opening
+            self._opening += max(missing, 0)
+        for _ in range(max(missing, 0)):
+            try:
+                conn = self._connect()
+            except psycopg2.Error as e:
+                with self._cond:
+                    self._opening -= 1
+                    self._cond.notify()
+                logger.error(f"Pool '{self.name}': warmup failed: {e}")
+                continue
+            with self._cond:
+                self._opening -= 1
+                self._created += 1
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+
+    def getconn(self, timeout=None):
+        """Взять соединение из пула
+
+        Raises:
+            PoolTimeout: если свободное соединение не появилось за timeout
+            psycopg2.OperationalError: если не удалось открыть новое соединение
+        """
+        self._check_pid()
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+
+        while True:
+            conn = None
+            idle_since = None
+            with self._cond:
+                while True:
+                    if self._idle:
+                        conn, idle_since = self._idle.pop()
+                        self._in_use.add(conn)
+                        break
+                    if len(self._in_use) + self._opening < self.max_size:
+                        self._opening += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(
+                            f"Pool '{self.name}': no free connection in {timeout:.1f}s "
+                            f"(max_size={self.max_size})"
+                        )
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+
+            if conn is None:
+                # Свободных нет, но лимит позволяет открыть новое
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._opening -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._opening -= 1
+                    self._created += 1
+                    self._in_use.add(conn)
+            elif not self._is_healthy(conn, idle_since):
+                logger.warning(f"Pool '{self.name}': dropping broken connection")
+                with self._cond:
+                    self._in_use.discard(conn)
+                    self._discard(conn)
+                    self._cond.notify()
+                continue
+
+            elapsed = time.monotonic() - started
+            with self._cond:
+                self._checkouts += 1
+                self._checkout_time_total += elapsed
+                self._checkout_time_max = max(self._checkout_time_max, elapsed)
+            return conn
+
+    def putconn(self, conn, close=False):
+        """Вернуть соединение в пул"""
+        if self._pid != os.getpid():
+            # Соединение из родительского процесса - не трогаем
+            return
+
+        if not close and not conn.closed:
+            try:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                close = True
+
+        with self._cond:
+            if conn not in self._in_use:
+                return
+            self._in_use.discard(conn)
+            if close or conn.closed:
+                self._discard(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def closeall(self):
+        """Закрыть все свободные соединения пула"""
+        with self._cond:
+            while self._idle:
+                conn, _ = self._idle.pop()
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+    def load(self):
+        """Текущая загрузка пула: занятые соединения и ожидающие потоки"""
+        return len(self._in_use) + self._opening + self._waiting
+
+    def stats(self):
+        """Статистика пула для подбора размеров под нагрузкой"""
+        with self._cond:
+            checkouts = self._checkouts
+            return {
+                'name': self.name,
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'in_use': len(self._in_use),
+                'idle': len(self._idle),
+                'opening': self._opening,
+                'waiting': self._waiting,
+                'checkouts': checkouts,
+                'timeouts': self._timeouts,
+                'created': self._created,
+                'discarded': self._discarded,
+                'avg_checkout_ms': round(self._checkout_time_total / checkouts * 1000, 3) if checkouts else 0.0,
+                'max_checkout_ms': round(self._checkout_time_max * 1000, 3),
+            }
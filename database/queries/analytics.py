@@ -1,48 +1,120 @@
 # database/queries/analytics.py
+# Агрегаты пользователя (migrations/003_listening_aggregates.sql): обновляются
+# триггером при каждой вставке в listening_history, поэтому чтение - это
+# top-k строк по индексу (user_id, listen_count DESC), а не пересчет истории.
+
+# Итоги прослушиваний пользователя
+USER_LISTENING_TOTALS = """
+SELECT
+    unique_tracks,
+    total_listens,
+    total_duration_ms,
+    last_listened_at
+FROM user_listening_totals
+WHERE user_id = %s
+"""
+
 # Топ жанров пользователя
 USER_TOP_GENRES = """
-SELECT 
+SELECT
     g.genre_name,
-    COUNT(*) as listen_count,
-    COUNT(DISTINCT lh.track_id) as unique_tracks
-FROM listen_history lh
-JOIN tracks t ON lh.track_id = t.track_id
-JOIN artists a ON t.artist_id = a.artist_id
-JOIN artist_genres ag ON a.artist_id = ag.artist_id
-JOIN genres g ON ag.genre_id = g.genre_id
-WHERE lh.user_id = %s
-GROUP BY g.genre_id, g.genre_name
-ORDER BY listen_count DESC
-LIMIT 10
+    ugl.listen_count,
+    ugl.unique_tracks
+FROM user_genre_listens ugl
+JOIN genres g ON ugl.genre_id = g.genre_id
+WHERE ugl.user_id = %s
+ORDER BY ugl.listen_count DESC
+LIMIT %s
 """
 
 # Топ артистов пользователя
 USER_TOP_ARTISTS = """
-SELECT 
+SELECT
     a.artist_name,
-    COUNT(*) as listen_count,
-    COUNT(DISTINCT lh.track_id) as unique_tracks
-FROM listen_history lh
-JOIN tracks t ON lh.track_id = t.track_id
-JOIN artists a ON t.artist_id = a.artist_id
-WHERE lh.user_id = %s
-GROUP BY a.artist_id, a.artist_name
-ORDER BY listen_count DESC
-LIMIT 10
+    ual.listen_count,
+    ual.unique_tracks
+FROM user_artist_listens ual
+JOIN artists a ON ual.artist_id = a.artist_id
+WHERE ual.user_id = %s
+ORDER BY ual.listen_count DESC
+LIMIT %s
 """
 
-# История прослушиваний
+# Пересчет агрегатов из listening_history (NULL - всех пользователей)
+REBUILD_LISTENING_AGGREGATES = "SELECT rebuild_listening_aggregates(%s)"
+
+# История прослушиваний (параметры: user_id, начало периода, limit)
 USER_LISTENING_HISTORY = """
-SELECT 
+SELECT
     lh.listened_at,
-    t.track_name as track_title,  
-    al.album_name as album_title,  
+    t.track_name,
+    a.artist_name,
+    al.album_name,
+    lh.listen_duration_ms,
     lh.completion_percentage
 FROM listening_history lh
 JOIN tracks t ON lh.track_id = t.track_id
-JOIN artists a ON t.artist_id = a.artist_id  
 JOIN albums al ON t.album_id = al.album_id
+JOIN artists a ON al.artist_id = a.artist_id
 WHERE lh.user_id = %s
+  AND lh.listened_at >= %s  -- нижняя граница: отсекает старые месячные секции
 ORDER BY lh.listened_at DESC
 LIMIT %s
-"""
\ No newline at end of file
+"""
+# Вся страница статистики одним запросом: каждая часть - подзапрос,
+# списки собираются в json, чтобы вернуть одну строку за один round trip.
+# Параметры: user_id, genres_limit, artists_limit, history_since, history_limit
+USER_STATISTICS = """
+SELECT
+    (
+        SELECT row_to_json(totals)
+        FROM (
+            SELECT unique_tracks, total_listens, total_duration_ms
+            FROM user_listening_totals
+            WHERE user_id = %(user_id)s
+        ) totals
+    ) AS totals,
+    (SELECT COUNT(*) FROM playlists WHERE user_id = %(user_id)s) AS playlist_count,
+    COALESCE((
+        SELECT json_agg(genres)
+        FROM (
+            SELECT g.genre_name, ugl.listen_count, ugl.unique_tracks
+            FROM user_genre_listens ugl
+            JOIN genres g ON ugl.genre_id = g.genre_id
+            WHERE ugl.user_id = %(user_id)s
+            ORDER BY ugl.listen_count DESC
+            LIMIT %(genres_limit)s
+        ) genres
+    ), '[]'::json) AS top_genres,
+    COALESCE((
+        SELECT json_agg(artists)
+        FROM (
+            SELECT a.artist_name, ual.listen_count, ual.unique_tracks
+            FROM user_artist_listens ual
+            JOIN artists a ON ual.artist_id = a.artist_id
+            WHERE ual.user_id = %(user_id)s
+            ORDER BY ual.listen_count DESC
+            LIMIT %(artists_limit)s
+        ) artists
+    ), '[]'::json) AS top_artists,
+    COALESCE((
+        SELECT json_agg(history)
+        FROM (
+            SELECT
+                lh.listened_at,
+                t.track_name,
+                a.artist_name,
+                al.album_name,
+                lh.listen_duration_ms,
+                lh.completion_percentage
+            FROM listening_history lh
+            JOIN tracks t ON lh.track_id = t.track_id
+            JOIN albums al ON t.album_id = al.album_id
+            JOIN artists a ON al.artist_id = a.artist_id
+            WHERE lh.user_id = %(user_id)s
+              AND lh.listened_at >= %(history_since)s
+            ORDER BY lh.listened_at DESC
+            LIMIT %(history_limit)s
+        ) history
+    ), '[]'::json) AS listening_history
+"""
@@ -0,0 +1,36 @@
+# database/queries/audio_features.py
+"""Аудио-характеристики треков (Spotify audio features)"""
+
+# Треки, для которых характеристики еще не загружены и не известно, что их нет
+TRACKS_WITHOUT_AUDIO_FEATURES = """
+SELECT t.track_id, t.spotify_track_id
+FROM tracks t
+LEFT JOIN audio_features af ON af.track_id = t.track_id
+LEFT JOIN audio_features_missing afm ON afm.track_id = t.track_id
+WHERE af.track_id IS NULL
+  AND afm.track_id IS NULL
+ORDER BY t.track_id
+"""
+
+INSERT_AUDIO_FEATURES = """
+INSERT INTO audio_features (track_id, danceability, energy, key, loudness, mode, speechiness,
+                            acousticness, instrumentalness, liveness, valence, tempo, time_signature)
+VALUES %s
+ON CONFLICT (track_id) DO NOTHING
+"""
+
+# Отметить треки, для которых Spotify вернул null (migrations/007_audio_features_missing.sql)
+INSERT_AUDIO_FEATURES_MISSING = """
+INSERT INTO audio_features_missing (track_id)
+VALUES %s
+ON CONFLICT (track_id) DO NOTHING
+"""
+
+# Загрузка индекса похожих по звучанию треков (инкрементально по track_id)
+AUDIO_FEATURE_VECTORS = """
+SELECT track_id, danceability, energy, key, loudness, mode, speechiness,
+       acousticness, instrumentalness, liveness, valence, tempo
+FROM audio_features
+WHERE track_id > %s
+ORDER BY track_id
+"""
@@ -0,0 +1,27 @@
+# database/queries/partitions.py
+"""Обслуживание месячных секций listening_history (migrations/004_partition_listening_history.sql)"""
+
+# Создать недостающие месячные секции в диапазоне дат
+ENSURE_PARTITIONS = "SELECT ensure_listening_partitions(%s, %s) AS created"
+
+# Месячные секции (без DEFAULT)
+LIST_PARTITIONS = """
+SELECT c.relname AS partition_name
+FROM pg_inherits i
+JOIN pg_class c ON c.oid = i.inhrelid
+WHERE i.inhparent = 'listening_history'::regclass
+  AND c.relname ~ '^listening_history_y[0-9]{4}m[0-9]{2}$'
+ORDER BY c.relname
+"""
+
+# Состояние секций: свертка и удаление/архив
+GET_PARTITION_LOG = "SELECT month, rolled_up_at, retired_at, retired_to FROM listening_partition_log"
+
+# Дневные свертки одного месяца
+ROLLUP_MONTH = "SELECT rollup_listening_month(%s)"
+
+MARK_RETIRED = """
+INSERT INTO listening_partition_log (month, retired_at, retired_to)
+VALUES (%s, CURRENT_TIMESTAMP, %s)
+ON CONFLICT (month) DO UPDATE SET retired_at = EXCLUDED.retired_at, retired_to = EXCLUDED.retired_to
+"""
@@ -0,0 +1,126 @@
+# database/queries/populate.py
+"""Наполнение каталога из Spotify: прогоны, контрольные точки, upsert каталога"""
+
+# Последний прогон режима: если он не завершен, его продолжаем
+GET_LAST_RUN = """
+SELECT run_id, mode, status, started_at, artists_total, artists_done
+FROM populate_runs
+WHERE mode = %s
+ORDER BY run_id DESC
+LIMIT 1
+"""
+
+CREATE_RUN = "INSERT INTO populate_runs (mode) VALUES (%s) RETURNING run_id"
+
+SET_RUN_TOTAL = "UPDATE populate_runs SET artists_total = %s WHERE run_id = %s"
+
+FINISH_RUN = """
+UPDATE populate_runs
+SET status = %s, finished_at = CURRENT_TIMESTAMP
+WHERE run_id = %s
+"""
+
+# Контрольные точки артистов из списка (spotify id) - для пропуска и сравнения отпечатков
+GET_CHECKPOINTS = """
+SELECT spotify_artist_id, run_id, fingerprint, processed_at
+FROM populate_checkpoints
+WHERE spotify_artist_id = ANY(%s)
+"""
+
+# Пакет контрольных точек: (spotify_artist_id, run_id, fingerprint, tracks_loaded)
+SAVE_CHECKPOINTS = """
+INSERT INTO populate_checkpoints (spotify_artist_id, run_id, fingerprint, tracks_loaded)
+VALUES %s
+ON CONFLICT (spotify_artist_id) DO UPDATE SET
+    run_id = EXCLUDED.run_id,
+    fingerprint = EXCLUDED.fingerprint,
+    tracks_loaded = EXCLUDED.tracks_loaded,
+    processed_at = CURRENT_TIMESTAMP
+"""
+
+# Артисты не изменились - только переносим отметки в текущий прогон
+TOUCH_CHECKPOINTS = """
+UPDATE populate_checkpoints SET run_id = %s
+WHERE spotify_artist_id = ANY(%s)
+"""
+
+ADVANCE_RUN = "UPDATE populate_runs SET artists_done = artists_done + %s WHERE run_id = %s"
+
+# Артисты, уже загруженные в каталог (очередь режима refresh)
+KNOWN_ARTISTS = """
+SELECT spotify_artist_id
+FROM artists
+ORDER BY artist_id
+LIMIT %s
+"""
+
+# Upsert пакетами (VALUES %s): повторный прогон обновляет строки, а не падает
+# на уникальности. RETURNING отдает (spotify_id, db_id) и для вставленных, и
+# для обновленных строк, поэтому повторный SELECT не нужен. Ключи в одном
+# пакете должны быть уникальны (ON CONFLICT DO UPDATE не меняет строку дважды).
+UPSERT_ROLES = """
+INSERT INTO user_roles (role_name, role_description)
+VALUES %s
+ON CONFLICT (role_name) DO NOTHING
+"""
+
+EXISTING_USERNAMES = "SELECT username FROM users WHERE username = ANY(%s)"
+
+INSERT_USERS = """
+INSERT INTO users (username, email, password_hash, first_name, last_name, role_id)
+VALUES %s
+ON CONFLICT DO NOTHING
+"""
+
+UPSERT_GENRES = """
+INSERT INTO genres (genre_name)
+VALUES %s
+ON CONFLICT (genre_name) DO UPDATE SET genre_name = EXCLUDED.genre_name
+RETURNING genre_name, genre_id
+"""
+
+UPSERT_ARTISTS = """
+INSERT INTO artists (spotify_artist_id, artist_name, popularity_score, followers_count, image_url)
+VALUES %s
+ON CONFLICT (spotify_artist_id) DO UPDATE SET
+    artist_name = EXCLUDED.artist_name,
+    popularity_score = EXCLUDED.popularity_score,
+    followers_count = EXCLUDED.followers_count,
+    image_url = EXCLUDED.image_url
+RETURNING spotify_artist_id AS spotify_id, artist_id AS db_id
+"""
+
+UPSERT_ALBUMS = """
+INSERT INTO albums (spotify_album_id, album_name, artist_id, album_type,
+                    total_tracks, release_date, release_date_precision, cover_url)
+VALUES %s
+ON CONFLICT (spotify_album_id) DO UPDATE SET
+    album_name = EXCLUDED.album_name,
+    total_tracks = EXCLUDED.total_tracks,
+    cover_url = EXCLUDED.cover_url
+RETURNING spotify_album_id AS spotify_id, album_id AS db_id
+"""
+
+UPSERT_TRACKS = """
+INSERT INTO tracks (spotify_track_id, track_name, album_id, duration_ms,
+                    track_number, disc_number, explicit, popularity_score,
+                    preview_url, full_track_url, external_url)
+VALUES %s
+ON CONFLICT (spotify_track_id) DO UPDATE SET
+    track_name = EXCLUDED.track_name,
+    popularity_score = EXCLUDED.popularity_score,
+    preview_url = EXCLUDED.preview_url,
+    external_url = EXCLUDED.external_url
+RETURNING spotify_track_id AS spotify_id, track_id AS db_id
+"""
+
+# Активность генерируется один раз: только пользователям без плейлиста "Избранное"
+USERS_WITHOUT_ACTIVITY = """
+SELECT u.user_id
+FROM users u
+WHERE u.role_id = 1
+  AND NOT EXISTS (
+      SELECT 1 FROM playlists p
+      WHERE p.user_id = u.user_id AND p.is_favorite
+  )
+"""
@@ -0,0 +1,74 @@
+# database/queries/recommendations.py
+"""Рекомендации: входные данные для расчета и выдача из recommendation_cache"""
+
+# Взаимодействия пользователь-трек с весом: прослушивания (из агрегатов,
+# логарифм числа прослушиваний) плюс бонус за избранное. Параметр: вес избранного.
+GET_INTERACTIONS = """
+SELECT user_id, track_id, SUM(weight)::float8 AS weight
+FROM (
+    SELECT user_id, track_id, ln(1 + listen_count) AS weight
+    FROM user_track_listens
+    UNION ALL
+    SELECT user_id, track_id, %s AS weight
+    FROM favorite_tracks
+) interactions
+GROUP BY user_id, track_id
+"""
+
+DELETE_RECOMMENDATIONS = "DELETE FROM recommendation_cache WHERE kind = %s"
+
+# Выдача: одна строка кэша по ключу, треки - в порядке рекомендаций
+GET_RECOMMENDED_TRACKS = """
+SELECT
+    t.track_id,
+    t.track_name,
+    t.duration_ms,
+    t.preview_url,
+    t.full_track_url,
+    t.popularity_score as popularity,
+    a.artist_name,
+    al.album_name,
+    al.cover_url,
+    r.score
+FROM recommendation_cache rc
+CROSS JOIN LATERAL unnest(rc.track_ids, rc.scores) WITH ORDINALITY AS r(track_id, score, position)
+JOIN tracks t ON t.track_id = r.track_id
+JOIN albums al ON t.album_id = al.album_id
+JOIN artists a ON al.artist_id = a.artist_id
+WHERE rc.kind = %s AND rc.subject_id = %s
+ORDER BY r.position
+LIMIT %s
+"""
+
+# Матрица числа прослушиваний для ALS (из агрегатов listening_history)
+GET_PLAY_COUNTS = """
+SELECT user_id, track_id, listen_count::float8 AS weight
+FROM user_track_listens
+"""
+
+# Текущие прослушивания одного пользователя (для fold-in в обученную модель)
+GET_USER_PLAY_COUNTS = """
+SELECT track_id, listen_count
+FROM user_track_listens
+WHERE user_id = %s
+"""
+
+# Карточки треков в заданном порядке: массивы track_id и оценок
+GET_TRACKS_BY_SCORES = """
+SELECT
+    t.track_id,
+    t.track_name,
+    t.duration_ms,
+    t.preview_url,
+    t.full_track_url,
+    t.popularity_score as popularity,
+    a.artist_name,
+    al.album_name,
+    al.cover_url,
+    r.score
+FROM unnest(%s::integer[], %s::real[]) WITH ORDINALITY AS r(track_id, score, position)
+JOIN tracks t ON t.track_id = r.track_id
+JOIN albums al ON t.album_id = al.album_id
+JOIN artists a ON al.artist_id = a.artist_id
+ORDER BY r.position
+"""
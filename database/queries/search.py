@@ -0,0 +1,101 @@
+# database/queries/search.py
+"""Поиск по каталогу: tsvector + pg_trgm с учетом популярности"""
+
+# Параметры: tsquery (строка для to_tsquery), text (исходный запрос),
+# user_id (для is_favorite, может быть NULL), limit.
+# Кандидаты - совпадение по tsvector (название, исполнитель, альбом с
+# префиксами) или триграммная похожесть названия (опечатки). Итоговый
+# score: релевантность текста + похожесть + популярность трека.
+_SEARCH_TRACKS_SELECT = """
+WITH q AS (
+    SELECT to_tsquery('simple', %(tsquery)s) AS tsq, %(text)s::text AS txt
+)
+SELECT
+    t.track_id,
+    t.track_name,
+    t.duration_ms,
+    t.preview_url,
+    t.full_track_url,
+    t.popularity_score as popularity,
+    t.explicit,
+    a.artist_id,
+    a.artist_name,
+    al.album_name,
+    al.cover_url,
+    EXISTS (
+        SELECT 1 FROM favorite_tracks ft
+        WHERE ft.user_id = %(user_id)s AND ft.track_id = t.track_id
+    ) as is_favorite,
+    (ts_rank_cd(t.search_vector, q.tsq) * 1.0
+        + similarity(t.track_name, q.txt) * 0.5
+        + t.popularity_score / 100.0 * 0.3)::float8 as score
+FROM q, tracks t
+JOIN albums al ON t.album_id = al.album_id
+JOIN artists a ON al.artist_id = a.artist_id
+WHERE t.search_vector @@ q.tsq OR t.track_name %% q.txt
+"""
+
+# Первая страница результатов
+SEARCH_TRACKS_RANKED = """
+SELECT * FROM (""" + _SEARCH_TRACKS_SELECT + """) s
+ORDER BY s.score DESC, s.track_id DESC
+LIMIT %(limit)s
+"""
+
+# Следующая страница: после (score, track_id)
+SEARCH_TRACKS_RANKED_AFTER = """
+SELECT * FROM (""" + _SEARCH_TRACKS_SELECT + """) s
+WHERE (s.score, s.track_id) < (%(score)s::float8, %(track_id)s)
+ORDER BY s.score DESC, s.track_id DESC
+LIMIT %(limit)s
+"""
+
+# Предыдущая страница: до (score, track_id), в обратном порядке
+SEARCH_TRACKS_RANKED_BEFORE = """
+SELECT * FROM (""" + _SEARCH_TRACKS_SELECT + """) s
+WHERE (s.score, s.track_id) > (%(score)s::float8, %(track_id)s)
+ORDER BY s.score ASC, s.track_id ASC
+LIMIT %(limit)s
+"""
+
+# Количество найденных треков (те же условия, без join'ов)
+COUNT_SEARCH_TRACKS = """
+SELECT COUNT(*) as count
+FROM tracks t
+WHERE t.search_vector @@ to_tsquery('simple', %(tsquery)s) OR t.track_name %% %(text)s
+"""
+
+# Треки для индекса автодополнения (services/autocomplete.py), инкрементально по track_id
+AUTOCOMPLETE_TRACKS = """
+SELECT
+    t.track_id,
+    t.track_name,
+    a.artist_name,
+    al.album_name,
+    t.preview_url,
+    t.popularity_score as popularity
+FROM tracks t
+JOIN albums al ON t.album_id = al.album_id
+JOIN artists a ON al.artist_id = a.artist_id
+WHERE t.track_id > %s
+ORDER BY t.track_id
+"""
+
+# Треки для индекса нечеткого поиска (services/fuzzy_search.py): поля карточки каталога
+FUZZY_INDEX_TRACKS = """
+SELECT
+    t.track_id,
+    t.track_name,
+    t.duration_ms,
+    t.preview_url,
+    t.full_track_url,
+    t.popularity_score as popularity,
+    a.artist_name,
+    al.album_name,
+    al.cover_url
+FROM tracks t
+JOIN albums al ON t.album_id = al.album_id
+JOIN artists a ON al.artist_id = a.artist_id
+WHERE t.track_id > %s
+ORDER BY t.track_id
+"""
@@ -1,30 +1,6 @@
 # ПОЛНОСТЬЮ ЗАМЕНИТЬ СОДЕРЖИМОЕ ФАЙЛА:
 
-# Поиск треков (ОБНОВЛЕНО под вашу схему)
-SEARCH_TRACKS = """
-SELECT 
-    t.track_id, 
-    t.track_name, 
-    t.duration_ms, 
-    t.preview_url, 
-    t.full_track_url,
-    t.popularity_score as popularity,
-    t.explicit,
-    a.artist_name, 
-    a.artist_id,
-    al.album_name as album_title, 
-    al.cover_url as cover_medium,
-    EXISTS (
-        SELECT 1 FROM favorite_tracks ft 
-        WHERE ft.user_id = %s AND ft.track_id = t.track_id
-    ) as is_favorite
-FROM tracks t
-JOIN artists a ON t.artist_id = a.artist_id
-JOIN albums al ON t.album_id = al.album_id
-WHERE t.track_name ILIKE %s OR a.artist_name ILIKE %s OR al.album_name ILIKE %s
-ORDER BY t.popularity_score DESC
-LIMIT %s OFFSET %s
-"""
+# Поиск треков - см. database/queries/search.py
 
 # Детали трека (ОБНОВЛЕНО)
 GET_TRACK_BY_ID = """
@@ -34,8 +10,8 @@ SELECT
     al.album_name as album_title,
     al.cover_url as cover_large
 FROM tracks t
-JOIN artists a ON t.artist_id = a.artist_id
 JOIN albums al ON t.album_id = al.album_id
+JOIN artists a ON al.artist_id = a.artist_id
 WHERE t.track_id = %s
 """
 
@@ -52,13 +28,13 @@ SELECT
     al.album_name as album_title, 
     al.cover_url as cover_medium
 FROM tracks t
-JOIN artists a ON t.artist_id = a.artist_id
 JOIN albums al ON t.album_id = al.album_id
+JOIN artists a ON al.artist_id = a.artist_id
 ORDER BY t.popularity_score DESC
-LIMIT %s
+LIMIT %s OFFSET %s
 """
 
-# Все треки (админ) (ОБНОВЛЕНО)
+# Все треки (админ): keyset-пагинация по track_id
 GET_ALL_TRACKS = """
 SELECT 
     t.track_id, 
@@ -69,14 +45,16 @@ SELECT
     a.artist_name,
     al.album_name as album_title
 FROM tracks t
-JOIN artists a ON t.artist_id = a.artist_id
 JOIN albums al ON t.album_id = al.album_id
+JOIN artists a ON al.artist_id = a.artist_id
+WHERE t.track_id > %s
 ORDER BY t.track_id
-LIMIT %s OFFSET %s
+LIMIT %s
 """
 
-# Получить треки для каталога (ОБНОВЛЕНО)
-GET_TRACKS_FOR_CATALOG = """
+# Треки для каталога: keyset-пагинация по (popularity_score, track_id),
+# индекс idx_tracks_popularity_keyset (migrations/002_keyset_pagination.sql)
+_CATALOG_TRACKS_SELECT = """
 SELECT 
     t.track_id,
     t.track_name,
@@ -88,28 +66,36 @@ SELECT
     al.album_name as album_name,
     al.cover_url as cover_url
 FROM tracks t
-JOIN artists a ON t.artist_id = a.artist_id
 JOIN albums al ON t.album_id = al.album_id
-ORDER BY t.popularity_score DESC
-LIMIT %s OFFSET %s
+JOIN artists a ON al.artist_id = a.artist_id
 """
 
-# Поиск треков для каталога (ОБНОВЛЕНО)
-SEARCH_TRACKS_FOR_CATALOG = """
-SELECT 
-    t.track_id,
-    t.track_name,
-    t.duration_ms,
-    t.preview_url,
-    t.full_track_url,
-    t.popularity_score as popularity,
-    a.artist_name,
-    al.album_name as album_name,
-    al.cover_url as cover_url
-FROM tracks t
-JOIN artists a ON t.artist_id = a.artist_id
-JOIN albums al ON t.album_id = al.album_id
-WHERE t.track_name ILIKE %s OR a.artist_name ILIKE %s OR al.album_name ILIKE %s
-ORDER BY t.popularity_score DESC
-LIMIT %s OFFSET %s
-"""
\ No newline at end of file
+# Первая страница каталога
+GET_TRACKS_FOR_CATALOG = _CATALOG_TRACKS_SELECT + """
+ORDER BY t.popularity_score DESC, t.track_id DESC
+LIMIT %s
+"""
+
+# Следующая страница: треки после (popularity, track_id)
+GET_TRACKS_FOR_CATALOG_AFTER = _CATALOG_TRACKS_SELECT + """
+WHERE (t.popularity_score, t.track_id) < (%s, %s)
+ORDER BY t.popularity_score DESC, t.track_id DESC
+LIMIT %s
+"""
+
+# Предыдущая страница: треки до (popularity, track_id), в обратном порядке
+GET_TRACKS_FOR_CATALOG_BEFORE = _CATALOG_TRACKS_SELECT + """
+WHERE (t.popularity_score, t.track_id) > (%s, %s)
+ORDER BY t.popularity_score ASC, t.track_id ASC
+LIMIT %s
+"""
+
+# Оценка количества треков по статистике планировщика (без COUNT(*) по таблице)
+ESTIMATE_TRACKS_COUNT = """
+SELECT reltuples::bigint as count FROM pg_class WHERE oid = 'tracks'::regclass
+"""
+
+# Точное количество треков (для маленьких таблиц, где оценки может не быть)
+COUNT_TRACKS = """
+SELECT COUNT(*) as count FROM tracks
+"""
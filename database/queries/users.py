@@ -37,7 +37,8 @@ SELECT
     (SELECT COUNT(*) FROM users) as total_users,
     (SELECT COUNT(*) FROM tracks) as total_tracks,
     (SELECT COUNT(*) FROM artists) as total_artists,
-    (SELECT COUNT(*) FROM listen_history) as total_listens
+    -- Итоги за все время из агрегатов: не зависит от размера и хранения сырой истории
+    (SELECT COALESCE(SUM(total_listens), 0) FROM user_listening_totals) as total_listens
 """
 
 # Все пользователи
@@ -0,0 +1,19 @@
+# database/queries/workload.py
+"""Синтетическая нагрузка (generate_workload.py)"""
+
+# Сгенерированные строки получают явные id после уже существующих
+MAX_IDS = """
+SELECT
+    (SELECT COALESCE(MAX(user_id), 0) FROM users) AS users,
+    (SELECT COALESCE(MAX(artist_id), 0) FROM artists) AS artists,
+    (SELECT COALESCE(MAX(album_id), 0) FROM albums) AS albums,
+    (SELECT COALESCE(MAX(track_id), 0) FROM tracks) AS tracks,
+    (SELECT COALESCE(MAX(playlist_id), 0) FROM playlists) AS playlists
+"""
+
+GET_GENRE_IDS = "SELECT genre_id FROM genres ORDER BY genre_id"
+
+GET_USER_ROLE = "SELECT role_id FROM user_roles WHERE role_name = 'user'"
+
+# После COPY с явными id последовательность должна смотреть за последний id
+SYNC_SEQUENCE = "SELECT setval(pg_get_serial_sequence(%s, %s), %s)"
@@ -0,0 +1,464 @@
+# generate_workload.py
+"""Генератор синтетической нагрузки: пользователи, каталог и история прослушиваний
+
+Spotify не нужен: артисты, альбомы и треки получают сгенерированные
+названия, популярность по закону Ципфа (немногие треки собирают
+большую часть прослушиваний), у пользователей - любимый жанр и
+активность с длинным хвостом. Время прослушиваний - за последние --days
+дней с ростом к текущей дате, недельным и суточным циклом (пик вечером,
+минимум ночью).
+
+Строки загружаются через COPY (database.connection.copy_rows) пачками
+по --chunk-size, id назначаются явно после уже существующих. Результат
+детерминирован: одинаковые --seed, параметры, --end-date и исходное
+состояние БД дают одни и те же данные (случайность генерируется
+блоками по BLOCK_SIZE объектов, поэтому не зависит от --chunk-size).
+Пример:
+    python generate_workload.py --users 1000000 --tracks 2000000 --listens 50000000 --seed 42
+"""
+from database.connection import db
+from database.migrate import apply_migrations
+from database.partitions import ensure_partitions
+from database.queries.populate import UPSERT_GENRES, UPSERT_ROLES
+from database.queries.workload import MAX_IDS, GET_GENRE_IDS, GET_USER_ROLE, SYNC_SEQUENCE
+from services.data_populator import POPULAR_GENRES
+from utils.security import hash_password
+from datetime import date, datetime, timedelta
+import argparse
+import logging
+import sys
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Объектов в одном блоке случайности (пользователей, треков, ...)
+BLOCK_SIZE = 10000
+
+# Потоки случайности: у каждой таблицы свой, чтобы изменение одной не сдвигало другие
+(STREAM_WORDS, STREAM_ARTISTS, STREAM_ALBUMS, STREAM_TRACKS, STREAM_TRACK_NAMES, STREAM_USERS,
+ STREAM_USER_GENRES, STREAM_FAVORITES, STREAM_PLAYLISTS, STREAM_PLAYLIST_TRACKS,
+ STREAM_LISTEN_COUNTS, STREAM_LISTENS) = range(12)
+
+# Доля прослушиваний по часам суток (0..23): минимум ночью, пик вечером
+HOUR_WEIGHTS = np.array([
+    2.0, 1.2, 0.8, 0.5, 0.4, 0.6, 1.2, 2.5, 3.5, 3.8, 4.0, 4.2,
+    4.5, 4.6, 4.4, 4.5, 4.8, 5.5, 6.3, 6.8, 6.9, 6.2, 4.8, 3.2
+])
+# Понедельник..воскресенье: в выходные слушают больше
+WEEKDAY_WEIGHTS = np.array([0.95, 0.95, 0.97, 1.0, 1.08, 1.18, 1.12])
+
+SYLLABLES = [
+    'ka', 'lo', 'mi', 'ra', 'ven', 'tor', 'sa', 'el', 'na', 'ri', 'du', 'mo', 'zen', 'ly', 'fa',
+    'shi', 'ber', 'can', 'do', 'ex', 'lu', 'pa', 'qui', 'ro', 'sta', 'ti', 'vo', 'wyn', 'ya', 'zo',
+    'ar', 'bel', 'cor', 'dan', 'es', 'gal', 'hin', 'ix', 'jo', 'kel', 'mar', 'nor', 'ol', 'pre', 'sol'
+]
+FIRST_NAMES = ['Иван', 'Мария', 'Алексей', 'Анна', 'Дмитрий', 'Елена', 'Сергей', 'Ольга',
+               'Андрей', 'Наталья', 'Павел', 'Татьяна', 'Никита', 'Юлия', 'Артем', 'Дарья']
+LAST_NAMES = ['Петров', 'Сидорова', 'Козлов', 'Иванова', 'Смирнов', 'Кузнецова', 'Попов',
+              'Соколова', 'Лебедев', 'Новикова', 'Морозов', 'Волкова', 'Зайцев', 'Павлова']
+
+
+def block_rng(seed, stream, block):
+    """Независимый генератор для блока объектов одного потока"""
+    return np.random.default_rng([seed, stream, block])
+
+
+def blocks(count, block_size=BLOCK_SIZE):
+    """(номер блока, начало, конец) для count объектов"""
+    for block, start in enumerate(range(0, count, block_size)):
+        yield block, start, min(count, start + block_size)
+
+
+def zipf_weights(rng, count, exponent):
+    """Веса по закону Ципфа (ранг^-exponent), ранги перемешаны, сумма - 1"""
+    weights = (rng.permutation(count) + 1.0) ** -exponent
+    return weights / weights.sum()
+
+
+def popularity_scores(weights):
+    """Вес -> popularity_score 0..100 (логарифмическая шкала, как у Spotify)"""
+    logs = np.log(weights)
+    span = max(logs.max() - logs.min(), 1e-9)
+    return np.round(100 * (logs - logs.min()) / span).astype(np.int64)
+
+
+class Sampler:
+    """Выбор индексов с заданными весами (обратная функция распределения)"""
+
+    def __init__(self, weights, values=None):
+        self.cumulative = np.cumsum(weights, dtype=np.float64)
+        self.values = values
+
+    def sample(self, rng, size):
+        index = np.searchsorted(self.cumulative, rng.random(size) * self.cumulative[-1], side='right')
+        index = np.minimum(index, len(self.cumulative) - 1)
+        return index if self.values is None else self.values[index]
+
+
+def make_vocabulary(seed, size):
+    """Словарь псевдослов для названий (2-3 слога)"""
+    rng = block_rng(seed, STREAM_WORDS, 0)
+    syllables = np.array(SYLLABLES)
+    words = {}
+    while len(words) < size:
+        lengths = rng.integers(2, 4, size=size)
+        parts = rng.choice(syllables, size=(size, 3))
+        for length, row in zip(lengths, parts):
+            words.setdefault(''.join(row[:length]).capitalize(), None)
+    return np.array(list(words)[:size])
+
+
+def make_names(rng, vocabulary, word_sampler, count, min_words, max_words):
+    """Названия из 1..N слов словаря; частые слова встречаются чаще (как в реальном каталоге)"""
+    lengths = rng.integers(min_words, max_words + 1, size=count)
+    words = vocabulary[word_sampler.sample(rng, int(lengths.sum()))]
+    bounds = np.concatenate(([0], np.cumsum(lengths)))
+    return [' '.join(words[bounds[i]:bounds[i + 1]]) for i in range(count)]
+
+
+def as_timestamps(base, seconds):
+    """Секунды от base -> строки timestamp для COPY"""
+    return np.datetime_as_string(np.datetime64(base, 's') + seconds.astype('timedelta64[s]'), unit='s')
+
+
+class WorkloadGenerator:
+    """Синтетический каталог и активность пользователей с загрузкой через COPY"""
+
+    def __init__(self, args):
+        self.args = args
+        self.seed = args.seed
+        self.end = datetime.combine(args.end_date, datetime.min.time())
+        self.start = self.end - timedelta(days=args.days)
+        self.loaded = {}
+
+    # --- подготовка ---
+
+    def _prepare(self):
+        """Роль пользователя, жанры и стартовые id"""
+        role = self.db_one(GET_USER_ROLE)
+        if not role:
+            db.insert_values(UPSERT_ROLES, [('user', 'Обычный пользователь')])
+            role = self.db_one(GET_USER_ROLE)
+        self.user_role_id = role['role_id']
+
+        genres = db.execute_query(GET_GENRE_IDS, fetch=True) or []
+        if not genres:
+            db.insert_values(UPSERT_GENRES, [(name,) for name in POPULAR_GENRES])
+            genres = db.execute_query(GET_GENRE_IDS, fetch=True) or []
+        self.genre_ids = np.array([row['genre_id'] for row in genres], dtype=np.int64)
+
+        self.base = self.db_one(MAX_IDS)
+        logger.info(f"🧮 Existing rows end at ids: {self.base}")
+
+    @staticmethod
+    def db_one(query):
+        with db.primary_reads():
+            return db.execute_query(query, fetch_one=True)
+
+    def _load(self, table, columns, rows):
+        """COPY строк в таблицу с замером скорости; ошибка прерывает генерацию"""
+        started = time.perf_counter()
+        count = db.copy_rows(table, columns, rows)
+        if count is None:
+            raise RuntimeError(f"COPY into {table} failed")
+        seconds = time.perf_counter() - started
+        self.loaded[table] = self.loaded.get(table, 0) + count
+        logger.info(f"📥 {table}: {count} rows in {seconds:.1f}s ({count / max(seconds, 1e-9):,.0f} rows/s)")
+        return count
+
+    def _load_chunks(self, table, columns, row_blocks):
+        """Склеить блоки строк в пачки по --chunk-size и загрузить каждую отдельным COPY
+
+        Отдельные COPY держат транзакции и таблицу переходов триггера
+        агрегатов прослушиваний ограниченного размера.
+        """
+        chunk, size = [], 0
+        for rows in row_blocks:
+            chunk.append(rows)
+            size += len(rows)
+            if size >= self.args.chunk_size:
+                self._load(table, columns, (row for rows in chunk for row in rows))
+                chunk, size = [], 0
+        if chunk:
+            self._load(table, columns, (row for rows in chunk for row in rows))
+
+    # --- каталог ---
+
+    def _generate_catalog(self):
+        args = self.args
+        rng = block_rng(self.seed, STREAM_ARTISTS, 0)
+        vocabulary = make_vocabulary(self.seed, args.vocabulary)
+        word_sampler = Sampler(zipf_weights(rng, len(vocabulary), 1.0))
+
+        # Артисты: популярность по Ципфу, основной жанр - тоже по Ципфу (поп и рок чаще)
+        n_artists = args.artists or max(1, args.tracks // 20)
+        artist_ids = self.base['artists'] + 1 + np.arange(n_artists)
+        artist_weights = zipf_weights(rng, n_artists, args.zipf)
+        artist_genres = Sampler(zipf_weights(rng, len(self.genre_ids), 1.0), self.genre_ids).sample(rng, n_artists)
+        artist_names = make_names(rng, vocabulary, word_sampler, n_artists, 1, 2)
+        followers = np.round(artist_weights / artist_weights.max() * args.users * 0.3).astype(np.int64)
+
+        self._load('artists', ['artist_id', 'spotify_artist_id', 'artist_name', 'popularity_score', 'followers_count'],
+                   zip(artist_ids.tolist(), [f"syn:artist:{i}" for i in artist_ids.tolist()], artist_names,
+                       popularity_scores(artist_weights).tolist(), followers.tolist()))
+        self._load('artist_genres', ['artist_id', 'genre_id'],
+                   zip(artist_ids.tolist(), artist_genres.tolist()))
+
+        # Альбомы: размер ~ Пуассон, у популярных артистов альбомов больше
+        rng = block_rng(self.seed, STREAM_ALBUMS, 0)
+        sizes = rng.poisson(args.tracks_per_album - 1, size=args.tracks // max(1, args.tracks_per_album - 1) + 1) + 1
+        sizes = sizes[:np.searchsorted(np.cumsum(sizes), args.tracks) + 1]
+        sizes[-1] -= sizes.sum() - args.tracks
+        n_albums = len(sizes)
+        album_ids = self.base['albums'] + 1 + np.arange(n_albums)
+        album_artist = Sampler(artist_weights).sample(rng, n_albums)
+        album_types = np.where(sizes <= 2, 'single', np.where(rng.random(n_albums) < 0.1, 'compilation', 'album'))
+        release_days = np.minimum(rng.exponential(6 * 365, size=n_albums), 40 * 365).astype(np.int64)
+        release_dates = np.datetime_as_string(
+            np.datetime64(self.end.date(), 'D') - release_days.astype('timedelta64[D]'), unit='D')
+        album_names = make_names(rng, vocabulary, word_sampler, n_albums, 1, 3)
+
+        self._load('albums', ['album_id', 'spotify_album_id', 'album_name', 'artist_id', 'album_type',
+                              'total_tracks', 'release_date', 'release_date_precision'],
+                   zip(album_ids.tolist(), [f"syn:album:{i}" for i in album_ids.tolist()], album_names,
+                       artist_ids[album_artist].tolist(), album_types.tolist(), sizes.tolist(),
+                       release_dates.tolist(), ['day'] * n_albums))
+
+        # Треки: вес = Ципф трека x популярность артиста; жанр - основной жанр артиста.
+        # Ранги перемешаны по всему каталогу, иначе хиты скопились бы в первых альбомах
+        track_album = np.repeat(np.arange(n_albums), sizes)
+        track_number = np.arange(args.tracks) - np.repeat(np.cumsum(sizes) - sizes, sizes) + 1
+        track_artist = album_artist[track_album]
+        track_ids = self.base['tracks'] + 1 + np.arange(args.tracks)
+        rng = block_rng(self.seed, STREAM_TRACKS, 0)
+        track_weights = zipf_weights(rng, args.tracks, args.zipf) * np.sqrt(artist_weights[track_artist])
+        track_weights /= track_weights.sum()
+        track_durations = np.clip(rng.lognormal(np.log(210000), 0.3, size=args.tracks),
+                                  45000, 900000).astype(np.int64)
+        scores = popularity_scores(track_weights)
+        self.track_genre = artist_genres[track_artist]
+        self.track_ids = track_ids
+        self.track_durations = track_durations
+
+        def track_rows():
+            for block, start, end in blocks(args.tracks):
+                rng = block_rng(self.seed, STREAM_TRACK_NAMES, block)
+                names = make_names(rng, vocabulary, word_sampler, end - start, 1, 4)
+                explicit = (rng.random(end - start) < 0.15).tolist()
+                ids = track_ids[start:end].tolist()
+                yield list(zip(ids, [f"syn:track:{i}" for i in ids], names,
+                               album_ids[track_album[start:end]].tolist(), track_durations[start:end].tolist(),
+                               track_number[start:end].tolist(), explicit, scores[start:end].tolist()))
+
+        self._load_chunks('tracks', ['track_id', 'spotify_track_id', 'track_name', 'album_id', 'duration_ms',
+                                     'track_number', 'explicit', 'popularity_score'], track_rows())
+        self._load('track_genres', ['track_id', 'genre_id'], zip(track_ids.tolist(), self.track_genre.tolist()))
+
+        # Выбор трека: по всему каталогу и отдельно внутри каждого жанра
+        self.global_sampler = Sampler(track_weights)
+        self.genre_samplers = {}
+        for genre_id in np.unique(self.track_genre):
+            members = np.flatnonzero(self.track_genre == genre_id)
+            self.genre_samplers[int(genre_id)] = Sampler(track_weights[members], members)
+
+        self.counts = {'artists': n_artists, 'albums': n_albums, 'tracks': args.tracks}
+
+    def _sample_tracks(self, rng, user_genres):
+        """Индексы треков для прослушиваний: доля --taste из любимого жанра, остальное - по всему каталогу"""
+        result = self.global_sampler.sample(rng, len(user_genres))
+        own = rng.random(len(user_genres)) < self.args.taste
+        for genre_id, sampler in self.genre_samplers.items():
+            picks = np.flatnonzero(own & (user_genres == genre_id))
+            if len(picks):
+                result[picks] = sampler.sample(rng, len(picks))
+        return result
+
+    # --- пользователи и активность ---
+
+    def _generate_users(self):
+        args = self.args
+        self.user_ids = self.base['users'] + 1 + np.arange(args.users)
+        rng = block_rng(self.seed, STREAM_USER_GENRES, 0)
+        genre_sampler = Sampler(zipf_weights(rng, len(self.genre_ids), 1.0), self.genre_ids)
+        self.user_genre = genre_sampler.sample(rng, args.users)
+        # Активность с длинным хвостом: немногие слушают очень много
+        activity = rng.lognormal(0, 1.2, size=args.users)
+        self.activity = activity / activity.sum()
+        # Хэш один на всех: хэширование миллиона паролей заняло бы часы
+        password_hash = hash_password('password123')
+
+        def user_rows():
+            for block, start, end in blocks(args.users):
+                rng = block_rng(self.seed, STREAM_USERS, block)
+                count = end - start
+                registered = as_timestamps(self.start, -rng.integers(0, 730 * 86400, size=count))
+                first = rng.choice(FIRST_NAMES, size=count).tolist()
+                last = rng.choice(LAST_NAMES, size=count).tolist()
+                ids = self.user_ids[start:end].tolist()
+                yield list(zip(ids, [f"syn_user_{i}" for i in ids], [f"syn_user_{i}@synthetic.test" for i in ids],
+                               [password_hash] * count, first, last, [self.user_role_id] * count,
+                               registered.tolist()))
+
+        self._load_chunks('users', ['user_id', 'username', 'email', 'password_hash', 'first_name', 'last_name',
+                                    'role_id', 'date_registered'], user_rows())
+
+    def _generate_library(self):
+        """Плейлист "Избранное" и плейлисты пользователей, избранные треки"""
+        args = self.args
+        n_tracks = len(self.track_ids)
+
+        # У каждого пользователя "Избранное" плюс ~Пуассон(--playlists) своих плейлистов
+        n_playlists = 1 + block_rng(self.seed, STREAM_PLAYLISTS, 0).poisson(args.playlists, size=args.users)
+        first_playlist = self.base['playlists'] + 1 + np.cumsum(n_playlists) - n_playlists
+        self.playlist_max = self.base['playlists'] + int(n_playlists.sum())
+
+        def playlist_rows():
+            for block, start, end in blocks(args.users):
+                rng = block_rng(self.seed, STREAM_PLAYLISTS, block + 1)
+                owners = np.repeat(np.arange(start, end), n_playlists[start:end])
+                # id плейлистов блока идут подряд
+                ids = first_playlist[start] + np.arange(len(owners))
+                favorite = ids == first_playlist[owners]
+                names = [('Избранное' if is_favorite else f"Плейлист {number}")
+                         for is_favorite, number in zip(favorite.tolist(), (ids - self.base['playlists']).tolist())]
+                descriptions = [('Мои любимые треки' if is_favorite else None) for is_favorite in favorite.tolist()]
+                public = (~favorite & (rng.random(len(owners)) < 0.3)).tolist()
+                yield list(zip(ids.tolist(), self.user_ids[owners].tolist(), names, descriptions,
+                               public, favorite.tolist()))
+
+        def playlist_track_rows():
+            for block, start, end in blocks(args.users):
+                rng = block_rng(self.seed, STREAM_PLAYLIST_TRACKS, block)
+                extra = n_playlists[start:end] - 1
+                owners = np.repeat(np.arange(start, end), extra)
+                if not len(owners):
+                    continue
+                # Свои плейлисты идут сразу за "Избранным" пользователя
+                playlist_ids = (first_playlist[owners] + 1 + np.arange(len(owners))
+                                - (np.cumsum(extra) - extra).repeat(extra))
+                sizes = rng.integers(5, 51, size=len(owners))
+                slots = np.repeat(np.arange(len(owners)), sizes)
+                tracks = self._sample_tracks(rng, self.user_genre[owners][slots])
+                keys = np.unique(playlist_ids[slots] * (n_tracks + 1) + tracks)
+                rows_playlist, rows_track = keys // (n_tracks + 1), keys % (n_tracks + 1)
+                group_start = np.searchsorted(rows_playlist, rows_playlist, side='left')
+                order = np.arange(len(keys)) - group_start + 1
+                yield list(zip(rows_playlist.tolist(), self.track_ids[rows_track].tolist(), order.tolist()))
+
+        def favorite_rows():
+            for block, start, end in blocks(args.users):
+                rng = block_rng(self.seed, STREAM_FAVORITES, block)
+                # Число избранных растет с активностью пользователя
+                scale = np.clip(self.activity[start:end] * args.users, 0.2, 5)
+                owners = np.repeat(np.arange(start, end), rng.poisson(args.favorites * scale))
+                tracks = self._sample_tracks(rng, self.user_genre[owners])
+                keys = np.unique(self.user_ids[owners] * (n_tracks + 1) + tracks)
+                yield list(zip((keys // (n_tracks + 1)).tolist(), self.track_ids[keys % (n_tracks + 1)].tolist()))
+
+        self._load_chunks('playlists', ['playlist_id', 'user_id', 'playlist_name', 'description',
+                                        'is_public', 'is_favorite'], playlist_rows())
+        self._load_chunks('playlist_tracks', ['playlist_id', 'track_id', 'track_order'], playlist_track_rows())
+        self._load_chunks('favorite_tracks', ['user_id', 'track_id'], favorite_rows())
+
+    def _generate_listens(self):
+        """История прослушиваний: число на пользователя ~ активность, время - рост x неделя x сутки"""
+        args = self.args
+        counts = block_rng(self.seed, STREAM_LISTEN_COUNTS, 0).multinomial(args.listens, self.activity)
+
+        day_index = np.arange(args.days)
+        weekday = (self.start.weekday() + day_index) % 7
+        day_sampler = Sampler(np.exp(args.growth * day_index / args.days) * WEEKDAY_WEIGHTS[weekday])
+        hour_sampler = Sampler(HOUR_WEIGHTS)
+
+        def listen_rows():
+            for block, start, end in blocks(args.users):
+                total = int(counts[start:end].sum())
+                if not total:
+                    continue
+                rng = block_rng(self.seed, STREAM_LISTENS, block)
+                owners = np.repeat(np.arange(start, end), counts[start:end])
+                tracks = self._sample_tracks(rng, self.user_genre[owners])
+                seconds = (day_sampler.sample(rng, total) * 86400 + hour_sampler.sample(rng, total) * 3600
+                           + rng.integers(0, 3600, size=total))
+                # Большинство дослушивают до конца, остальные - пропуски в случайный момент
+                completion = np.where(rng.random(total) < 0.7, 1.0, rng.uniform(0.05, 1.0, size=total))
+                yield list(zip(self.user_ids[owners].tolist(), self.track_ids[tracks].tolist(),
+                               as_timestamps(self.start, seconds).tolist(),
+                               (self.track_durations[tracks] * completion).astype(np.int64).tolist(),
+                               np.round(completion * 100, 1).tolist()))
+
+        self._load_chunks('listening_history', ['user_id', 'track_id', 'listened_at', 'listen_duration_ms',
+                                                'completion_percentage'], listen_rows())
+
+    def _finish(self):
+        """Последовательности за явными id и свежая статистика планировщика"""
+        with db.transaction() as tx:
+            for table, column, last_id in (
+                ('artists', 'artist_id', self.base['artists'] + self.counts['artists']),
+                ('albums', 'album_id', self.base['albums'] + self.counts['albums']),
+                ('tracks', 'track_id', self.base['tracks'] + self.counts['tracks']),
+                ('users', 'user_id', self.base['users'] + self.args.users),
+                ('playlists', 'playlist_id', self.playlist_max),
+            ):
+                if last_id:
+                    tx.execute(SYNC_SEQUENCE, (table, column, last_id), fetch_one=True)
+        for table in self.loaded:
+            db.execute_query(f"ANALYZE {table}")
+
+    def run(self):
+        started = time.perf_counter()
+        self._prepare()
+        # Секции listening_history на все окно генерации
+        ensure_partitions(start_month=self.start.date(), end_month=self.end.date())
+        self._generate_catalog()
+        self._generate_users()
+        self._generate_library()
+        self._generate_listens()
+        self._finish()
+        logger.info(f"✅ Workload generated in {time.perf_counter() - started:.0f}s: {self.loaded}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Generate a synthetic, seeded workload and load it via COPY')
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--tracks', type=int, default=200000)
+    parser.add_argument('--artists', type=int, default=None, help='default: tracks / 20')
+    parser.add_argument('--listens', type=int, default=5000000)
+    parser.add_argument('--days', type=int, default=90, help='listening history window')
+    parser.add_argument('--end-date', type=date.fromisoformat, default=date.today(),
+                        help='last day of the window (fix it to reproduce a dataset exactly)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--zipf', type=float, default=1.05, help='popularity exponent of tracks and artists')
+    parser.add_argument('--taste', type=float, default=0.6, help='share of listens from the favourite genre')
+    parser.add_argument('--growth', type=float, default=0.7, help='log growth of daily listens over the window')
+    parser.add_argument('--favorites', type=float, default=20, help='mean favourite tracks per user')
+    parser.add_argument('--playlists', type=float, default=1.5, help='mean extra playlists per user')
+    parser.add_argument('--tracks-per-album', type=int, default=10)
+    parser.add_argument('--vocabulary', type=int, default=20000, help='distinct words in generated names')
+    parser.add_argument('--chunk-size', type=int, default=1000000, help='rows per COPY')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if not db.check_connection():
+        logger.error("❌ Cannot connect to database. Please check your configuration.")
+        return False
+    if not apply_migrations():
+        logger.error("❌ Database migrations failed.")
+        return False
+
+    WorkloadGenerator(args).run()
+    return True
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+    sys.exit(0 if main() else 1)
@@ -1,5 +1,7 @@
 # run.py
 from database.connection import db
+from database.migrate import apply_migrations
+from database.partitions import ensure_partitions
 from services.data_populator import PremiumDataPopulator
 import logging
 import sys
@@ -22,6 +24,14 @@ def initialize_database():
         logger.error("❌ Cannot connect to database. Please check your configuration.")
         return False
 
+    # Применяем миграции (поисковые индексы и т.п.)
+    if not apply_migrations():
+        logger.error("❌ Database migrations failed.")
+        return False
+
+    # Секции listening_history под генерируемую историю (последние 90 дней) и наперед
+    ensure_partitions(months_back=3)
+
     # Наполняем премиум данными
     logger.info("🎵 Populating with PREMIUM Spotify data...")
     populator = PremiumDataPopulator()
@@ -0,0 +1,399 @@
+# services/als_model.py
+"""Матричная факторизация implicit ALS по числу прослушиваний
+
+Модель (Hu, Koren, Volinsky, 2008): предпочтение p_ui = 1 для прослушанных
+треков, уверенность c_ui = 1 + alpha * ln(1 + r_ui), r_ui - число прослушиваний.
+Факторы пользователей X и треков Y обновляются попеременно: каждый полушаг
+решает для всех строк (Y^T C_u Y + λI) x_u = Y^T C_u p_u несколькими шагами
+сопряженных градиентов - векторизованно по блокам строк, без цикла по
+пользователям в Python.
+
+Факторы сохраняются в ALS_MODEL_DIR/<версия>/*.npy, файл CURRENT указывает на
+последнюю версию. Веб-процессы открывают их через mmap: страницы общие в кэше
+ОС, у каждого воркера своей копии нет.
+
+Запуск (например, из cron раз в сутки):
+    python -m services.als_model
+"""
+from database.connection import db
+from database.queries import recommendations as recommendation_queries
+from services.recommendation_engine import (RECOMMENDATION_COLUMNS, _cache_rows,
+                                            build_matrix, load_interactions)
+from config import config
+from datetime import datetime
+import argparse
+import logging
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+import scipy.sparse as sp
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_FILES = ('user_factors', 'item_factors', 'user_ids', 'track_ids')
+# Сколько версий модели хранить на диске (воркеры могут еще держать старую)
+KEEP_VERSIONS = 2
+# Ненулевых элементов матрицы на блок полушага ALS (память ~ 2 * nnz * factors * 4 байта)
+SOLVE_BLOCK_NNZ = 1 << 18
+# Ячеек float32 в блоке оценок пользователи x треки при пакетной выдаче (128 МБ)
+SCORE_BLOCK_CELLS = 1 << 25
+
+
+def confidence_matrix(play_counts, alpha):
+    """Разреженная матрица c_ui - 1 = alpha * ln(1 + r_ui) (float32, CSR)"""
+    confidence = sp.csr_matrix(play_counts, dtype=np.float32, copy=True)
+    confidence.data = (alpha * np.log1p(confidence.data)).astype(np.float32)
+    return confidence
+
+
+def _row_blocks(indptr, max_nnz):
+    """Блоки строк CSR по max_nnz ненулевых элементов (но не меньше одной строки)"""
+    n_rows = len(indptr) - 1
+    start = 0
+    while start < n_rows:
+        stop = int(np.searchsorted(indptr, indptr[start] + max_nnz, side='right')) - 1
+        stop = min(max(stop, start + 1), n_rows)
+        yield start, stop
+        start = stop
+
+
+def _solve(confidence, fixed, solution, regularization, cg_steps):
+    """Полушаг ALS: обновить solution на месте при фиксированных факторах fixed
+
+    confidence - матрица c - 1 (строки соответствуют solution, столбцы - fixed).
+    Предыдущее значение solution - начальное приближение для сопряженных градиентов.
+    """
+    gram = fixed.T @ fixed + regularization * np.eye(fixed.shape[1], dtype=np.float32)
+    for start, stop in _row_blocks(confidence.indptr, SOLVE_BLOCK_NNZ):
+        block = confidence[start:stop]
+        rows = np.repeat(np.arange(stop - start), np.diff(block.indptr))
+        neighbours = fixed[block.indices]
+
+        def apply(vectors):
+            # (Y^T Y + λI) v + Y^T (C_u - I) Y v сразу для всех строк блока
+            dots = np.einsum('ij,ij->i', vectors[rows], neighbours)
+            weighted = sp.csr_matrix((block.data * dots, block.indices, block.indptr), shape=block.shape)
+            return vectors @ gram + weighted @ fixed
+
+        x = solution[start:stop]
+        # Правая часть Y^T C_u p_u: p_ui = 1, c_ui = 1 + (c_ui - 1)
+        targets = sp.csr_matrix((block.data + 1, block.indices, block.indptr), shape=block.shape) @ fixed
+        residual = targets - apply(x)
+        direction = residual.copy()
+        norm = np.einsum('ij,ij->i', residual, residual)
+        for _ in range(cg_steps):
+            product = apply(direction)
+            step = norm / np.maximum(np.einsum('ij,ij->i', direction, product), 1e-20)
+            x += step[:, None] * direction
+            residual -= step[:, None] * product
+            new_norm = np.einsum('ij,ij->i', residual, residual)
+            direction = residual + (new_norm / np.maximum(norm, 1e-20))[:, None] * direction
+            norm = new_norm
+
+
+def top_n_columns(scores, top_n):
+    """Top-n столбцов в каждой строке плотной матрицы оценок (по убыванию)
+
+    Returns:
+        tuple: (номера столбцов, оценки), обе формы [строки x top_n]
+    """
+    top_n = min(top_n, scores.shape[1])
+    top = np.argpartition(-scores, top_n - 1, axis=1)[:, :top_n]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1)
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+
+class ALSModel:
+    """Факторы implicit ALS: обучение, контрольные точки на диске и выдача"""
+
+    def __init__(self, factors=64, regularization=0.05, alpha=10.0, iterations=15,
+                 cg_steps=3, model_dir='models/als', reload_interval=60, seed=42):
+        self.factors = factors
+        self.regularization = regularization
+        self.alpha = alpha
+        self.iterations = iterations
+        self.cg_steps = cg_steps
+        self.model_dir = model_dir
+        self.reload_interval = reload_interval
+        self.seed = seed
+
+        self._lock = threading.Lock()
+        self._checked_at = float('-inf')
+        self.version = None
+        self.user_factors = None
+        self.item_factors = None
+        self.user_ids = None
+        self.track_ids = None
+        # Производные от Y, нужны для выдачи: Y^T Y + λI и нормы векторов треков
+        self._gram = None
+        self._item_norms = None
+
+    def _set_factors(self, user_factors, item_factors, user_ids, track_ids, version):
+        gram = np.asarray(item_factors.T @ item_factors, dtype=np.float64)
+        gram += self.regularization * np.eye(item_factors.shape[1])
+        item_norms = np.linalg.norm(item_factors, axis=1)
+        item_norms[item_norms == 0] = 1.0
+        with self._lock:
+            self.user_factors = user_factors
+            self.item_factors = item_factors
+            self.user_ids = user_ids
+            self.track_ids = track_ids
+            self.version = version
+            self._gram = gram
+            self._item_norms = item_norms
+
+    def fit(self, play_counts, user_ids=None, track_ids=None):
+        """
+        Обучить модель
+
+        Args:
+            play_counts (csr_matrix): число прослушиваний, пользователи x треки
+            user_ids, track_ids (ndarray): id по строкам и столбцам (по возрастанию)
+        """
+        n_users, n_items = play_counts.shape
+        user_confidence = confidence_matrix(play_counts, self.alpha)
+        item_confidence = user_confidence.T.tocsr()
+
+        rng = np.random.default_rng(self.seed)
+        user_factors = (rng.standard_normal((n_users, self.factors)) * 0.01).astype(np.float32)
+        item_factors = (rng.standard_normal((n_items, self.factors)) * 0.01).astype(np.float32)
+
+        for iteration in range(1, self.iterations + 1):
+            started = time.perf_counter()
+            _solve(user_confidence, item_factors, user_factors, self.regularization, self.cg_steps)
+            _solve(item_confidence, user_factors, item_factors, self.regularization, self.cg_steps)
+            logger.info(f"🔁 ALS iteration {iteration}/{self.iterations}: {time.perf_counter() - started:.2f}s")
+
+        self._set_factors(
+            user_factors, item_factors,
+            np.arange(n_users) if user_ids is None else np.asarray(user_ids),
+            np.arange(n_items) if track_ids is None else np.asarray(track_ids),
+            None
+        )
+        return self
+
+    def save(self, directory=None):
+        """Записать факторы новой версией и переключить на нее CURRENT"""
+        directory = directory or self.model_dir
+        version = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        path = os.path.join(directory, version)
+        os.makedirs(path, exist_ok=True)
+        for name in CHECKPOINT_FILES:
+            np.save(os.path.join(path, f'{name}.npy'), np.ascontiguousarray(getattr(self, name)))
+
+        # Замена указателя атомарна: читатель видит либо старую версию, либо новую целиком
+        pointer = os.path.join(directory, 'CURRENT')
+        with open(pointer + '.tmp', 'w') as f:
+            f.write(version)
+        os.replace(pointer + '.tmp', pointer)
+        self.version = version
+
+        # Удаленные файлы остаются доступны процессам, которые их уже отобразили
+        versions = sorted(entry for entry in os.listdir(directory)
+                          if os.path.isdir(os.path.join(directory, entry)))
+        for old in versions[:-KEEP_VERSIONS]:
+            shutil.rmtree(os.path.join(directory, old), ignore_errors=True)
+        return path
+
+    def load(self, directory=None):
+        """Открыть текущую версию с диска через mmap; True, если модель есть"""
+        directory = directory or self.model_dir
+        try:
+            with open(os.path.join(directory, 'CURRENT')) as f:
+                version = f.read().strip()
+            if version == self.version:
+                return True
+            arrays = [np.load(os.path.join(directory, version, f'{name}.npy'), mmap_mode='r')
+                      for name in CHECKPOINT_FILES]
+        except OSError as e:
+            if self.version is None:
+                logger.debug(f"ALS model is not available: {e}")
+            else:
+                logger.warning(f"Failed to reload ALS model, keeping {self.version}: {e}")
+            return self.version is not None
+
+        self._set_factors(*arrays, version)
+        logger.info(f"ALS model {version} loaded: {len(arrays[2])} users x {len(arrays[3])} tracks, "
+                    f"{arrays[1].shape[1]} factors")
+        return True
+
+    def ensure_loaded(self):
+        """Подхватить новую версию с диска (проверка не чаще раза в reload_interval секунд)"""
+        now = time.monotonic()
+        if now - self._checked_at >= self.reload_interval:
+            self._checked_at = now
+            self.load()
+        return self.item_factors is not None
+
+    def score_users(self, top_n, exclude=None, block_size=None):
+        """
+        Top-n треков для всех пользователей модели: блоки X_block @ Y^T
+
+        Args:
+            top_n (int): Треков на пользователя
+            exclude (csr_matrix): Уже известные треки (пользователи x треки), не рекомендуются
+            block_size (int): Пользователей в блоке (по умолчанию - по SCORE_BLOCK_CELLS)
+
+        Yields:
+            tuple: (первая строка блока, номера треков [блок x top_n], оценки [блок x top_n]);
+                   исключенные треки, если попали в top-n, имеют оценку -inf
+        """
+        with self._lock:
+            user_factors, item_factors = self.user_factors, self.item_factors
+        n_users, n_items = user_factors.shape[0], item_factors.shape[0]
+        block_size = block_size or max(1, SCORE_BLOCK_CELLS // n_items)
+        item_columns = np.ascontiguousarray(item_factors.T)
+
+        for start in range(0, n_users, block_size):
+            stop = min(start + block_size, n_users)
+            scores = user_factors[start:stop] @ item_columns
+            if exclude is not None:
+                known = exclude[start:stop]
+                scores[np.repeat(np.arange(stop - start), np.diff(known.indptr)), known.indices] = -np.inf
+            columns, values = top_n_columns(scores, top_n)
+            yield start, columns, values
+
+    def recommend(self, play_counts, limit=20):
+        """
+        Рекомендации по текущей истории пользователя (fold-in, для веб-запроса)
+
+        Вектор пользователя считается заново при фиксированных факторах треков -
+        одно решение системы factors x factors, - поэтому работает и для
+        пользователей, появившихся после обучения. Прослушанные треки исключаются.
+
+        Args:
+            play_counts (dict): {track_id: число прослушиваний}
+
+        Returns:
+            list: [(track_id, оценка)] по убыванию оценки
+        """
+        with self._lock:
+            item_factors, track_ids, gram = self.item_factors, self.track_ids, self._gram
+        if item_factors is None or not play_counts:
+            return []
+
+        known = np.fromiter(play_counts.keys(), dtype=np.int64, count=len(play_counts))
+        counts = np.fromiter(play_counts.values(), dtype=np.float64, count=len(play_counts))
+        positions = np.minimum(np.searchsorted(track_ids, known), len(track_ids) - 1)
+        valid = track_ids[positions] == known
+        if not valid.any():
+            return []
+        positions, counts = positions[valid], counts[valid]
+
+        neighbours = np.asarray(item_factors[positions], dtype=np.float64)
+        confidence = self.alpha * np.log1p(counts)
+        user_vector = np.linalg.solve(
+            gram + (neighbours.T * confidence) @ neighbours,
+            ((1 + confidence)[:, None] * neighbours).sum(axis=0)
+        ).astype(np.float32)
+
+        scores = item_factors @ user_vector
+        scores[positions] = -np.inf
+        return self._top(scores, track_ids, limit)
+
+    def similar_tracks(self, track_id, limit=20):
+        """Похожие треки: косинус между векторами треков; [(track_id, оценка)]"""
+        with self._lock:
+            item_factors, track_ids, item_norms = self.item_factors, self.track_ids, self._item_norms
+        if item_factors is None:
+            return []
+        position = int(np.searchsorted(track_ids, track_id))
+        if position >= len(track_ids) or track_ids[position] != track_id:
+            return []
+
+        scores = (item_factors @ item_factors[position]) / (item_norms * item_norms[position])
+        scores[position] = -np.inf
+        return self._top(scores, track_ids, limit)
+
+    @staticmethod
+    def _top(scores, track_ids, limit):
+        columns, values = top_n_columns(scores[None, :], limit)
+        return [(int(track_ids[column]), float(value))
+                for column, value in zip(columns[0], values[0]) if np.isfinite(value)]
+
+
+def write_user_recommendations(model, play_counts, top_n):
+    """Заменить рекомендации пользователям в recommendation_cache выдачей ALS
+
+    Блоки оценок считаются по ходу COPY, поэтому в памяти только текущий блок.
+    """
+    generated_at = datetime.now()
+
+    def rows():
+        for start, columns, values in model.score_users(top_n, exclude=play_counts):
+            keep = np.isfinite(values).ravel()
+            block_rows = np.repeat(np.arange(start, start + len(columns)), columns.shape[1])[keep]
+            yield from _cache_rows('user', model.user_ids, model.track_ids, block_rows,
+                                   columns.ravel()[keep], values.ravel()[keep], generated_at)
+
+    with db.transaction() as tx:
+        tx.execute(recommendation_queries.DELETE_RECOMMENDATIONS, ('user',))
+        return tx.copy_rows('recommendation_cache', RECOMMENDATION_COLUMNS, rows())
+
+
+def train_model(iterations=None, factors=None, write_cache=None):
+    """Обучить ALS по числу прослушиваний, сохранить контрольную точку
+
+    Если RECOMMENDER_USER_MODEL = als (или write_cache=True), top-N пользователей
+    пишется в recommendation_cache вместо выдачи item-item.
+
+    Returns:
+        ALSModel: обученная модель или None, если прослушиваний нет
+    """
+    write_cache = config.RECOMMENDER_USER_MODEL == 'als' if write_cache is None else write_cache
+    started = time.perf_counter()
+    logger.info("🧮 Training ALS model...")
+
+    user_ids, track_ids, counts = load_interactions(None, recommendation_queries.GET_PLAY_COUNTS)
+    if not len(user_ids):
+        logger.warning("⚠️ No listens yet, nothing to train on")
+        return None
+    users, tracks, play_counts = build_matrix(user_ids, track_ids, counts)
+    logger.info(f"📥 {play_counts.nnz} user-track pairs: {len(users)} users x {len(tracks)} tracks")
+
+    model = ALSModel(
+        factors=factors or config.ALS_FACTORS,
+        regularization=config.ALS_REGULARIZATION,
+        alpha=config.ALS_ALPHA,
+        iterations=iterations or config.ALS_ITERATIONS,
+        model_dir=config.ALS_MODEL_DIR
+    )
+    model.fit(play_counts, users, tracks)
+    path = model.save()
+    logger.info(f"💾 ALS factors saved to {path} ({time.perf_counter() - started:.1f}s)")
+
+    if write_cache:
+        try:
+            written = write_user_recommendations(model, play_counts, config.RECOMMENDATIONS_PER_USER)
+            logger.info(f"🎯 recommendation_cache: {written} users ({time.perf_counter() - started:.1f}s)")
+        except Exception as e:
+            logger.error(f"❌ Failed to write recommendation_cache: {e}")
+    return model
+
+
+# Общая модель процесса (факторы читаются с диска через mmap)
+als_model = ALSModel(
+    factors=config.ALS_FACTORS,
+    regularization=config.ALS_REGULARIZATION,
+    alpha=config.ALS_ALPHA,
+    iterations=config.ALS_ITERATIONS,
+    model_dir=config.ALS_MODEL_DIR,
+    reload_interval=config.SEARCH_INDEX_REFRESH_SECONDS
+)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description='Train the implicit ALS model on play counts')
+    parser.add_argument('--iterations', type=int, default=None)
+    parser.add_argument('--factors', type=int, default=None)
+    parser.add_argument('--write-cache', action='store_true',
+                        help='write user recommendations to recommendation_cache regardless of RECOMMENDER_USER_MODEL')
+    args = parser.parse_args()
+
+    train_model(iterations=args.iterations, factors=args.factors, write_cache=args.write_cache or None)
@@ -0,0 +1,325 @@
+# services/audio_features.py
+"""Аудио-характеристики треков: загрузка из Spotify и индекс похожих по звучанию
+
+Характеристики каждого трека сводятся к короткому вектору float32
+(FEATURE_DIM чисел: центрированные и масштабированные признаки, тональность -
+точкой на окружности), нормированному по длине - похожесть считается косинусом,
+то есть скалярным произведением. Весь каталог - одна матрица
+(1 млн треков ~ 48 МБ).
+
+Поиск: до AUDIO_INDEX_IVF_MIN_TRACKS треков - полный перебор блоками, дальше -
+IVF: векторы разбиты сферическим k-means на ~sqrt(N) кластеров, запрос
+просматривает только AUDIO_INDEX_NPROBE ближайших кластеров.
+
+Загрузка характеристик треков без них (например, после наполнения каталога):
+    python -m services.audio_features
+"""
+from database.connection import db
+from database.queries import audio_features as audio_queries
+from services.spotify_service import SpotifyService
+from services.track_index import TrackIndex
+from config import config
+from contextlib import closing
+import argparse
+import logging
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# (признак, центр, масштаб): в вектор идет (значение - центр) / масштаб
+FEATURE_SCALING = (
+    ('danceability', 0.55, 0.18),
+    ('energy', 0.60, 0.25),
+    ('loudness', -8.0, 5.0),
+    ('speechiness', 0.10, 0.10),
+    ('acousticness', 0.30, 0.30),
+    ('instrumentalness', 0.15, 0.30),
+    ('liveness', 0.20, 0.15),
+    ('valence', 0.45, 0.25),
+    ('tempo', 120.0, 30.0),
+    ('mode', 0.60, 0.50),
+)
+# Тональность циклическая (B рядом с C), key = -1 - не определена
+KEY_WEIGHT = 0.5
+FEATURE_DIM = len(FEATURE_SCALING) + 2
+# Строк каталога на блок при полном переборе
+BRUTE_FORCE_CHUNK = 1 << 16
+AUDIO_FEATURE_COLUMNS = ('danceability', 'energy', 'key', 'loudness', 'mode', 'speechiness', 'acousticness',
+                         'instrumentalness', 'liveness', 'valence', 'tempo', 'time_signature')
+
+
+def feature_vectors(rows):
+    """Строки audio_features -> нормированные векторы float32 [len(rows) x FEATURE_DIM]"""
+    vectors = np.zeros((len(rows), FEATURE_DIM), dtype=np.float32)
+    for column, (name, center, scale) in enumerate(FEATURE_SCALING):
+        # Пропущенное значение = центр, то есть 0 в векторе
+        values = np.array([row[name] if row[name] is not None else center for row in rows], dtype=np.float32)
+        vectors[:, column] = (values - center) / scale
+
+    keys = np.array([row['key'] if row['key'] is not None else -1 for row in rows], dtype=np.float32)
+    angle = keys * (2 * np.pi / 12)
+    known_key = keys >= 0
+    vectors[:, -2] = np.where(known_key, KEY_WEIGHT * np.sin(angle), 0)
+    vectors[:, -1] = np.where(known_key, KEY_WEIGHT * np.cos(angle), 0)
+
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def brute_force_top(vectors, queries, limit, chunk=BRUTE_FORCE_CHUNK):
+    """
+    Точный top-limit по косинусу для нескольких запросов, каталог - блоками
+
+    Returns:
+        tuple: (номера строк, оценки), обе формы [запросы x limit], по убыванию
+    """
+    limit = min(limit, len(vectors))
+    best_rows = np.empty((len(queries), 0), dtype=np.int64)
+    best_scores = np.empty((len(queries), 0), dtype=np.float32)
+    for start in range(0, len(vectors), chunk):
+        scores = queries @ vectors[start:start + chunk].T
+        keep = min(limit, scores.shape[1])
+        top = np.argpartition(-scores, keep - 1, axis=1)[:, :keep]
+        candidates_rows = np.concatenate((best_rows, top + start), axis=1)
+        candidates_scores = np.concatenate((best_scores, np.take_along_axis(scores, top, axis=1)), axis=1)
+        top = np.argpartition(-candidates_scores, limit - 1, axis=1)[:, :limit]
+        best_rows = np.take_along_axis(candidates_rows, top, axis=1)
+        best_scores = np.take_along_axis(candidates_scores, top, axis=1)
+
+    order = np.argsort(-best_scores, axis=1)
+    return np.take_along_axis(best_rows, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+
+def spherical_kmeans(vectors, n_lists, iterations=10, seed=42, sample_per_list=64):
+    """Центроиды (нормированные) для IVF: k-means по косинусу на выборке векторов"""
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), n_lists * sample_per_list)
+    sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+    centroids = sample[rng.choice(sample_size, n_lists, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.stack([np.bincount(assignment, weights=sample[:, d], minlength=n_lists)
+                         for d in range(vectors.shape[1])], axis=1)
+        norms = np.linalg.norm(sums, axis=1)
+        # Пустой кластер сохраняет прежний центроид
+        filled = norms > 0
+        centroids[filled] = (sums[filled] / norms[filled, None]).astype(np.float32)
+    return centroids
+
+
+def assign_lists(vectors, centroids, chunk=BRUTE_FORCE_CHUNK):
+    """Номер ближайшего центроида для каждого вектора"""
+    assignment = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), chunk):
+        assignment[start:start + chunk] = np.argmax(vectors[start:start + chunk] @ centroids.T, axis=1)
+    return assignment
+
+
+class AudioFeatureIndex(TrackIndex):
+    """Индекс похожих по звучанию треков в памяти процесса
+
+    Читатели берут снимок _view (векторы, track_id, центроиды, списки IVF)
+    без блокировок: запись только дописывает строки за пределами снимка и
+    публикует новый снимок.
+    """
+
+    load_query = audio_queries.AUDIO_FEATURE_VECTORS
+    name = 'audio feature index'
+
+    def __init__(self, ivf_min_tracks=50000, nprobe=16):
+        super().__init__()
+        self.ivf_min_tracks = ivf_min_tracks
+        self.nprobe = nprobe
+
+        self._vectors = np.empty((0, FEATURE_DIM), dtype=np.float32)
+        self._track_ids = np.empty(0, dtype=np.int64)
+        self._size = 0
+        # Размер каталога, на котором строился IVF (перестраивается при удвоении)
+        self._ivf_size = 0
+        self._view = (self._vectors, self._track_ids, None, None)
+
+    def add_tracks(self, tracks):
+        """Дописать треки (по возрастанию track_id)"""
+        if not tracks:
+            return
+        vectors = feature_vectors(tracks)
+        track_ids = np.fromiter((row['track_id'] for row in tracks), dtype=np.int64, count=len(tracks))
+
+        with self._write_lock:
+            size = self._size
+            needed = size + len(tracks)
+            if needed > len(self._vectors):
+                # Емкость растет удвоением, старые буферы остаются у читателей до конца запроса
+                capacity = max(needed, 2 * len(self._vectors), 1024)
+                grown_vectors = np.empty((capacity, FEATURE_DIM), dtype=np.float32)
+                grown_ids = np.empty(capacity, dtype=np.int64)
+                grown_vectors[:size] = self._vectors[:size]
+                grown_ids[:size] = self._track_ids[:size]
+                self._vectors, self._track_ids = grown_vectors, grown_ids
+            self._vectors[size:needed] = vectors
+            self._track_ids[size:needed] = track_ids
+            self._size = needed
+            self.max_track_id = max(self.max_track_id, int(track_ids[-1]))
+
+            _, _, centroids, lists = self._view
+            if centroids is not None:
+                lists = list(lists)
+                assignment = assign_lists(vectors, centroids)
+                for list_id in np.unique(assignment):
+                    rows = np.flatnonzero(assignment == list_id) + size
+                    lists[list_id] = np.concatenate((lists[list_id], rows))
+            self._view = (self._vectors[:needed], self._track_ids[:needed], centroids, lists)
+
+    def load(self, batch_size=5000):
+        """Загрузка из БД; IVF строится, когда каталог дорос до ivf_min_tracks или удвоился"""
+        added = super().load(batch_size)
+        if self._size >= self.ivf_min_tracks and self._size >= 2 * self._ivf_size:
+            self.build_ivf()
+        return added
+
+    def build_ivf(self, n_lists=None, iterations=10):
+        """Построить (перестроить) IVF по текущим векторам"""
+        started = time.perf_counter()
+        with self._write_lock:
+            vectors, track_ids, _, _ = self._view
+        n_lists = n_lists or max(1, int(np.sqrt(len(vectors))))
+        centroids = spherical_kmeans(vectors, n_lists, iterations)
+        assignment = assign_lists(vectors, centroids)
+        order = np.argsort(assignment, kind='stable')
+        lists = np.split(order, np.cumsum(np.bincount(assignment, minlength=n_lists))[:-1])
+
+        with self._write_lock:
+            # Строки, дописанные во время построения, раскладываем отдельно
+            size = self._size
+            if size > len(vectors):
+                extra = assign_lists(self._vectors[len(vectors):size], centroids)
+                for list_id in np.unique(extra):
+                    rows = np.flatnonzero(extra == list_id) + len(vectors)
+                    lists[list_id] = np.concatenate((lists[list_id], rows))
+            self._ivf_size = size
+            self._view = (self._vectors[:size], self._track_ids[:size], centroids, lists)
+        logger.info(f"🎛️ {self.name}: IVF with {n_lists} lists over {size} tracks "
+                    f"in {time.perf_counter() - started:.2f}s")
+
+    def similar(self, track_id, limit=20, exact=False):
+        """
+        Похожие по звучанию треки
+
+        Args:
+            track_id (int): Трек-образец
+            limit (int): Сколько треков вернуть
+            exact (bool): Полный перебор даже при наличии IVF
+
+        Returns:
+            list: [(track_id, косинус)] по убыванию, без самого трека
+        """
+        vectors, track_ids, centroids, lists = self._view
+        position = int(np.searchsorted(track_ids, track_id))
+        if position >= len(track_ids) or track_ids[position] != track_id:
+            return []
+        query = vectors[position]
+
+        if centroids is None or exact:
+            rows, scores = brute_force_top(vectors, query[None, :], limit + 1)
+            rows, scores = rows[0], scores[0]
+        else:
+            nprobe = min(self.nprobe, len(centroids))
+            probe = np.argpartition(-(centroids @ query), nprobe - 1)[:nprobe]
+            candidates = np.concatenate([lists[list_id] for list_id in probe])
+            candidate_scores = vectors[candidates] @ query
+            keep = min(limit + 1, len(candidates))
+            top = np.argpartition(-candidate_scores, keep - 1)[:keep]
+            top = top[np.argsort(-candidate_scores[top])]
+            rows, scores = candidates[top], candidate_scores[top]
+
+        return [(int(track_ids[row]), float(score))
+                for row, score in zip(rows, scores) if row != position][:limit]
+
+    def stats(self):
+        """Размер индекса и параметры IVF"""
+        vectors, _, centroids, _ = self._view
+        return {
+            'loaded': self.loaded,
+            'tracks': len(vectors),
+            'ivf_lists': len(centroids) if centroids is not None else 0,
+            'nprobe': self.nprobe,
+            'memory_mb': round(vectors.nbytes / 2 ** 20, 1),
+            'max_track_id': self.max_track_id,
+        }
+
+
+def ingest_audio_features(spotify=None, batch_size=None):
+    """
+    Загрузить характеристики треков, у которых их еще нет
+
+    Один запрос к Spotify на batch_size треков и один многострочный INSERT
+    на ответ. Треки, для которых Spotify вернул null, отмечаются в
+    audio_features_missing и в следующие прогоны не запрашиваются; треки
+    из неудавшегося запроса остаются на следующий прогон.
+
+    Returns:
+        int: Сколько строк записано в audio_features
+    """
+    spotify = spotify or SpotifyService()
+    batch_size = batch_size or config.AUDIO_FEATURES_BATCH_SIZE
+
+    with closing(db.iter_query(audio_queries.TRACKS_WITHOUT_AUDIO_FEATURES)) as stream:
+        pending = [(row['track_id'], row['spotify_track_id']) for row in stream]
+    if not pending:
+        return 0
+    logger.info(f"🎼 Fetching audio features for {len(pending)} tracks...")
+
+    written = 0
+    missing = 0
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        try:
+            found = spotify.get_tracks_audio_features_by_id([spotify_id for _, spotify_id in batch])
+        except Exception as e:
+            logger.error(f"Audio features request error: {e}")
+            found = {}
+        if not found:
+            logger.warning(f"⚠️ Audio features request failed, stopping after {written} tracks")
+            break
+
+        rows = []
+        missing_rows = []
+        for track_id, spotify_id in batch:
+            if spotify_id not in found:
+                continue
+            features = found[spotify_id]
+            # Для треков без характеристик Spotify возвращает null на их месте
+            if not features:
+                missing_rows.append((track_id,))
+                continue
+            rows.append((track_id,) + tuple(features.get(column) for column in AUDIO_FEATURE_COLUMNS))
+        if rows:
+            db.insert_values(audio_queries.INSERT_AUDIO_FEATURES, rows)
+            written += len(rows)
+        if missing_rows:
+            db.insert_values(audio_queries.INSERT_AUDIO_FEATURES_MISSING, missing_rows)
+            missing += len(missing_rows)
+
+    logger.info(f"✅ Audio features stored for {written} tracks ({missing} without features)")
+    return written
+
+
+# Общий индекс процесса
+audio_feature_index = AudioFeatureIndex(
+    ivf_min_tracks=config.AUDIO_INDEX_IVF_MIN_TRACKS,
+    nprobe=config.AUDIO_INDEX_NPROBE
+)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description='Fetch Spotify audio features for tracks that have none')
+    parser.add_argument('--batch-size', type=int, default=None)
+    args = parser.parse_args()
+
+    ingest_audio_features(batch_size=args.batch_size)
@@ -0,0 +1,187 @@
+# services/autocomplete.py
+from database.queries import search as search_queries
+from services.track_index import TrackIndex, normalize
+from config import config
+from bisect import bisect_left
+import heapq
+
+# Верхняя граница для bisect: любой ключ с нужным префиксом меньше prefix + _MAX_CHAR
+_MAX_CHAR = '\U0010ffff'
+
+
+def _word_suffixes(name):
+    """Ключи для имени: с начала каждого слова ('blinding lights' -> + 'lights')"""
+    words = normalize(name).split(' ')
+    return {' '.join(words[i:]) for i in range(len(words)) if words[i]}
+
+
+class AutocompleteIndex(TrackIndex):
+    """Префиксный индекс в памяти по названиям треков, исполнителей и альбомов
+
+    Отсортированный список пар (ключ, track_id) + bisect для поиска диапазона
+    префикса. Для коротких префиксов (до HOT_PREFIX_LEN символов), где
+    диапазон огромный, top-k по популярности считается заранее; для
+    остальных - по диапазону с мемоизацией. Postgres при ответе не трогается.
+
+    Новые ключи копятся в _pending: за весь load() список сортируется и
+    короткие префиксы пересчитываются один раз. Читатели работают без
+    блокировки, поэтому список не меняется на месте: собирается новый и
+    подменяется. Для маленьких дозагрузок пересчитываются только
+    затронутые короткие префиксы.
+    """
+
+    HOT_PREFIX_LEN = 3
+    MEMO_SIZE = 4096
+    # Не больше стольких ключей (и не больше 1% индекса) - без полного пересчета hot
+    INCREMENTAL_MAX = 1000
+
+    load_query = search_queries.AUTOCOMPLETE_TRACKS
+    name = 'autocomplete index'
+
+    def __init__(self, top_k=10):
+        super().__init__()
+        self.top_k = top_k
+        self._entries = []          # отсортированные (ключ, track_id)
+        self._pending = []          # ключи, еще не попавшие в _entries
+        self._tracks = {}           # track_id -> данные для ответа
+        self._hot = {}              # короткий префикс -> [track_id] top-k
+        self._memo = {}             # длинный префикс -> [track_id] top-k
+
+    # --- построение ---
+
+    def _rank(self, track_id):
+        track = self._tracks[track_id]
+        return track['popularity'], track_id
+
+    def _top(self, track_ids):
+        return heapq.nlargest(self.top_k, set(track_ids), key=self._rank)
+
+    def _rebuild_hot(self):
+        """Пересчитать top-k для всех коротких префиксов
+
+        Проходим ключи от самых популярных треков к менее популярным: первые
+        top_k разных треков, встреченных для префикса, и есть его top-k.
+        """
+        hot = {}
+        top_k = self.top_k
+        for key, track_id in sorted(self._entries, key=lambda entry: self._rank(entry[1]), reverse=True):
+            for length in range(1, min(len(key), self.HOT_PREFIX_LEN) + 1):
+                track_ids = hot.setdefault(key[:length], [])
+                if len(track_ids) < top_k and track_id not in track_ids:
+                    track_ids.append(track_id)
+        self._hot = hot
+        self._memo = {}
+
+    def add_tracks(self, tracks):
+        """
+        Добавить треки в индекс
+
+        Внутри load() только копит ключи, индекс достраивается в _finish_load().
+
+        Args:
+            tracks (iterable): dict с track_id, track_name, artist_name,
+                album_name, preview_url, popularity
+        """
+        with self._write_lock:
+            for track in tracks:
+                track_id = track['track_id']
+                self._tracks[track_id] = {
+                    'id': track_id,
+                    'title': track['track_name'],
+                    'artist': track['artist_name'],
+                    'album': track['album_name'],
+                    'preview': track.get('preview_url'),
+                    'popularity': track.get('popularity') or 0,
+                }
+                for name in (track['track_name'], track['artist_name'], track['album_name']):
+                    for key in _word_suffixes(name):
+                        self._pending.append((key, track_id))
+                self.max_track_id = max(self.max_track_id, track_id)
+
+            if not self._loading:
+                self._apply_pending()
+
+    def _finish_load(self):
+        with self._write_lock:
+            self._apply_pending()
+
+    def _apply_pending(self):
+        """Перенести накопленные ключи в отсортированный список (под _write_lock)"""
+        new_entries, self._pending = self._pending, []
+        if not new_entries:
+            return
+
+        old = self._entries
+        if len(new_entries) > min(self.INCREMENTAL_MAX, len(old) // 100):
+            # Большая порция: одна сортировка и один полный пересчет коротких префиксов
+            entries = old + new_entries
+            entries.sort()
+            self._entries = entries
+            self._rebuild_hot()
+        else:
+            # Маленькая порция: новый список из кусков старого между местами вставки
+            # и обновление только затронутых префиксов
+            new_entries.sort()
+            entries = []
+            start = 0
+            for entry in new_entries:
+                position = bisect_left(old, entry, start)
+                entries.extend(old[start:position])
+                entries.append(entry)
+                start = position
+            entries.extend(old[start:])
+            self._entries = entries
+
+            hot = dict(self._hot)
+            for key, track_id in new_entries:
+                for length in range(1, min(len(key), self.HOT_PREFIX_LEN) + 1):
+                    prefix = key[:length]
+                    hot[prefix] = self._top(hot.get(prefix, []) + [track_id])
+            self._hot = hot
+            self._memo = {}
+
+    # --- запросы ---
+
+    def _range(self, entries, prefix):
+        lo = bisect_left(entries, (prefix,))
+        hi = bisect_left(entries, (prefix + _MAX_CHAR,), lo)
+        return lo, hi
+
+    def complete(self, text, limit=None):
+        """Top-k треков, у которых название/исполнитель/альбом начинается с text"""
+        limit = min(limit or self.top_k, self.top_k)
+        prefix = normalize(text)
+        if not prefix:
+            return []
+
+        if len(prefix) <= self.HOT_PREFIX_LEN:
+            track_ids = self._hot.get(prefix, [])
+        else:
+            track_ids = self._memo.get(prefix)
+            if track_ids is None:
+                entries = self._entries
+                lo, hi = self._range(entries, prefix)
+                track_ids = self._top(track_id for _, track_id in entries[lo:hi])
+                if len(self._memo) >= self.MEMO_SIZE:
+                    self._memo = {}
+                self._memo[prefix] = track_ids
+
+        tracks = self._tracks
+        return [
+            {key: value for key, value in tracks[track_id].items() if key != 'popularity'}
+            for track_id in track_ids[:limit]
+        ]
+
+    def stats(self):
+        """Размер индекса"""
+        return {
+            'loaded': self.loaded,
+            'tracks': len(self._tracks),
+            'keys': len(self._entries),
+            'hot_prefixes': len(self._hot),
+            'max_track_id': self.max_track_id,
+        }
+
+
+# Общий индекс процесса
+autocomplete_index = AutocompleteIndex(top_k=config.AUTOCOMPLETE_TOP_K)
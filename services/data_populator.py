@@ -1,14 +1,131 @@
 # services/data_populator.py
 from database.connection import db
+from config import config
 from services.spotify_service import SpotifyService
+from services.autocomplete import autocomplete_index
+from services.audio_features import ingest_audio_features
+from database.queries.populate import (
+    GET_LAST_RUN, CREATE_RUN, SET_RUN_TOTAL, FINISH_RUN, GET_CHECKPOINTS, SAVE_CHECKPOINTS,
+    TOUCH_CHECKPOINTS, ADVANCE_RUN, KNOWN_ARTISTS, UPSERT_ROLES, EXISTING_USERNAMES, INSERT_USERS,
+    UPSERT_GENRES, UPSERT_ARTISTS, UPSERT_ALBUMS, UPSERT_TRACKS, USERS_WITHOUT_ACTIVITY
+)
+from utils.pipeline import Pipeline, Stage
+from utils.progress import Progress
 from utils.security import hash_password
+import argparse
+import hashlib
+import json
 import logging
-import time
 import random
+from collections import ChainMap
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from itertools import islice
 from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
 
+# full - вся очередь артистов; refresh - только изменившиеся с прошлого прогона
+POPULATE_MODES = ('full', 'refresh')
+
+# Артистов в одной пачке: один запрос get_artists и по одному upsert на тип сущности
+ARTIST_BATCH_SIZE = 50
+
+# Жанры каталога
+POPULAR_GENRES = [
+    'pop', 'rock', 'hip-hop', 'electronic', 'jazz', 'classical',
+    'metal', 'r-n-b', 'country', 'reggae', 'blues', 'folk'
+]
+
+# Стартовый список полного прогона (дальше очередь пополняют артисты из каталога)
+PREMIUM_ARTISTS = [
+    'The Weeknd', 'Taylor Swift', 'Drake', 'Ed Sheeran',
+    'Ariana Grande', 'Billie Eilish', 'Dua Lipa', 'Post Malone',
+    'Coldplay', 'Bruno Mars', 'Harry Styles', 'Doja Cat'
+]
+
+
+def _image_url(item):
+    return item['images'][0]['url'] if item.get('images') else None
+
+
+def artist_fingerprint(artist_data):
+    """Отпечаток данных артиста: изменился - в режиме refresh его треки перезапрашиваются
+
+    Число подписчиков не входит - оно меняется почти каждый день.
+    """
+    payload = [
+        artist_data.get('name'),
+        artist_data.get('popularity'),
+        sorted(artist_data.get('genres') or []),
+        _image_url(artist_data),
+    ]
+    return hashlib.sha1(json.dumps(payload, ensure_ascii=False).encode()).hexdigest()
+
+
+def artist_row(artist):
+    """Строка artists из объекта артиста Spotify"""
+    return (
+        artist['id'],
+        artist['name'],
+        artist.get('popularity', 0),
+        artist.get('followers', {}).get('count', 0),
+        _image_url(artist)
+    )
+
+
+def release_date(album):
+    """
+    Дата выхода альбома для колонки DATE
+
+    Spotify отдает дату с точностью release_date_precision: '1975' (year),
+    '1975-11' (month) или '1975-11-21' (day). Неполная дата дополняется
+    первым числом, неразбираемая (например, '0000') записывается как NULL.
+    """
+    value = album.get('release_date')
+    if not value:
+        return None
+    precision = album.get('release_date_precision', 'day')
+    if precision == 'year':
+        value += '-01-01'
+    elif precision == 'month':
+        value += '-01'
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+
+def album_row(album, spotify_artist_id):
+    """Строка albums; на месте artist_id - spotify id артиста (заменяется при записи)"""
+    return (
+        album['id'],
+        album['name'],
+        spotify_artist_id,
+        album.get('album_type', 'album'),
+        album.get('total_tracks', 0),
+        release_date(album),
+        album.get('release_date_precision', 'day'),
+        _image_url(album)
+    )
+
+
+def track_row(track, spotify_album_id):
+    """Строка tracks; на месте album_id - spotify id альбома (заменяется при записи)"""
+    return (
+        track['id'],
+        track['name'],
+        spotify_album_id,
+        track['duration_ms'],
+        track.get('track_number', 1),
+        track.get('disc_number', 1),
+        track.get('explicit', False),
+        track.get('popularity', 0),
+        track.get('preview_url'),
+        f"spotify:track:{track['id']}",  # 🔥 ПОЛНЫЙ ТРЕК (Spotify URI)!
+        track.get('external_urls', {}).get('spotify')
+    )
+
 
 class PremiumDataPopulator:
     """Наполнение базы с полными треками для премиум аккаунта"""
@@ -16,90 +133,117 @@ class PremiumDataPopulator:
     def __init__(self):
         self.db = db
         self.spotify = SpotifyService()
-        self.processed_artists = set()
-        self.processed_albums = set()
-        self.processed_tracks = set()
-
-    def populate_premium_data(self):
-        """Наполнить базу полными треками"""
-        logger.info("🎵 Starting PREMIUM data population from Spotify...")
+        # spotify id -> id в БД для всего, что уже записано в этом прогоне
+        # (повторно не пишется и не перечитывается); заполняются из RETURNING
+        self.artist_ids = {}
+        self.album_ids = {}
+        self.track_ids = {}
+        self.successful_artists = 0
+        self.unchanged_artists = 0
+
+    def populate_premium_data(self, mode='full', restart=False):
+        """
+        Наполнить базу полными треками
+
+        Прогон записывается в populate_runs, каждый обработанный артист - в
+        populate_checkpoints. Незавершенный прогон того же режима (упал или
+        был прерван) продолжается: уже отмеченные им артисты пропускаются.
+
+        Args:
+            mode (str): full - вся очередь артистов; refresh - только изменившиеся
+            restart (bool): Не продолжать незавершенный прогон, начать новый
+        """
+        if mode not in POPULATE_MODES:
+            raise ValueError(f"Unknown populate mode: {mode}")
+
+        logger.info(f"🎵 Starting PREMIUM data population from Spotify ({mode})...")
+        run_id = None
 
         try:
             # 1. Базовые данные системы
             self._create_system_data()
 
             # 2. Получаем реальные жанры
-            genre_ids = self._get_real_genres()
+            self._get_real_genres()
 
             # 3. Получаем популярных артистов с полными треками
-            self._populate_premium_artists(genre_ids)
+            run_id = self._start_run(mode, restart)
+            complete = self._populate_premium_artists(run_id, mode)
+
+            # Если индекс автодополнения загружен в этом процессе - дозагружаем
+            # новые треки один раз (веб-процессы подхватят их по таймеру обновления)
+            if autocomplete_index.loaded:
+                autocomplete_index.load()
 
-            # 4. Создаем пользовательскую активность
+            # 4. Аудио-характеристики загруженных треков (пачками по 100 за запрос)
+            ingest_audio_features(self.spotify)
+
+            # 5. Создаем пользовательскую активность
             self._create_user_activity()
 
-            logger.info("✅ PREMIUM data population completed!")
+            if complete:
+                self.db.execute_query(FINISH_RUN, ('completed', run_id))
+                logger.info(f"✅ PREMIUM data population completed! (run #{run_id})")
+            else:
+                # Прогон останется незавершенным: следующий запуск повторит пропущенных артистов
+                self.db.execute_query(FINISH_RUN, ('failed', run_id))
+                logger.warning(f"⚠️ Run #{run_id} finished with skipped artists, run again to resume")
             return True
 
         except Exception as e:
             logger.error(f"❌ Premium data population failed: {e}")
             import traceback
             logger.error(traceback.format_exc())
+            if run_id:
+                self.db.execute_query(FINISH_RUN, ('failed', run_id))
             return False
 
+    def _start_run(self, mode, restart):
+        """Продолжить незавершенный прогон режима или начать новый"""
+        with self.db.primary_reads():
+            last = self.db.execute_query(GET_LAST_RUN, (mode,), fetch_one=True)
+
+        if last and last['status'] != 'completed':
+            if not restart:
+                logger.info(f"↩️ Resuming {mode} run #{last['run_id']} "
+                            f"({last['artists_done']}/{last['artists_total']} artists done)")
+                return last['run_id']
+            self.db.execute_query(FINISH_RUN, ('failed', last['run_id']))
+
+        run_id = self.db.execute_query(CREATE_RUN, (mode,))
+        if not run_id:
+            raise RuntimeError("Failed to create populate run (is migration 006 applied?)")
+        logger.info(f"🆕 Started {mode} run #{run_id}")
+        return run_id
+
     def _create_system_data(self):
-        """Создать системные данные"""
+        """Создать системные данные (роли и пользователи - по одному запросу на таблицу)"""
         # Роли
         roles = [
             ('user', 'Обычный пользователь'),
             ('admin', 'Администратор системы'),
             ('moderator', 'Модератор контента')
         ]
-
-        for role_name, description in roles:
-            exists = self.db.execute_query(
-                "SELECT role_id FROM user_roles WHERE role_name = %s",
-                (role_name,),
-                fetch_one=True
-            )
-            if not exists:
-                self.db.execute_query(
-                    "INSERT INTO user_roles (role_name, role_description) VALUES (%s, %s)",
-                    (role_name, description)
-                )
-
-        # Администратор
-        admin_password = hash_password("admin123")
-        exists = self.db.execute_query(
-            "SELECT user_id FROM users WHERE username = 'admin'",
-            fetch_one=True
-        )
-        if not exists:
-            self.db.execute_query(
-                """INSERT INTO users (username, email, password_hash, first_name, last_name, role_id) 
-                   VALUES (%s, %s, %s, %s, %s, 2)""",
-                ('admin', 'admin@music-service.by', admin_password, 'Системный', 'Администратор')
-            )
-
-        # Тестовые пользователи
-        test_users = [
-            ('user1', 'user1@test.com', 'password123', 'Иван', 'Петров'),
-            ('user2', 'user2@test.com', 'password123', 'Мария', 'Сидорова'),
-            ('user3', 'user3@test.com', 'password123', 'Алексей', 'Козлов'),
+        self.db.insert_values(UPSERT_ROLES, roles)
+
+        # Администратор и тестовые пользователи
+        users = [
+            ('admin', 'admin@music-service.by', 'admin123', 'Системный', 'Администратор', 2),
+            ('user1', 'user1@test.com', 'password123', 'Иван', 'Петров', 1),
+            ('user2', 'user2@test.com', 'password123', 'Мария', 'Сидорова', 1),
+            ('user3', 'user3@test.com', 'password123', 'Алексей', 'Козлов', 1),
         ]
 
-        for username, email, password, first_name, last_name in test_users:
-            exists = self.db.execute_query(
-                "SELECT user_id FROM users WHERE username = %s",
-                (username,),
-                fetch_one=True
-            )
-            if not exists:
-                hashed_password = hash_password(password)
-                self.db.execute_query(
-                    """INSERT INTO users (username, email, password_hash, first_name, last_name, role_id) 
-                       VALUES (%s, %s, %s, %s, %s, 1)""",
-                    (username, email, hashed_password, first_name, last_name)
-                )
+        # Хэширование пароля дорогое - считаем его только для новых пользователей
+        rows = self.db.execute_query(EXISTING_USERNAMES, ([user[0] for user in users],), fetch=True) or []
+        existing = {row['username'] for row in rows}
+        new_users = [
+            (username, email, hash_password(password), first_name, last_name, role_id)
+            for username, email, password, first_name, last_name, role_id in users
+            if username not in existing
+        ]
+        if new_users:
+            self.db.insert_values(INSERT_USERS, new_users)
 
         logger.info("✅ System data created")
 
@@ -107,257 +251,306 @@ class PremiumDataPopulator:
         """Получить реальные жанры"""
         logger.info("🎶 Creating genres...")
 
-        popular_genres = [
-            'pop', 'rock', 'hip-hop', 'electronic', 'jazz', 'classical',
-            'metal', 'r-n-b', 'country', 'reggae', 'blues', 'folk'
-        ]
-
-        genre_ids = []
-        for genre_name in popular_genres:
-            existing = self.db.execute_query(
-                "SELECT genre_id FROM genres WHERE genre_name = %s",
-                (genre_name,),
-                fetch_one=True
-            )
-
-            if existing:
-                genre_ids.append(existing['genre_id'])
-            else:
-                self.db.execute_query(
-                    "INSERT INTO genres (genre_name) VALUES (%s)",
-                    (genre_name,)
-                )
-                new_genre = self.db.execute_query(
-                    "SELECT genre_id FROM genres WHERE genre_name = %s",
-                    (genre_name,),
-                    fetch_one=True
-                )
-                if new_genre:
-                    genre_ids.append(new_genre['genre_id'])
+        rows = self.db.insert_values(UPSERT_GENRES, [(genre_name,) for genre_name in POPULAR_GENRES],
+                                     fetch=True) or []
+        genre_id_by_name = {row['genre_name']: row['genre_id'] for row in rows}
+        genre_ids = [genre_id_by_name[name] for name in POPULAR_GENRES if name in genre_id_by_name]
 
         logger.info(f"✅ {len(genre_ids)} genres ready")
         return genre_ids
 
-    def _populate_premium_artists(self, genre_ids):
-        """Наполнить артистами с полными треками"""
-        logger.info("🎤 Fetching premium artists with FULL TRACKS...")
-
-        premium_artists = [
-            'The Weeknd', 'Taylor Swift', 'Drake', 'Ed Sheeran',
-            'Ariana Grande', 'Billie Eilish', 'Dua Lipa', 'Post Malone',
-            'Coldplay', 'Bruno Mars', 'Harry Styles', 'Doja Cat'
-        ]
-
-        successful_artists = 0
-
-        for artist_name in premium_artists:
-            if successful_artists >= 8:  # Ограничим для теста
-                break
-
-            logger.info(f"🔍 Searching FULL TRACKS for: {artist_name}")
-
-            # Ищем артиста
-            search_results = self.spotify.search_tracks(f'artist:"{artist_name}"', limit=5)
+    def _populate_premium_artists(self, run_id, mode):
+        """Наполнить артистами с полными треками
+
+        Очередь артистов проходит через конвейер (utils.pipeline), все стадии
+        работают одновременно, между ними - ограниченные очереди:
+            lookup    - данные артистов пакетами по ARTIST_BATCH_SIZE, отсев неизменившихся
+            fetch     - топ треков, POPULATE_WORKERS потоков (частоту ограничивает
+                        общий лимит SpotifyService)
+            normalize - ответы Spotify -> строки таблиц
+            write     - один upsert на тип сущности и одна транзакция
+                        контрольных точек на пачку из ARTIST_BATCH_SIZE артистов
+        Пока стадии Spotify ждут сеть, запись идет в БД, и наоборот.
+
+        Returns:
+            bool: Все артисты очереди отмечены (иначе прогон нужно продолжить)
+        """
+        logger.info(f"🎤 Fetching premium artists with FULL TRACKS ({config.POPULATE_WORKERS} workers)...")
+
+        self.successful_artists = 0
+        self.unchanged_artists = 0
+        missing = 0
+        queue = self._artist_queue(mode)
+        self.db.execute_query(SET_RUN_TOTAL, (len(queue), run_id))
+
+        with self.db.primary_reads():
+            rows = self.db.execute_query(GET_CHECKPOINTS, (queue,), fetch=True) or []
+        checkpoints = {row['spotify_artist_id']: row for row in rows}
+
+        # Продолжение прерванного прогона: его артисты уже сделаны
+        pending = [artist_id for artist_id in queue
+                   if checkpoints.get(artist_id, {}).get('run_id') != run_id]
+        if len(pending) < len(queue):
+            logger.info(f"↩️ Skipping {len(queue) - len(pending)} artists already done in run #{run_id}")
+
+        progress = Progress(f"{mode} run #{run_id}", len(queue), done=len(queue) - len(pending))
+        stale_before = datetime.now() - timedelta(days=config.POPULATE_REFRESH_DAYS)
+
+        def lookup(artist_ids):
+            nonlocal missing
+            found = self.spotify.get_artists_by_id(artist_ids)
+            # Отсутствующих в ответе не отмечаем: запрос не удался, прогон останется незавершенным
+            failed = [artist_id for artist_id in artist_ids if artist_id not in found]
+            if failed:
+                logger.warning(f"⚠️ Spotify request failed for {len(failed)} artists, they stay pending")
+            not_found = [artist_id for artist_id in artist_ids if artist_id in found and found[artist_id] is None]
+            if not_found:
+                missing += len(not_found)
+                logger.warning(f"⚠️ {len(not_found)} artists not found in Spotify")
+                progress.advance(len(not_found))
+            artists = [found[artist_id] for artist_id in artist_ids if found.get(artist_id)]
+            for artist in artists:
+                checkpoint = checkpoints.get(artist['id'])
+                unchanged = (mode == 'refresh' and checkpoint is not None
+                             and checkpoint['fingerprint'] == artist_fingerprint(artist)
+                             and checkpoint['processed_at'] >= stale_before)
+                yield artist, unchanged
+
+        pipeline = Pipeline([
+            Stage('lookup', lookup),
+            Stage('fetch', self._fetch_top_tracks, workers=config.POPULATE_WORKERS),
+            Stage('normalize', self._normalize_artist),
+            Stage('write', lambda records: self._write_artists(records, run_id, progress),
+                  batch_size=ARTIST_BATCH_SIZE),
+        ], queue_size=config.POPULATE_QUEUE_SIZE)
+
+        batches = (pending[start:start + ARTIST_BATCH_SIZE]
+                   for start in range(0, len(pending), ARTIST_BATCH_SIZE))
+        stage_stats = pipeline.run(batches)
+        for stats in stage_stats:
+            logger.info(f"📊 Stage {stats['stage']}: {stats['items_in']} in, {stats['items_out']} out, "
+                        f"{stats['errors']} errors, {stats['rate']}/s, utilization {stats['utilization']:.0%}")
+
+        logger.info(f"🎉 Processed {self.successful_artists} artists with full tracks, "
+                    f"{self.unchanged_artists} unchanged")
+        return (not any(stats['errors'] for stats in stage_stats)
+                and self.successful_artists + self.unchanged_artists + missing == len(pending))
+
+    def _artist_queue(self, mode):
+        """
+        Spotify id артистов прогона, не больше MAX_ARTISTS_TO_POPULATE
+
+        full - стартовый список плюс артисты, уже загруженные в каталог;
+        refresh - только загруженные.
+        """
+        limit = config.MAX_ARTISTS_TO_POPULATE
+        rows = self.db.execute_query(KNOWN_ARTISTS, (limit,), fetch=True) or []
+        known = [row['spotify_artist_id'] for row in rows]
+        if mode == 'refresh':
+            return known
+
+        with ThreadPoolExecutor(max_workers=config.POPULATE_WORKERS,
+                                thread_name_prefix='populate') as executor:
+            seeds = [artist_id for artist_id in executor.map(self._find_artist_id, PREMIUM_ARTISTS) if artist_id]
+        return list(dict.fromkeys(seeds + known))[:limit]
+
+    def _find_artist_id(self, artist_name):
+        """Найти артиста по имени (первый артист первого найденного трека)"""
+        logger.info(f"🔍 Searching FULL TRACKS for: {artist_name}")
+
+        search_results = self.spotify.search_tracks(f'artist:"{artist_name}"', limit=5)
+
+        if not search_results or 'tracks' not in search_results:
+            logger.warning(f"⚠️ No results for: {artist_name}")
+            return None
 
-            if not search_results or 'tracks' not in search_results:
-                logger.warning(f"⚠️ No results for: {artist_name}")
-                continue
+        tracks = search_results['tracks'].get('items', [])
+        if not tracks:
+            logger.warning(f"⚠️ No tracks found for: {artist_name}")
+            return None
 
-            tracks = search_results['tracks'].get('items', [])
-            if not tracks:
-                logger.warning(f"⚠️ No tracks found for: {artist_name}")
-                continue
+        # Берем первого артиста
+        first_track = tracks[0]
+        if not first_track.get('artists'):
+            return None
 
-            # Берем первого артиста
-            first_track = tracks[0]
-            if not first_track.get('artists'):
-                continue
+        return first_track['artists'][0]['id']
 
-            artist_data = first_track['artists'][0]
-            artist_id = artist_data['id']
+    def _fetch_top_tracks(self, item):
+        """Стадия fetch: топ треков изменившегося артиста (None - запрос не удался)"""
+        artist, unchanged = item
+        if unchanged:
+            return [(artist, unchanged, None)]
 
-            if artist_id in self.processed_artists:
+        try:
+            result = self.spotify.get_artist_top_tracks(artist['id'])
+        except Exception as e:
+            logger.error(f"❌ Error fetching top tracks of {artist.get('name')}: {e}")
+            result = None
+        tracks = None
+        if result is not None:
+            tracks = [track for track in result.get('tracks') or [] if track and 'id' in track]
+        return [(artist, unchanged, tracks)]
+
+    def _normalize_artist(self, item):
+        """Стадия normalize: ответы Spotify -> строки artists/albums/tracks
+
+        Внешние ключи пока заполнены spotify id - на id в БД их заменяет
+        стадия write, когда запишет родительские строки.
+        """
+        artist, unchanged, tracks = item
+        record = {
+            'spotify_id': artist['id'],
+            'name': artist['name'],
+            'unchanged': unchanged,
+            'failed': not unchanged and tracks is None,
+            'fingerprint': artist_fingerprint(artist),
+            'artist': artist_row(artist),
+            'albums': {},
+            'tracks': {},
+        }
+        for track in tracks or []:
+            album = track.get('album')
+            if not album or 'id' not in album:
                 continue
-
-            # Обрабатываем артиста
-            if self._process_premium_artist(artist_id, genre_ids, artist_name):
-                successful_artists += 1
-                logger.info(f"✅ Processed with FULL TRACKS: {artist_name}")
-
-            time.sleep(0.5)
-
-        logger.info(f"🎉 Processed {successful_artists} artists with full tracks")
-
-    def _process_premium_artist(self, artist_id, genre_ids, artist_name):
-        """Обработать артиста с полными треками"""
-        artist_data = self.spotify.get_artist(artist_id)
-        if not artist_data:
-            return False
-
+            # Владелец альбома - артист, в чьем топе он встретился первым
+            record['albums'].setdefault(album['id'], album_row(album, artist['id']))
+            record['tracks'][track['id']] = track_row(track, album['id'])
+        return [record]
+
+    def _write_artists(self, records, run_id, progress):
+        """Стадия write: пачка артистов - один upsert на тип сущности и отметки в одной транзакции
+
+        Выполняется в одном потоке, поэтому карты spotify id -> id в БД
+        меняются без блокировок. Новые id копятся поверх карт (ChainMap) и
+        попадают в них только после коммита: если пачка упала, откатываются
+        и строки, и контрольные точки, и артисты повторятся при продолжении
+        прогона (так же, как те, для которых не удалось получить треки).
+        """
         try:
-            # Вставляем артиста
-            self.db.execute_query(
-                """INSERT INTO artists (spotify_artist_id, artist_name, popularity_score, followers_count, image_url) 
-                   VALUES (%s, %s, %s, %s, %s)""",
-                (
-                    artist_data['id'],
-                    artist_data['name'],
-                    artist_data.get('popularity', 0),
-                    artist_data.get('followers', {}).get('count', 0),
-                    artist_data['images'][0]['url'] if artist_data.get('images') else None
-                )
-            )
-
-            # Получаем ID артиста
-            new_artist = self.db.execute_query(
-                "SELECT artist_id FROM artists WHERE spotify_artist_id = %s",
-                (artist_data['id'],),
-                fetch_one=True
-            )
-
-            if not new_artist:
-                return False
-
-            artist_db_id = new_artist['artist_id']
-            self.processed_artists.add(artist_id)
-
-            # Получаем топ треки артиста
-            top_tracks = self.spotify.get_artist_top_tracks(artist_id)
-            if top_tracks and 'tracks' in top_tracks:
-                for track in top_tracks['tracks']:
-                    self._process_premium_track(track, artist_db_id, genre_ids)
-                    time.sleep(0.3)
-
-            return True
+            loaded = [record for record in records if not record['unchanged'] and not record['failed']]
+            unchanged = [record['spotify_id'] for record in records if record['unchanged']]
+            artist_ids = ChainMap({}, self.artist_ids)
+            album_ids = ChainMap({}, self.album_ids)
+            track_ids = ChainMap({}, self.track_ids)
+
+            with self.db.transaction() as tx:
+                self._upsert(tx, UPSERT_ARTISTS, {record['spotify_id']: record['artist'] for record in loaded},
+                             artist_ids)
+                loaded = [record for record in loaded if record['spotify_id'] in artist_ids]
+
+                albums = {}
+                for record in loaded:
+                    for album_id, row in record['albums'].items():
+                        if album_id not in album_ids and album_id not in albums:
+                            albums[album_id] = row[:2] + (artist_ids[row[2]],) + row[3:]
+                self._upsert(tx, UPSERT_ALBUMS, albums, album_ids)
+
+                # Один трек может прийти в топах нескольких артистов (фиты) - пишется один раз
+                tracks = {}
+                for record in loaded:
+                    for track_id, row in record['tracks'].items():
+                        album_db_id = album_ids.get(row[2])
+                        if album_db_id and track_id not in track_ids and track_id not in tracks:
+                            tracks[track_id] = row[:2] + (album_db_id,) + row[3:]
+                self._upsert(tx, UPSERT_TRACKS, tracks, track_ids)
+
+                checkpoints = []
+                for record in loaded:
+                    tracks_loaded = sum(1 for track_id in record['tracks'] if track_id in track_ids)
+                    checkpoints.append((record['spotify_id'], run_id, record['fingerprint'], tracks_loaded))
+
+                if checkpoints:
+                    tx.insert_values(SAVE_CHECKPOINTS, checkpoints)
+                if unchanged:
+                    tx.execute(TOUCH_CHECKPOINTS, (run_id, unchanged))
+                tx.execute(ADVANCE_RUN, (len(checkpoints) + len(unchanged), run_id))
+
+            for ids, staged in ((self.artist_ids, artist_ids), (self.album_ids, album_ids),
+                                (self.track_ids, track_ids)):
+                ids.update(staged.maps[0])
+            for record, checkpoint in zip(loaded, checkpoints):
+                logger.info(f"✅ Processed with FULL TRACKS: {record['name']} ({checkpoint[3]} tracks)")
+
+            self.successful_artists += len(checkpoints)
+            self.unchanged_artists += len(unchanged)
+            return checkpoints
+        finally:
+            progress.advance(len(records))
+
+    def _upsert(self, tx, query, rows, ids):
+        """Записать строки (spotify id -> строка) одним upsert в транзакции tx и дополнить карту ids из RETURNING"""
+        if not rows:
+            return
+        returned = tx.insert_values(query, list(rows.values()), fetch=True)
+        ids.update((row['spotify_id'], row['db_id']) for row in returned)
+        logger.debug(f"Upserted {len(returned)}/{len(rows)} rows")
 
-        except Exception as e:
-            logger.error(f"❌ Error processing premium artist {artist_name}: {e}")
-            return False
+    def _create_user_activity(self):
+        """Создать пользовательскую активность"""
+        logger.info("👥 Creating user activity...")
 
-    def _process_premium_track(self, track_data, artist_db_id, genre_ids):
-        """Обработать трек с полной версией"""
-        if not track_data or 'id' not in track_data:
+        # Получаем пользователей (повторный прогон не дублирует их активность)
+        users = self.db.execute_query(USERS_WITHOUT_ACTIVITY, fetch=True)
+        if not users:
+            logger.info("✅ User activity already exists")
             return
 
-        if track_data['id'] in self.processed_tracks:
+        # Получаем треки (потоково - таблица может быть большой, нужна только выборка)
+        with closing(self.db.iter_query("SELECT track_id, duration_ms FROM tracks")) as stream:
+            tracks = list(islice(stream, config.ACTIVITY_TRACK_POOL))
+        if not tracks:
             return
 
-        try:
-            # Обрабатываем альбом
-            album_db_id = self._process_premium_album(track_data.get('album'), artist_db_id)
-            if not album_db_id:
-                return
-
-            # Получаем URL для полного трека (Spotify URI)
-            full_track_url = f"spotify:track:{track_data['id']}"
-
-            # Вставляем трек с полной версией
-            self.db.execute_query(
-                """INSERT INTO tracks (spotify_track_id, track_name, album_id, duration_ms, 
-                                    track_number, disc_number, explicit, popularity_score, 
-                                    preview_url, full_track_url, external_url) 
-                   VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
-                (
-                    track_data['id'],
-                    track_data['name'],
-                    album_db_id,
-                    track_data['duration_ms'],
-                    track_data.get('track_number', 1),
-                    track_data.get('disc_number', 1),
-                    track_data.get('explicit', False),
-                    track_data.get('popularity', 0),
-                    track_data.get('preview_url'),
-                    full_track_url,  # 🔥 ПОЛНЫЙ ТРЕК!
-                    track_data.get('external_urls', {}).get('spotify')
-                )
-            )
-
-            self.processed_tracks.add(track_data['id'])
-            logger.info(f"✅ FULL TRACK: {track_data['name']}")
-
-        except Exception as e:
-            logger.error(f"❌ Error processing premium track {track_data.get('name')}: {e}")
+        user_ids = [user['user_id'] for user in users]
 
-    def _process_premium_album(self, album_data, artist_db_id):
-        """Обработать альбом"""
-        if not album_data or 'id' not in album_data:
-            return None
+        # Плейлисты "Избранное" - одним многострочным INSERT
+        self.db.insert_values(
+            "INSERT INTO playlists (user_id, playlist_name, is_favorite, description) VALUES %s",
+            [(user_id, 'Избранное', True, 'Мои любимые треки') for user_id in user_ids]
+        )
 
-        if album_data['id'] in self.processed_albums:
-            existing = self.db.execute_query(
-                "SELECT album_id FROM albums WHERE spotify_album_id = %s",
-                (album_data['id'],),
-                fetch_one=True
-            )
-            return existing['album_id'] if existing else None
+        # Несколько треков в избранное (первые 5)
+        favorite_tracks = tracks[:5]
+        self.db.insert_values(
+            """INSERT INTO favorite_tracks (user_id, track_id) VALUES %s
+               ON CONFLICT (user_id, track_id) DO NOTHING""",
+            [(user_id, track['track_id']) for user_id in user_ids for track in favorite_tracks]
+        )
 
-        try:
-            # Вставляем альбом
-            self.db.execute_query(
-                """INSERT INTO albums (spotify_album_id, album_name, artist_id, album_type, 
-                                    total_tracks, release_date, release_date_precision, cover_url) 
-                   VALUES (%s, %s, %s, %s, %s, %s, %s, %s)""",
-                (
-                    album_data['id'],
-                    album_data['name'],
-                    artist_db_id,
-                    album_data['album_type'],
-                    album_data.get('total_tracks', 0),
-                    album_data.get('release_date'),
-                    album_data.get('release_date_precision', 'day'),
-                    album_data['images'][0]['url'] if album_data.get('images') else None
+        # История прослушиваний - потоком через COPY
+        loaded = self.db.copy_rows(
+            'listening_history',
+            ['user_id', 'track_id', 'listened_at', 'listen_duration_ms', 'completion_percentage'],
+            self._generate_listens(user_ids, tracks)
+        )
+        logger.info(f"🎧 Listening history rows loaded: {loaded or 0}")
+
+        logger.info("✅ User activity created")
+
+    def _generate_listens(self, user_ids, tracks):
+        """Сгенерировать случайные прослушивания за последние 90 дней"""
+        now = datetime.now()
+        for user_id in user_ids:
+            for _ in range(config.LISTENS_PER_USER):
+                track = random.choice(tracks)
+                completion = random.choice([1.0, 1.0, 1.0, random.uniform(0.1, 1.0)])
+                yield (
+                    user_id,
+                    track['track_id'],
+                    now - timedelta(seconds=random.randint(0, 90 * 24 * 3600)),
+                    int(track['duration_ms'] * completion),
+                    round(completion * 100, 1)
                 )
-            )
-
-            # Получаем ID альбома
-            new_album = self.db.execute_query(
-                "SELECT album_id FROM albums WHERE spotify_album_id = %s",
-                (album_data['id'],),
-                fetch_one=True
-            )
-
-            if new_album:
-                self.processed_albums.add(album_data['id'])
-                return new_album['album_id']
-
-            return None
 
-        except Exception as e:
-            logger.error(f"❌ Error processing album {album_data.get('name')}: {e}")
-            return None
-
-    def _create_user_activity(self):
-        """Создать пользовательскую активность"""
-        logger.info("👥 Creating user activity...")
 
-        # Получаем пользователей
-        users = self.db.execute_query("SELECT user_id FROM users WHERE role_id = 1", fetch=True)
-        if not users:
-            return
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-        # Получаем треки
-        tracks = self.db.execute_query("SELECT track_id, duration_ms FROM tracks", fetch=True)
-        if not tracks:
-            return
+    parser = argparse.ArgumentParser(description='Populate the catalog from Spotify (resumes an unfinished run)')
+    parser.add_argument('--mode', choices=POPULATE_MODES, default='full',
+                        help='full - all queued artists; refresh - only artists changed since the last run')
+    parser.add_argument('--restart', action='store_true', help='start a new run instead of resuming')
+    args = parser.parse_args()
 
-        # Создаем плейлисты и историю прослушиваний
-        for user in users:
-            user_id = user['user_id']
-
-            # Плейлист "Избранное"
-            self.db.execute_query(
-                """INSERT INTO playlists (user_id, playlist_name, is_favorite, description) 
-                   VALUES (%s, %s, %s, %s)""",
-                (user_id, 'Избранное', True, 'Мои любимые треки')
-            )
-
-            # Добавляем несколько треков в избранное
-            if tracks:
-                favorite_tracks = tracks[:5]  # Первые 5 треков
-                for i, track in enumerate(favorite_tracks):
-                    self.db.execute_query(
-                        "INSERT INTO favorite_tracks (user_id, track_id) VALUES (%s, %s)",
-                        (user_id, track['track_id'])
-                    )
-
-        logger.info("✅ User activity created")
\ No newline at end of file
+    PremiumDataPopulator().populate_premium_data(mode=args.mode, restart=args.restart)
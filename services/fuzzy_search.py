@@ -0,0 +1,237 @@
+# services/fuzzy_search.py
+from database.queries import search as search_queries
+from services.track_index import TrackIndex, normalize
+from config import config
+from bisect import insort
+from itertools import combinations
+import heapq
+import time
+
+# Удаления считаются только по первым PREFIX_LENGTH символам слова
+# (как в SymSpell): это ограничивает размер индекса, а полное расстояние
+# все равно проверяется по слову целиком
+PREFIX_LENGTH = 7
+# Сколько самых популярных треков слова просматривать на один запрос
+MAX_POSTINGS = 2000
+# Сколько треков всего просматривать на одно слово запроса (по всем кандидатам):
+# ограничивает и сбор, и итоговое ранжирование
+MAX_SCANNED_POSTINGS = 5000
+# Сколько слов запроса помнить вместе с найденными кандидатами
+CANDIDATE_CACHE_SIZE = 10000
+
+_FIELDS = ('track_id', 'track_name', 'duration_ms', 'preview_url', 'full_track_url',
+           'popularity', 'artist_name', 'album_name', 'cover_url')
+
+
+def damerau_levenshtein(a, b, max_distance):
+    """
+    Расстояние Дамерау-Левенштейна (вариант с соседними перестановками)
+
+    Считает только полосу шириной max_distance вокруг диагонали и
+    возвращает max_distance + 1, как только расстояние заведомо больше.
+    """
+    if a == b:
+        return 0
+    len_a, len_b = len(a), len(b)
+    if abs(len_a - len_b) > max_distance:
+        return max_distance + 1
+
+    too_far = max_distance + 1
+    previous_previous = None
+    previous = list(range(len_b + 1))
+    for i in range(1, len_a + 1):
+        current = [i] + [too_far] * len_b
+        low = max(1, i - max_distance)
+        high = min(len_b, i + max_distance)
+        row_min = current[0] if low == 1 else too_far
+        for j in range(low, high + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                value = min(value, previous_previous[j - 2] + 1)
+            current[j] = value
+            row_min = min(row_min, value)
+        if row_min > max_distance:
+            return too_far
+        previous_previous, previous = previous, current
+    return min(previous[len_b], too_far)
+
+
+def _deletes(word, max_distance):
+    """Все варианты префикса слова с удалением до max_distance символов"""
+    prefix = word[:PREFIX_LENGTH]
+    result = {prefix}
+    for distance in range(1, min(max_distance, len(prefix)) + 1):
+        for positions in combinations(range(len(prefix)), distance):
+            result.add(''.join(ch for index, ch in enumerate(prefix) if index not in positions))
+    return result
+
+
+def allowed_distance(token, max_distance):
+    """Допустимое число опечаток в зависимости от длины слова"""
+    if len(token) <= 2:
+        return 0
+    if len(token) <= 5:
+        return min(1, max_distance)
+    return max_distance
+
+
+class FuzzyTrackIndex(TrackIndex):
+    """Нечеткий поиск треков по названию, исполнителю и альбому
+
+    Словарь слов каталога + индекс удалений в стиле SymSpell: для слова
+    запроса генерируются варианты с удалением символов, по ним находятся
+    кандидаты из словаря, и каждый проверяется ограниченным расстоянием
+    Дамерау-Левенштейна. Треки ранжируются по доле совпавших слов запроса,
+    их близости и популярности. Поиск кандидатов ограничен бюджетом времени:
+    по его истечении ранжируется то, что уже найдено (ранжирование само
+    ограничено MAX_SCANNED_POSTINGS треками на слово запроса).
+    """
+
+    load_query = search_queries.FUZZY_INDEX_TRACKS
+    name = 'fuzzy index'
+
+    def __init__(self, max_distance=2, latency_budget_ms=20.0):
+        super().__init__()
+        self.max_distance = max_distance
+        self.latency_budget_ms = latency_budget_ms
+        self._tracks = {}       # track_id -> строка для карточки каталога
+        self._postings = {}     # слово -> [(-popularity, track_id)] по убыванию популярности
+        self._deletes = {}      # вариант с удалениями -> frozenset слов (заменяется, а не меняется)
+        self._candidate_cache = {}
+        self.budget_exceeded = 0
+
+    def add_tracks(self, tracks):
+        """Добавить треки в индекс (dict с полями FUZZY_INDEX_TRACKS)
+
+        Поиск читает множества _deletes без блокировки, поэтому новые слова
+        не добавляются в них на месте: за порцию для каждого варианта
+        публикуется новое множество.
+        """
+        with self._write_lock:
+            new_words = {}
+            for track in tracks:
+                row = {field: track.get(field) for field in _FIELDS}
+                row['popularity'] = row['popularity'] or 0
+                track_id = row['track_id']
+                self._tracks[track_id] = row
+                self.max_track_id = max(self.max_track_id, track_id)
+
+                words = set()
+                for name in (row['track_name'], row['artist_name'], row['album_name']):
+                    words.update(normalize(name).split())
+                for word in words:
+                    postings = self._postings.get(word)
+                    if postings is None:
+                        # Новое слово может оказаться кандидатом для уже закэшированных
+                        self._candidate_cache = {}
+                        self._postings[word] = [(-row['popularity'], track_id)]
+                        for variant in _deletes(word, self.max_distance):
+                            new_words.setdefault(variant, []).append(word)
+                    else:
+                        insort(postings, (-row['popularity'], track_id))
+
+            for variant, words in new_words.items():
+                self._deletes[variant] = self._deletes.get(variant, frozenset()).union(words)
+
+    def _candidates(self, token, max_distance, deadline):
+        """Слова словаря на расстоянии не больше max_distance: {слово: расстояние}"""
+        cache_key = (token, max_distance)
+        found = self._candidate_cache.get(cache_key)
+        if found is not None:
+            return found
+
+        found = {}
+        complete = True
+        for variant in _deletes(token, max_distance):
+            for word in self._deletes.get(variant, ()):
+                if word in found:
+                    continue
+                distance = damerau_levenshtein(token, word, max_distance)
+                if distance <= max_distance:
+                    found[word] = distance
+                if time.perf_counter() > deadline:
+                    complete = False
+                    break
+            if not complete:
+                break
+
+        # Незавершенный (обрезанный по времени) результат не кэшируем
+        if complete:
+            if len(self._candidate_cache) >= CANDIDATE_CACHE_SIZE:
+                self._candidate_cache = {}
+            self._candidate_cache[cache_key] = found
+        return found
+
+    def search(self, text, limit=20):
+        """
+        Найти треки с учетом опечаток
+
+        Returns:
+            list[dict]: строки в формате каталога, лучшие первыми
+        """
+        deadline = time.perf_counter() + self.latency_budget_ms / 1000
+        tokens = list(dict.fromkeys(normalize(text).split()))
+        if not tokens:
+            return []
+
+        # Для каждого трека: сколько слов запроса совпало и суммарная близость
+        matched = {}
+        similarity_total = {}
+        exceeded = False
+        for token in tokens:
+            max_distance = allowed_distance(token, self.max_distance)
+            candidates = self._candidates(token, max_distance, deadline)
+
+            # Лучшая близость трека к этому слову запроса
+            best = {}
+            scanned = 0
+            # Сначала точные и близкие слова: если бюджет кончится, они уже учтены
+            for word, distance in sorted(candidates.items(), key=lambda item: item[1]):
+                similarity = 1.0 - distance / (max(len(token), len(word)) + 1)
+                postings = self._postings[word][:min(MAX_POSTINGS, MAX_SCANNED_POSTINGS - scanned)]
+                scanned += len(postings)
+                for _, track_id in postings:
+                    if best.get(track_id, 0.0) < similarity:
+                        best[track_id] = similarity
+                if time.perf_counter() > deadline:
+                    exceeded = True
+                    break
+                if scanned >= MAX_SCANNED_POSTINGS:
+                    break
+
+            for track_id, similarity in best.items():
+                matched[track_id] = matched.get(track_id, 0) + 1
+                similarity_total[track_id] = similarity_total.get(track_id, 0.0) + similarity
+            if exceeded or time.perf_counter() > deadline:
+                exceeded = True
+                break
+
+        if exceeded:
+            self.budget_exceeded += 1
+
+        tracks = self._tracks
+        ranked = heapq.nlargest(
+            limit,
+            ((count, similarity_total[track_id], tracks[track_id]['popularity'], track_id)
+             for track_id, count in matched.items())
+        )
+        return [dict(tracks[track_id]) for *_, track_id in ranked]
+
+    def stats(self):
+        """Размер индекса"""
+        return {
+            'loaded': self.loaded,
+            'tracks': len(self._tracks),
+            'words': len(self._postings),
+            'deletes': len(self._deletes),
+            'budget_exceeded': self.budget_exceeded,
+            'max_track_id': self.max_track_id,
+        }
+
+
+# Общий индекс процесса
+fuzzy_index = FuzzyTrackIndex(
+    max_distance=config.FUZZY_MAX_DISTANCE,
+    latency_budget_ms=config.FUZZY_LATENCY_BUDGET_MS
+)
@@ -0,0 +1,258 @@
+# services/listen_writer.py
+from database.connection import db
+from database.partitions import ensure_partitions
+from config import config
+from datetime import datetime
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+import psycopg2
+
+logger = logging.getLogger(__name__)
+
+LISTEN_COLUMNS = ('user_id', 'track_id', 'listened_at', 'listen_duration_ms')
+
+
+class ListenEventWriter:
+    """Фоновая пакетная запись прослушиваний в listening_history
+
+    Запрос только кладет событие в ограниченную очередь; фоновый поток
+    забирает события пачками и пишет их одним COPY - когда набралось
+    batch_size событий или прошло flush_interval секунд с первого события
+    пачки. Если очередь заполнена (БД не успевает), submit() ждет не дольше
+    enqueue_timeout и отбрасывает событие. При завершении процесса очередь
+    дописывается (atexit).
+    """
+
+    def __init__(self, batch_size=500, flush_interval=1.0, max_queue=10000,
+                 enqueue_timeout=0.05, max_retries=3):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.enqueue_timeout = enqueue_timeout
+        self.max_retries = max_retries
+
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        # Месяц, для которого уже проверено наличие секций listening_history
+        self._partitions_month = None
+        atexit.register(self.stop)
+
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.flushes = 0
+        self.retries = 0
+        self.max_queue_depth = 0
+        self.last_batch_size = 0
+        self.last_error = None
+        self._flush_time_total = 0.0
+        self._flush_time_max = 0.0
+
+    def _ensure_started(self):
+        """Запустить поток записи (лениво и заново после fork)"""
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            if self._pid is not None and self._pid != os.getpid():
+                # Дочерний процесс: очередь и поток родителя нам не принадлежат
+                self._queue = queue.Queue(maxsize=self.max_queue)
+            self._stop = threading.Event()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='listen-writer', daemon=True)
+            self._thread.start()
+
+    def submit(self, user_id, track_id, duration_ms, listened_at=None):
+        """
+        Поставить прослушивание в очередь на запись
+
+        Returns:
+            bool: False, если очередь переполнена и событие отброшено
+        """
+        self._ensure_started()
+        event = (user_id, track_id, listened_at or datetime.now(), duration_ms)
+        try:
+            self._queue.put(event, timeout=self.enqueue_timeout)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+                dropped = self.dropped
+            if dropped == 1 or dropped % 1000 == 0:
+                logger.warning(f"Listen writer queue is full ({self.max_queue}), "
+                               f"{dropped} events dropped so far")
+            return False
+
+        with self._lock:
+            self.enqueued += 1
+            self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+        return True
+
+    def _next_batch(self):
+        """Собрать пачку: ждем первое событие, затем добираем до размера или интервала"""
+        try:
+            first = self._queue.get(timeout=self.flush_interval)
+        except queue.Empty:
+            return []
+
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stop.is_set():
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _drain(self):
+        """Все, что осталось в очереди (без ожидания)"""
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                return batch
+
+    def _ensure_partitions(self):
+        """Раз в месяц убедиться, что секции listening_history созданы наперед
+
+        Без этого события попадут в DEFAULT-секцию (не потеряются, но не
+        будут отсекаться по listened_at, пока их не перенесет обслуживание).
+        """
+        month = datetime.now().strftime('%Y-%m')
+        if self._partitions_month == month:
+            return
+        try:
+            ensure_partitions()
+            self._partitions_month = month
+        except Exception as e:
+            logger.error(f"Listen writer: failed to ensure partitions: {e}")
+
+    def _write(self, batch):
+        """Записать пачку одним COPY; при обрыве соединения - несколько повторов"""
+        self._ensure_partitions()
+        return self._copy(batch)
+
+    def _copy(self, batch):
+        """
+        COPY пачки с повторами; при ошибке данных пачка делится пополам
+
+        Плохими обычно бывают единичные события (трек уже удален), поэтому
+        теряются и попадают в failed только они, а не вся пачка.
+        """
+        for attempt in range(1, self.max_retries + 1):
+            started = time.perf_counter()
+            try:
+                with db.transaction() as tx:
+                    tx.copy_rows('listening_history', LISTEN_COLUMNS, batch)
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                self.last_error = str(e)
+                if attempt < self.max_retries and not self._stop.is_set():
+                    with self._lock:
+                        self.retries += 1
+                    time.sleep(min(0.5 * 2 ** (attempt - 1), 5))
+                    continue
+                logger.error(f"Listen writer: dropping {len(batch)} events after {attempt} attempts: {e}")
+                break
+            except (psycopg2.DataError, psycopg2.IntegrityError) as e:
+                # Ошибка данных (например, трек уже удален): повтор той же пачки не поможет
+                self.last_error = str(e)
+                if len(batch) > 1:
+                    logger.warning(f"Listen writer: failed to write {len(batch)} events, splitting: {e}")
+                    middle = len(batch) // 2
+                    left = self._copy(batch[:middle])
+                    right = self._copy(batch[middle:])
+                    return left and right
+                logger.error(f"Listen writer: dropping event {batch[0]}: {e}")
+                break
+            except Exception as e:
+                # Ошибка не в данных (права, схема): деление пачки не поможет
+                self.last_error = str(e)
+                logger.error(f"Listen writer: failed to write {len(batch)} events: {e}")
+                break
+
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.written += len(batch)
+                self.flushes += 1
+                self.last_batch_size = len(batch)
+                self._flush_time_total += elapsed
+                self._flush_time_max = max(self._flush_time_max, elapsed)
+            return True
+
+        with self._lock:
+            self.failed += len(batch)
+        return False
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._next_batch()
+            if batch:
+                self._write(batch)
+
+        # Остановка: дописываем остаток очереди
+        batch = self._drain()
+        for start in range(0, len(batch), self.batch_size):
+            self._write(batch[start:start + self.batch_size])
+
+    def flush(self, timeout=5.0):
+        """Дождаться, пока очередь опустеет (для скриптов перед выходом)"""
+        deadline = time.monotonic() + timeout
+        while not self._queue.empty() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return self._queue.empty()
+
+    def stop(self, timeout=10.0):
+        """Остановить поток, дописав очередь"""
+        thread = self._thread
+        if thread is None or self._pid != os.getpid():
+            return
+        self._stop.set()
+        thread.join(timeout)
+        if thread.is_alive():
+            logger.warning(f"Listen writer: stopped with {self._queue.qsize()} events not written")
+        self._thread = None
+
+    def stats(self):
+        """Метрики: глубина очереди, записанные/отброшенные события, время записи"""
+        with self._lock:
+            flushes = self.flushes
+            return {
+                'running': self._thread is not None and self._thread.is_alive(),
+                'queue_depth': self._queue.qsize(),
+                'max_queue': self.max_queue,
+                'max_queue_depth': self.max_queue_depth,
+                'batch_size': self.batch_size,
+                'flush_interval': self.flush_interval,
+                'enqueued': self.enqueued,
+                'written': self.written,
+                'dropped': self.dropped,
+                'failed': self.failed,
+                'retries': self.retries,
+                'flushes': flushes,
+                'last_batch_size': self.last_batch_size,
+                'avg_flush_ms': round(self._flush_time_total / flushes * 1000, 3) if flushes else 0.0,
+                'max_flush_ms': round(self._flush_time_max * 1000, 3),
+                'last_error': self.last_error,
+            }
+
+
+# Общий писатель процесса
+listen_writer = ListenEventWriter(
+    batch_size=config.LISTEN_BATCH_SIZE,
+    flush_interval=config.LISTEN_FLUSH_INTERVAL,
+    max_queue=config.LISTEN_QUEUE_SIZE,
+    enqueue_timeout=config.LISTEN_ENQUEUE_TIMEOUT
+)
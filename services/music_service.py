@@ -1,16 +1,58 @@
 # services/music_service.py
 from database.connection import db
+from config import config
 from database.queries import tracks as track_queries
 from database.queries import favorites as favorite_queries
 import logging
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from dateutil.parser import isoparse
 from database.queries import playlists as playlist_queries
+from database.queries import analytics as analytics_queries
+from database.queries import recommendations as recommendation_queries
+from services.search_service import SearchService
+from services.autocomplete import autocomplete_index
+from services.fuzzy_search import fuzzy_index
+from services.listen_writer import listen_writer
+from services.als_model import als_model
+from services.audio_features import audio_feature_index
+from utils.pagination import paginate
 
 logger = logging.getLogger(__name__)
 
 
+@dataclass
+class UserStatistics:
+    """Данные страницы статистики пользователя (результат MusicService.get_statistics)"""
+    unique_tracks: int = 0
+    total_listens: int = 0
+    total_duration_ms: int = 0
+    playlist_count: int = 0
+    top_genres: list = field(default_factory=list)
+    top_artists: list = field(default_factory=list)
+    listening_history: list = field(default_factory=list)
+
+    @property
+    def total_time(self):
+        """Общее время прослушивания в виде '12ч 34м'"""
+        total_seconds = self.total_duration_ms // 1000
+        return f"{total_seconds // 3600}ч {(total_seconds % 3600) // 60}м"
+
+    def user_stats(self):
+        """Словарь в формате UserService.get_user_stats (для шаблонов)"""
+        return {
+            'unique_tracks': self.unique_tracks,
+            'total_listens': self.total_listens,
+            'total_seconds': self.total_duration_ms,
+            'playlist_count': self.playlist_count,
+            'total_time': self.total_time,
+        }
+
+
 class MusicService:
     def __init__(self):
         self.db = db
+        self.search = SearchService()
 
     def create_playlist(self, user_id, title, description=""):
         """Создать плейлист"""
@@ -18,55 +60,75 @@ class MusicService:
             if not title or len(title.strip()) == 0:
                 return None
 
-            # Создаем плейлист
-            result = self.db.execute_query(
-                favorite_queries.CREATE_PLAYLIST,
+            # Создаем плейлист и сразу получаем его ID
+            playlist_id = self.db.execute_query(
+                playlist_queries.CREATE_PLAYLIST,
                 (user_id, title.strip(), description.strip())
             )
-
-            # Получаем ID созданного плейлиста
-            if result:
-                playlist_result = self.db.execute_query(
-                    "SELECT playlist_id FROM playlists WHERE user_id = %s AND playlist_title = %s ORDER BY date_created DESC LIMIT 1",
-                    (user_id, title.strip()),
-                    fetch_one=True
-                )
-                return playlist_result['playlist_id'] if playlist_result else None
-
-            return None
+            return playlist_id if playlist_id else None
 
         except Exception as e:
             logger.error(f"Error creating playlist: {e}")
             return None
 
-    def search_tracks(self, query, limit=20, offset=0):
-        """Поиск треков в базе"""
+    def search_tracks(self, query, limit=20, cursor=None, user_id=None, fuzzy=False):
+        """
+        Поиск треков в базе (полнотекстовый + триграммы, с учетом популярности)
+
+        fuzzy=True - поиск с опечатками ("Billie Elish", "Weekend") по индексу
+        в памяти (services/fuzzy_search.py). Пока индекс не загружен, ищем в БД.
+        """
         try:
             if not query or len(query.strip()) == 0:
-                return self.get_popular_tracks(limit, offset)
-
-            search_pattern = f"%{query.strip()}%"
+                return self.get_popular_tracks(limit)
 
-            results = self.db.execute_query(
-                track_queries.SEARCH_TRACKS,
-                (search_pattern, search_pattern, search_pattern,
-                 search_pattern, search_pattern, limit, offset),
-                fetch=True
-            )
+            if fuzzy:
+                fuzzy_index.refresh_async()
+                if fuzzy_index.loaded:
+                    return fuzzy_index.search(query, limit)
 
-            return results if results else []
+            return self.search.search_tracks(query, limit, cursor, user_id=user_id)
 
         except Exception as e:
             logger.error(f"Error searching tracks: {e}")
             return []
 
+    def autocomplete(self, query, limit=10):
+        """
+        Подсказки для строки поиска: [{id, title, artist, album, preview}]
+
+        Отвечает из индекса в памяти (services/autocomplete.py). Пока индекс
+        загружается (первый запрос процесса), отвечает обычным поиском по БД.
+        """
+        try:
+            autocomplete_index.refresh_async()
+            if autocomplete_index.loaded:
+                return autocomplete_index.complete(query, limit)
+
+            rows = self.search.search_tracks(query, limit) if query and query.strip() else []
+            return [
+                {
+                    'id': row['track_id'],
+                    'title': row['track_name'],
+                    'artist': row['artist_name'],
+                    'album': row['album_name'],
+                    'preview': row.get('preview_url'),
+                }
+                for row in rows
+            ]
+
+        except Exception as e:
+            logger.error(f"Error in autocomplete: {e}")
+            return []
+
     def get_popular_tracks(self, limit=20, offset=0):
         """Получить популярные треки"""
         try:
             results = self.db.execute_query(
                 track_queries.GET_POPULAR_TRACKS,
                 (limit, offset),
-                fetch=True
+                fetch=True,
+                cache_ttl=config.CATALOG_CACHE_TTL
             )
 
             return results if results else []
@@ -75,6 +137,93 @@ class MusicService:
             logger.error(f"Error getting popular tracks: {e}")
             return self._get_fallback_tracks()
 
+    def get_catalog_page(self, search_query='', limit=6, cursor=None):
+        """
+        Страница каталога (с поиском или без) с keyset-пагинацией
+
+        Страница N стоит столько же, сколько первая: вместо OFFSET запрос
+        продолжает с ключа (popularity_score, track_id) из курсора, а общее
+        количество берется из оценки планировщика (или кэшированного COUNT
+        для поиска). Одинакова для всех пользователей, поэтому кэшируется.
+
+        Returns:
+            dict: tracks, total_count, next_cursor, prev_cursor
+        """
+        try:
+            if search_query:
+                tracks, next_cursor, prev_cursor = self.search.search_page(search_query, limit, cursor)
+                total_count = self.search.count_tracks(search_query)
+                if not tracks and not cursor:
+                    # Ничего не нашлось - возможно, опечатка: одна страница нечеткого поиска
+                    tracks = self.search_tracks(search_query, limit, fuzzy=True)
+                    total_count = len(tracks)
+            else:
+                tracks, next_cursor, prev_cursor = paginate(
+                    self._fetch_catalog_page,
+                    cursor,
+                    limit,
+                    lambda track: [track['popularity'], track['track_id']]
+                )
+                total_count = self.get_tracks_count()
+
+            return {
+                'tracks': tracks,
+                'total_count': total_count,
+                'next_cursor': next_cursor,
+                'prev_cursor': prev_cursor
+            }
+
+        except Exception as e:
+            logger.error(f"Error getting catalog page: {e}")
+            return {'tracks': [], 'total_count': 0, 'next_cursor': None, 'prev_cursor': None}
+
+    def _fetch_catalog_page(self, direction, key, limit):
+        """Строки одной keyset-страницы каталога (для 'prev' - в обратном порядке)"""
+        if key is None:
+            query, params = track_queries.GET_TRACKS_FOR_CATALOG, (limit,)
+        elif direction == 'prev':
+            query, params = track_queries.GET_TRACKS_FOR_CATALOG_BEFORE, (key[0], key[1], limit)
+        else:
+            query, params = track_queries.GET_TRACKS_FOR_CATALOG_AFTER, (key[0], key[1], limit)
+
+        return self.db.execute_query(query, params, fetch=True, cache_ttl=config.CATALOG_CACHE_TTL)
+
+    def get_tracks_count(self):
+        """Количество треков: оценка из pg_class, точный COUNT только для маленьких таблиц"""
+        try:
+            estimate = self.db.execute_query(
+                track_queries.ESTIMATE_TRACKS_COUNT,
+                fetch_one=True,
+                cache_ttl=config.CATALOG_CACHE_TTL
+            )
+            if estimate and estimate['count'] >= config.EXACT_COUNT_THRESHOLD:
+                return estimate['count']
+
+            # Таблица маленькая или еще не анализировалась (reltuples = -1)
+            exact = self.db.execute_query(
+                track_queries.COUNT_TRACKS,
+                fetch_one=True,
+                cache_ttl=config.CATALOG_CACHE_TTL
+            )
+            return exact['count'] if exact else 0
+
+        except Exception as e:
+            logger.error(f"Error getting tracks count: {e}")
+            return 0
+
+    def get_all_tracks(self, limit=20, after_track_id=0):
+        """Треки для админки, keyset-пагинация по track_id"""
+        try:
+            results = self.db.execute_query(
+                track_queries.GET_ALL_TRACKS,
+                (after_track_id, limit),
+                fetch=True
+            )
+            return results if results else []
+        except Exception as e:
+            logger.error(f"Error getting all tracks: {e}")
+            return []
+
     def get_track_details(self, track_id):
         """Получить детальную информацию о треке"""
         try:
@@ -93,32 +242,39 @@ class MusicService:
     def toggle_favorite_track(self, user_id, track_id):
         """Добавить/удалить из избранного"""
         try:
-            # Проверяем, есть ли уже в избранном
-            existing = self.db.execute_query(
-                favorite_queries.CHECK_FAVORITE,
-                (user_id, track_id),
-                fetch_one=True
-            )
-
-            if existing:
-                # Удаляем из избранного
-                result = self.db.execute_query(
+            # Удаление и (если удалять было нечего) добавление - на одном соединении,
+            # одной транзакцией, без отдельной проверки
+            with self.db.transaction() as tx:
+                removed = tx.execute(
                     favorite_queries.REMOVE_FROM_FAVORITES,
                     (user_id, track_id)
                 )
-                return result is not None
-            else:
-                # Добавляем в избранное
-                result = self.db.execute_query(
-                    favorite_queries.ADD_TO_FAVORITES,
-                    (user_id, track_id)
-                )
-                return result is not None
+                if not removed:
+                    tx.execute(
+                        favorite_queries.ADD_TO_FAVORITES,
+                        (user_id, track_id)
+                    )
+            return True
 
         except Exception as e:
             logger.error(f"Error toggling favorite track: {e}")
             return False
 
+    def add_favorite_track(self, user_id, track_id):
+        """
+        Добавить трек в избранное одним запросом
+
+        Returns:
+            True - добавлен, False - уже был в избранном, None - ошибка БД
+        """
+        result = self.db.execute_query(
+            favorite_queries.ADD_TO_FAVORITES,
+            (user_id, track_id)
+        )
+        if result is None:
+            return None
+        return result > 0
+
     def get_user_favorites(self, user_id, limit=20, offset=0):
         """Получить избранные треки пользователя"""
         try:
@@ -151,8 +307,16 @@ class MusicService:
 
     # ИСПРАВИТЬ метод log_listen:
     def log_listen(self, user_id, track_id, duration_ms):  # duration_ms вместо duration
-        """Записать прослушивание - ИСПРАВЛЕННАЯ ВЕРСИЯ"""
+        """
+        Записать прослушивание
+
+        По умолчанию событие только ставится в очередь фоновой пакетной
+        записи (services/listen_writer.py); False - очередь переполнена.
+        """
         try:
+            if config.LISTEN_WRITER_ENABLED:
+                return listen_writer.submit(user_id, track_id, duration_ms)
+
             result = self.db.execute_query(
                 "INSERT INTO listening_history (user_id, track_id, listen_duration_ms) VALUES (%s, %s, %s)",
                 (user_id, track_id, duration_ms)  # listen_duration_ms вместо listen_duration_seconds
@@ -164,21 +328,10 @@ class MusicService:
 
     # ДОБАВИТЬ новые методы:
     def get_user_top_artists(self, user_id, limit=10):
-        """Получить топ исполнителей пользователя"""
+        """Получить топ исполнителей пользователя (из агрегатов user_artist_listens)"""
         try:
             results = self.db.execute_query(
-                """
-                SELECT 
-                    a.artist_name, 
-                    COUNT(*) as listen_count
-                FROM listening_history lh
-                JOIN tracks t ON lh.track_id = t.track_id
-                JOIN artists a ON t.artist_id = a.artist_id
-                WHERE lh.user_id = %s
-                GROUP BY a.artist_id, a.artist_name
-                ORDER BY listen_count DESC
-                LIMIT %s
-                """,
+                analytics_queries.USER_TOP_ARTISTS,
                 (user_id, limit),
                 fetch=True
             )
@@ -187,27 +340,137 @@ class MusicService:
             logger.error(f"Error getting user top artists: {e}")
             return []
 
+    def get_recommendations(self, user_id, limit=20):
+        """
+        Рекомендации пользователю из recommendation_cache (одна строка по ключу)
+
+        Кэш заполняют офлайн-задачи (services/recommendation_engine.py,
+        services/als_model.py). Пользователям, которых еще нет в кэше, но уже
+        есть прослушивания, считаем рекомендации по модели ALS (fold-in);
+        совсем новым отдаем популярное.
+        """
+        try:
+            results = self.db.execute_query(
+                recommendation_queries.GET_RECOMMENDED_TRACKS,
+                ('user', user_id, limit),
+                fetch=True,
+                cache_ttl=config.CATALOG_CACHE_TTL
+            )
+            if not results:
+                results = self._als_recommendations(user_id, limit)
+            return results if results else self.get_popular_tracks(limit)
+        except Exception as e:
+            logger.error(f"Error getting recommendations: {e}")
+            return []
+
+    def _als_recommendations(self, user_id, limit):
+        """Рекомендации по модели ALS и текущей истории пользователя"""
+        if not als_model.ensure_loaded():
+            return []
+        history = self.db.execute_query(
+            recommendation_queries.GET_USER_PLAY_COUNTS,
+            (user_id,),
+            fetch=True
+        )
+        if not history:
+            return []
+        recommended = als_model.recommend({row['track_id']: row['listen_count'] for row in history}, limit)
+        return self._tracks_by_scores(recommended)
+
+    def _tracks_by_scores(self, scored):
+        """Карточки треков для списка [(track_id, оценка)] в том же порядке"""
+        if not scored:
+            return []
+        track_ids, scores = zip(*scored)
+        results = self.db.execute_query(
+            recommendation_queries.GET_TRACKS_BY_SCORES,
+            (list(track_ids), list(scores)),
+            fetch=True
+        )
+        return results if results else []
+
+    def get_similar_tracks(self, track_id, limit=20):
+        """Похожие треки: по совместным прослушиваниям из recommendation_cache, иначе по ALS"""
+        try:
+            results = self.db.execute_query(
+                recommendation_queries.GET_RECOMMENDED_TRACKS,
+                ('track', track_id, limit),
+                fetch=True,
+                cache_ttl=config.CATALOG_CACHE_TTL
+            )
+            if not results and als_model.ensure_loaded():
+                results = self._tracks_by_scores(als_model.similar_tracks(track_id, limit))
+            return results if results else []
+        except Exception as e:
+            logger.error(f"Error getting similar tracks: {e}")
+            return []
+
+    def get_similar_sounding_tracks(self, track_id, limit=20):
+        """
+        Треки, похожие по звучанию (косинус по аудио-характеристикам)
+
+        Отвечает из индекса в памяти (services/audio_features.py); первый
+        запрос процесса запускает его загрузку и получает пустой список.
+        """
+        try:
+            audio_feature_index.refresh_async()
+            if not audio_feature_index.loaded:
+                return []
+            return self._tracks_by_scores(audio_feature_index.similar(track_id, limit))
+        except Exception as e:
+            logger.error(f"Error getting similar sounding tracks: {e}")
+            return []
+
+    def get_statistics(self, user_id, genres_limit=5, artists_limit=10, history_limit=20):
+        """
+        Все данные страницы статистики за один запрос (один round trip, одно соединение)
+
+        Returns:
+            UserStatistics: итоги, топ жанров и исполнителей, последние прослушивания
+        """
+        try:
+            row = self.db.execute_query(
+                analytics_queries.USER_STATISTICS,
+                {
+                    'user_id': user_id,
+                    'genres_limit': genres_limit,
+                    'artists_limit': artists_limit,
+                    'history_since': datetime.now() - timedelta(days=config.HISTORY_LOOKBACK_DAYS),
+                    'history_limit': history_limit,
+                },
+                fetch_one=True
+            )
+            if not row:
+                return UserStatistics()
+
+            totals = row['totals'] or {}
+            history = row['listening_history']
+            for listen in history:
+                # В json время приходит строкой ISO 8601; Postgres обрезает нули в долях
+                # секунды, а datetime.fromisoformat до 3.11 такие строки не разбирает
+                listen['listened_at'] = isoparse(listen['listened_at'])
+
+            return UserStatistics(
+                unique_tracks=totals.get('unique_tracks', 0),
+                total_listens=totals.get('total_listens', 0),
+                total_duration_ms=totals.get('total_duration_ms', 0),
+                playlist_count=row['playlist_count'],
+                top_genres=row['top_genres'],
+                top_artists=row['top_artists'],
+                listening_history=history
+            )
+
+        except Exception as e:
+            logger.error(f"Error getting statistics: {e}")
+            return UserStatistics()
+
     def get_listening_history(self, user_id, limit=20):
         """Получить историю прослушиваний"""
         try:
             results = self.db.execute_query(
-                """
-                SELECT 
-                    lh.listened_at,
-                    t.track_name,
-                    a.artist_name,
-                    al.album_name,
-                    lh.listen_duration_ms,
-                    lh.completion_percentage
-                FROM listening_history lh
-                JOIN tracks t ON lh.track_id = t.track_id
-                JOIN artists a ON t.artist_id = a.artist_id
-                JOIN albums al ON t.album_id = al.album_id
-                WHERE lh.user_id = %s
-                ORDER BY lh.listened_at DESC
-                LIMIT %s
-                """,
-                (user_id, limit),
+                analytics_queries.USER_LISTENING_HISTORY,
+                # Нижняя граница по listened_at отсекает старые месячные секции
+                (user_id, datetime.now() - timedelta(days=config.HISTORY_LOOKBACK_DAYS), limit),
                 fetch=True
             )
             return results if results else []
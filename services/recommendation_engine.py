@@ -0,0 +1,228 @@
+# services/recommendation_engine.py
+"""Офлайн-расчет рекомендаций item-item в recommendation_cache
+
+1. Взаимодействия пользователь-трек (прослушивания + избранное) -> разреженная
+   матрица R (пользователи x треки).
+2. Похожесть треков - косинус между столбцами R: S = R^T R / (|r_i| |r_j|),
+   считается блоками строк, у каждого трека остаются top-N соседей.
+3. Рекомендации пользователю - R_u S без уже прослушанных треков, top-N.
+4. Результат целиком заменяет recommendation_cache в одной транзакции (COPY).
+
+Запуск (например, из cron раз в сутки):
+    python -m services.recommendation_engine
+"""
+from database.connection import db
+from database.queries import recommendations as recommendation_queries
+from config import config
+from array import array
+from datetime import datetime
+import argparse
+import logging
+import time
+
+import numpy as np
+import scipy.sparse as sp
+
+logger = logging.getLogger(__name__)
+
+RECOMMENDATION_COLUMNS = ('kind', 'subject_id', 'track_ids', 'scores', 'generated_at')
+
+
+def load_interactions(favorite_weight, query=recommendation_queries.GET_INTERACTIONS):
+    """Взаимодействия из БД: массивы user_id, track_id, weight
+
+    По умолчанию - прослушивания и избранное (GET_INTERACTIONS с весом
+    избранного); ALS передает свой запрос (GET_PLAY_COUNTS, без параметров).
+    """
+    user_ids, track_ids, weights = array('q'), array('q'), array('d')
+    params = (favorite_weight,) if favorite_weight is not None else None
+    for row in db.iter_query(query, params):
+        user_ids.append(row['user_id'])
+        track_ids.append(row['track_id'])
+        weights.append(row['weight'])
+    return (np.frombuffer(user_ids, dtype=np.int64),
+            np.frombuffer(track_ids, dtype=np.int64),
+            np.frombuffer(weights, dtype=np.float64))
+
+
+def build_matrix(user_ids, track_ids, weights):
+    """
+    Разреженная матрица пользователи x треки
+
+    Returns:
+        tuple: (user_ids по строкам, track_ids по столбцам, csr_matrix)
+    """
+    users, user_index = np.unique(user_ids, return_inverse=True)
+    tracks, track_index = np.unique(track_ids, return_inverse=True)
+    matrix = sp.csr_matrix(
+        (weights.astype(np.float32), (user_index, track_index)),
+        shape=(len(users), len(tracks))
+    )
+    matrix.sum_duplicates()
+    return users, tracks, matrix
+
+
+def cap_user_history(matrix, max_items):
+    """Оставить у каждого пользователя max_items самых весомых треков
+
+    Пользователи с огромной историей дают квадратичное число пар в R^T R
+    и почти не добавляют сигнала.
+    """
+    counts = np.diff(matrix.indptr)
+    heavy_rows = np.flatnonzero(counts > max_items)
+    if not len(heavy_rows):
+        return matrix
+
+    matrix = matrix.tolil()
+    for row in heavy_rows:
+        columns = np.array(matrix.rows[row])
+        values = np.array(matrix.data[row])
+        keep = np.sort(np.argpartition(-values, max_items)[:max_items])
+        matrix.rows[row] = columns[keep].tolist()
+        matrix.data[row] = values[keep].tolist()
+    logger.info(f"✂️ History capped at {max_items} tracks for {len(heavy_rows)} users")
+    return matrix.tocsr()
+
+
+def top_n_per_row(rows, columns, values, n):
+    """
+    Top-n значений в каждой строке разреженной матрицы (в формате COO)
+
+    Returns:
+        tuple: (rows, columns, values), отсортированные по строке и убыванию значения
+    """
+    order = np.lexsort((-values, rows))
+    rows, columns, values = rows[order], columns[order], values[order]
+    # Позиция элемента внутри своей строки
+    rank = np.arange(len(rows)) - np.searchsorted(rows, rows, side='left')
+    keep = rank < n
+    return rows[keep], columns[keep], values[keep]
+
+
+def item_similarity(matrix, top_n, block_size=2048):
+    """Косинусная похожесть треков (треки x треки), top_n соседей у каждого"""
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+    norms[norms == 0] = 1.0
+    normalized = (matrix @ sp.diags((1.0 / norms).astype(np.float32))).tocsr()
+    by_track = normalized.T.tocsr()
+
+    n_tracks = matrix.shape[1]
+    parts_rows, parts_columns, parts_values = [], [], []
+    for start in range(0, n_tracks, block_size):
+        block = (by_track[start:start + block_size] @ normalized).tocoo()
+        rows = block.row.astype(np.int64) + start
+        not_self = block.col != rows
+        rows, columns, values = top_n_per_row(rows[not_self], block.col[not_self],
+                                              block.data[not_self], top_n)
+        parts_rows.append(rows)
+        parts_columns.append(columns)
+        parts_values.append(values)
+
+    return sp.csr_matrix(
+        (np.concatenate(parts_values), (np.concatenate(parts_rows), np.concatenate(parts_columns))),
+        shape=(n_tracks, n_tracks)
+    )
+
+
+def recommend_for_users(matrix, similarity, top_n, block_size=4096):
+    """Рекомендации пользователям: R_u S без уже известных треков, top_n на пользователя"""
+    parts_rows, parts_columns, parts_values = [], [], []
+    for start in range(0, matrix.shape[0], block_size):
+        history = matrix[start:start + block_size]
+        scores = (history @ similarity).tocsr()
+        # Убираем треки, которые пользователь уже слушал или добавил в избранное
+        known = history.copy()
+        known.data[:] = 1.0
+        scores = (scores - scores.multiply(known)).tocoo()
+        scores.eliminate_zeros()
+
+        rows, columns, values = top_n_per_row(scores.row.astype(np.int64) + start,
+                                              scores.col, scores.data, top_n)
+        parts_rows.append(rows)
+        parts_columns.append(columns)
+        parts_values.append(values)
+
+    return np.concatenate(parts_rows), np.concatenate(parts_columns), np.concatenate(parts_values)
+
+
+def _cache_rows(kind, subject_ids, track_ids, rows, columns, values, generated_at):
+    """Строки recommendation_cache: по одной на субъект, списки - литералы массивов"""
+    if not len(rows):
+        return
+    boundaries = np.flatnonzero(np.diff(rows)) + 1
+    starts = np.concatenate(([0], boundaries))
+    for row, row_columns, row_values in zip(rows[starts], np.split(columns, boundaries),
+                                            np.split(values, boundaries)):
+        yield (
+            kind,
+            int(subject_ids[row]),
+            '{' + ','.join(str(track_id) for track_id in track_ids[row_columns]) + '}',
+            '{' + ','.join(f'{value:.6g}' for value in row_values) + '}',
+            generated_at,
+        )
+
+
+def build_recommendations(per_user=None, per_track=None, favorite_weight=None, max_items_per_user=None):
+    """Пересчитать и заменить содержимое recommendation_cache; True при успехе"""
+    per_user = per_user or config.RECOMMENDATIONS_PER_USER
+    per_track = per_track or config.SIMILAR_TRACKS_PER_TRACK
+    favorite_weight = config.RECOMMENDER_FAVORITE_WEIGHT if favorite_weight is None else favorite_weight
+    max_items_per_user = max_items_per_user or config.RECOMMENDER_MAX_ITEMS_PER_USER
+
+    started = time.perf_counter()
+    logger.info("🤝 Building item-item recommendations...")
+
+    user_ids, track_ids, weights = load_interactions(favorite_weight)
+    if not len(user_ids):
+        logger.warning("⚠️ No listens or favorites yet, nothing to recommend")
+        return False
+
+    users, tracks, matrix = build_matrix(user_ids, track_ids, weights)
+    matrix = cap_user_history(matrix, max_items_per_user)
+    logger.info(f"📥 {matrix.nnz} interactions: {len(users)} users x {len(tracks)} tracks "
+                f"({time.perf_counter() - started:.1f}s)")
+
+    similarity = item_similarity(matrix, per_track)
+    logger.info(f"🔗 Track similarity: {similarity.nnz} pairs ({time.perf_counter() - started:.1f}s)")
+
+    # Рекомендации пользователям может писать ALS (services/als_model.py)
+    kinds = ('user', 'track') if config.RECOMMENDER_USER_MODEL == 'item' else ('track',)
+    if 'user' in kinds:
+        user_rows, user_columns, user_scores = recommend_for_users(matrix, similarity, per_user)
+        logger.info(f"🎯 User recommendations: {len(user_rows)} rows ({time.perf_counter() - started:.1f}s)")
+
+    similar = similarity.tocoo()
+    track_rows, track_columns, track_scores = top_n_per_row(
+        similar.row.astype(np.int64), similar.col, similar.data, per_track
+    )
+
+    generated_at = datetime.now()
+    try:
+        # Старые рекомендации видны читателям до COMMIT, затем сразу новые
+        with db.transaction() as tx:
+            for kind in kinds:
+                tx.execute(recommendation_queries.DELETE_RECOMMENDATIONS, (kind,))
+            users_written = 0
+            if 'user' in kinds:
+                users_written = tx.copy_rows('recommendation_cache', RECOMMENDATION_COLUMNS, _cache_rows(
+                    'user', users, tracks, user_rows, user_columns, user_scores, generated_at))
+            tracks_written = tx.copy_rows('recommendation_cache', RECOMMENDATION_COLUMNS, _cache_rows(
+                'track', tracks, tracks, track_rows, track_columns, track_scores, generated_at))
+    except Exception as e:
+        logger.error(f"❌ Failed to write recommendation_cache: {e}")
+        return False
+
+    logger.info(f"✅ recommendation_cache: {users_written} users, {tracks_written} tracks "
+                f"in {time.perf_counter() - started:.1f}s")
+    return True
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description='Build item-item recommendations into recommendation_cache')
+    parser.add_argument('--per-user', type=int, default=None)
+    parser.add_argument('--per-track', type=int, default=None)
+    args = parser.parse_args()
+
+    build_recommendations(per_user=args.per_user, per_track=args.per_track)
@@ -0,0 +1,99 @@
+# services/search_service.py
+from database.connection import db
+from database.queries import search as search_queries
+from config import config
+from utils.pagination import paginate
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+class SearchService:
+    """Поиск треков по tsvector/pg_trgm индексам (см. migrations/001_search_index.sql)"""
+
+    def __init__(self):
+        self.db = db
+
+    @staticmethod
+    def build_tsquery(text):
+        """
+        Строка для to_tsquery: все слова обязательны, последнее - как префикс
+
+        "blinding lig" -> "blinding & lig:*" (поиск срабатывает на каждое нажатие)
+        """
+        tokens = _TOKEN_RE.findall(text.lower())
+        if not tokens:
+            return None
+        return ' & '.join(tokens[:-1] + [f"{tokens[-1]}:*"])
+
+    def _params(self, text, **extra):
+        tsquery = self.build_tsquery(text)
+        if not tsquery:
+            return None
+        return dict(tsquery=tsquery, text=text.strip(), **extra)
+
+    def _fetch_page(self, text, direction, key, limit, user_id=None):
+        """Строки одной keyset-страницы (для 'prev' - в обратном порядке)"""
+        params = self._params(text, user_id=user_id, limit=limit)
+        if not params:
+            return []
+
+        if key is None:
+            query = search_queries.SEARCH_TRACKS_RANKED
+        else:
+            params['score'], params['track_id'] = key
+            query = (search_queries.SEARCH_TRACKS_RANKED_BEFORE if direction == 'prev'
+                     else search_queries.SEARCH_TRACKS_RANKED_AFTER)
+
+        try:
+            results = self.db.execute_query(
+                query,
+                params,
+                fetch=True,
+                # Без user_id результат одинаков для всех - можно кэшировать
+                cache_ttl=None if user_id else config.CATALOG_CACHE_TTL
+            )
+            return results if results else []
+        except Exception as e:
+            logger.error(f"Error searching tracks: {e}")
+            return []
+
+    def search_page(self, text, limit=20, cursor=None, user_id=None):
+        """
+        Страница результатов поиска, отсортированных по релевантности и популярности
+
+        Returns:
+            tuple: (треки, курсор следующей страницы, курсор предыдущей)
+        """
+        return paginate(
+            lambda direction, key, size: self._fetch_page(text, direction, key, size, user_id),
+            cursor,
+            limit,
+            lambda track: [track['score'], track['track_id']]
+        )
+
+    def search_tracks(self, text, limit=20, cursor=None, user_id=None):
+        """Найти треки (одна страница, без курсоров)"""
+        tracks, _, _ = self.search_page(text, limit, cursor, user_id)
+        return tracks
+
+    def count_tracks(self, text):
+        """Количество найденных треков"""
+        params = self._params(text)
+        if not params:
+            return 0
+
+        try:
+            result = self.db.execute_query(
+                search_queries.COUNT_SEARCH_TRACKS,
+                params,
+                fetch_one=True,
+                cache_ttl=config.CATALOG_CACHE_TTL
+            )
+            return result['count'] if result else 0
+        except Exception as e:
+            logger.error(f"Error counting search results: {e}")
+            return 0
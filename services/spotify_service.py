@@ -1,32 +1,86 @@
 # services/spotify_service.py
 import requests
+from requests.adapters import HTTPAdapter
 import base64
-import time
 import logging
+import threading
 from datetime import datetime, timedelta
 from config import config
+from utils.batching import RequestCoalescer
+from utils.http_cache import ResponseCache
+from utils.rate_limit import TokenBucket
 
 logger = logging.getLogger(__name__)
 
 
+# Один лимит на процесс: все экземпляры сервиса и все потоки делят квоту Spotify
+spotify_rate_limiter = TokenBucket(config.SPOTIFY_RATE_LIMIT, config.SPOTIFY_RATE_BURST)
+
+# Максимум id в одном запросе пакетных эндпоинтов Spotify
+BATCH_LIMITS = {
+    'tracks': 50,
+    'artists': 50,
+    'albums': 20,
+    'audio-features': 100,
+}
+
+# off - без кэша; cache - кэш с TTL и перепроверкой по ETag; record - всегда
+# запрашивать и записывать ответы; replay - только записанные ответы, без сети
+CACHE_MODES = ('off', 'cache', 'record', 'replay')
+
+
 class SpotifyService:
-    """Полнофункциональный сервис для работы с Spotify API"""
+    """Полнофункциональный сервис для работы с Spotify API
+
+    Потокобезопасен: один экземпляр можно использовать из нескольких потоков.
+    """
 
-    def __init__(self):
-        self.base_url = "https://api.spotify.com/v1"
-        self.auth_url = "https://accounts.spotify.com/api/token"
+    def __init__(self, limiter=None):
+        self.base_url = config.SPOTIFY_API_URL.rstrip('/')
+        self.auth_url = config.SPOTIFY_AUTH_URL
         self.client_id = config.SPOTIFY_CLIENT_ID
         self.client_secret = config.SPOTIFY_CLIENT_SECRET
+        self.limiter = limiter or spotify_rate_limiter
+        self.max_retries = config.SPOTIFY_MAX_RETRIES
         self.access_token = None
         self.token_expires = None
         self.request_count = 0
-        self.last_request_time = 0
+        self._token_lock = threading.Lock()
+        self._count_lock = threading.Lock()
+
+        # Keep-alive: соединения (и TLS-сессии) переиспользуются между запросами и потоками
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=config.SPOTIFY_HTTP_POOL_SIZE)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self.cache_mode = config.SPOTIFY_CACHE_MODE
+        if self.cache_mode not in CACHE_MODES:
+            raise ValueError(f"Unknown SPOTIFY_CACHE_MODE: {self.cache_mode}")
+        self.cache = (ResponseCache(config.SPOTIFY_CACHE_DIR, config.SPOTIFY_CACHE_TTL)
+                      if self.cache_mode != 'off' else None)
+
+        # Одиночные get_track/get_artist/... из разных потоков сворачиваются в пакеты
+        window = config.SPOTIFY_COALESCE_WINDOW_MS / 1000
+        self._coalescers = {
+            endpoint: RequestCoalescer(lambda ids, endpoint=endpoint: self._get_several(endpoint, ids),
+                                       limit, window)
+            for endpoint, limit in BATCH_LIMITS.items()
+        } if window > 0 else {}
 
     def _get_access_token(self):
         """Получить access token для Spotify API"""
         if self.access_token and self.token_expires and datetime.now() < self.token_expires:
             return self.access_token
 
+        # Токен запрашивает один поток, остальные ждут и берут готовый
+        with self._token_lock:
+            if self.access_token and self.token_expires and datetime.now() < self.token_expires:
+                return self.access_token
+            return self._request_access_token()
+
+    def _request_access_token(self):
+        """Запросить новый токен (client credentials)"""
         if not self.client_id or not self.client_secret:
             logger.error("Spotify credentials not configured")
             return None
@@ -42,7 +96,7 @@ class SpotifyService:
         data = {'grant_type': 'client_credentials'}
 
         try:
-            response = requests.post(self.auth_url, headers=headers, data=data, timeout=10)
+            response = self.session.post(self.auth_url, headers=headers, data=data, timeout=10)
             if response.status_code == 200:
                 token_data = response.json()
                 self.access_token = token_data['access_token']
@@ -56,44 +110,98 @@ class SpotifyService:
             logger.error(f"❌ Error getting access token: {e}")
             return None
 
-    def _make_request(self, endpoint, params=None):
-        """Безопасный запрос к Spotify API с rate limiting"""
-        token = self._get_access_token()
-        if not token:
-            return None
+    def _lookup(self, endpoint, params=None):
+        """
+        Ответ из кэша
+
+        Returns:
+            tuple: (можно ли отдать из кэша, тело, запись для перепроверки по ETag)
+        """
+        if not self.cache or self.cache_mode == 'record':
+            return False, None, None
+        entry = self.cache.get(endpoint, params)
+        if entry and (self.cache_mode == 'replay' or self.cache.is_fresh(entry)):
+            if entry['status'] == 404:
+                logger.warning(f"⚠️ Resource not found: {endpoint}")
+            return True, entry['body'], entry
+        return False, None, entry
+
+    def _store(self, endpoint, params, status, body, response=None):
+        """Сохранить ответ в кэш (ошибка записи не прерывает запрос)"""
+        if not self.cache:
+            return
+        try:
+            self.cache.put(endpoint, params, status, body,
+                           etag=response.headers.get('ETag') if response is not None else None,
+                           last_modified=response.headers.get('Last-Modified') if response is not None else None)
+        except OSError as e:
+            logger.warning(f"⚠️ Failed to cache {endpoint}: {e}")
 
-        # Rate limiting: 1 запрос в 0.1 секунду
-        current_time = time.time()
-        time_since_last = current_time - self.last_request_time
-        if time_since_last < 0.1:
-            time.sleep(0.1 - time_since_last)
+    def _make_request(self, endpoint, params=None, use_cache=True):
+        """Запрос к Spotify API через общий лимит запросов и кэш ответов
+
+        Ответ 429 приостанавливает весь лимит на Retry-After секунд: ждут все
+        потоки, а не только тот, которому пришел отказ. Устаревшая запись кэша
+        с ETag перепроверяется условным запросом (304 - запись продлевается).
+        """
+        entry = None
+        if use_cache:
+            hit, body, entry = self._lookup(endpoint, params)
+            if hit:
+                return body
+            if self.cache_mode == 'replay':
+                logger.warning(f"⚠️ No recorded response for {endpoint}, skipping (replay mode)")
+                return None
 
         url = f"{self.base_url}/{endpoint}"
-        headers = {'Authorization': f'Bearer {token}'}
 
-        try:
-            self.request_count += 1
-            response = requests.get(url, headers=headers, params=params, timeout=15)
-            self.last_request_time = time.time()
+        for _ in range(self.max_retries + 1):
+            token = self._get_access_token()
+            if not token:
+                return None
+
+            self.limiter.acquire()
+            headers = {'Authorization': f'Bearer {token}'}
+            if entry and entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            elif entry and entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+            try:
+                with self._count_lock:
+                    self.request_count += 1
+                response = self.session.get(url, headers=headers, params=params, timeout=15)
+            except requests.exceptions.RequestException as e:
+                logger.error(f"❌ Request failed: {e}")
+                return None
 
             if response.status_code == 429:
                 retry_after = int(response.headers.get('Retry-After', 5))
-                logger.warning(f"⏳ Rate limit hit, waiting {retry_after} seconds...")
-                time.sleep(retry_after)
-                return self._make_request(endpoint, params)
+                logger.warning(f"⏳ Rate limit hit, pausing all requests for {retry_after} seconds...")
+                self.limiter.pause(retry_after)
+                continue
 
+            if response.status_code == 304 and entry:
+                try:
+                    self.cache.touch(entry)
+                except OSError as e:
+                    logger.warning(f"⚠️ Failed to cache {endpoint}: {e}")
+                return entry['body']
             if response.status_code == 200:
-                return response.json()
+                body = response.json()
+                if use_cache:
+                    self._store(endpoint, params, 200, body, response)
+                return body
             elif response.status_code == 404:
+                if use_cache:
+                    self._store(endpoint, params, 404, None, response)
                 logger.warning(f"⚠️ Resource not found: {endpoint}")
                 return None
             else:
                 logger.error(f"❌ Spotify API error {response.status_code}: {response.text}")
                 return None
 
-        except requests.exceptions.RequestException as e:
-            logger.error(f"❌ Request failed: {e}")
-            return None
+        logger.error(f"❌ Giving up on {endpoint} after {self.max_retries} rate limit retries")
+        return None
 
     def search_tracks(self, query, limit=20, offset=0):
         """Поиск треков"""
@@ -105,17 +213,91 @@ class SpotifyService:
         }
         return self._make_request("search", params)
 
+    def _fetch_several(self, endpoint, ids):
+        """
+        Пакетный запрос объектов по id: список режется по лимиту эндпоинта
+
+        Кэш ведется по объектам (под ключом одиночного запроса endpoint/id),
+        поэтому повторный прогон и replay не зависят от того, как id
+        разложились по пакетам.
+
+        Returns:
+            dict: id -> объект (None - Spotify его не нашел); id, запрос по
+            которым не удался, в словаре отсутствуют
+        """
+        ids = list(ids)
+        found = {}
+        for item_id in dict.fromkeys(ids):
+            hit, body, _ = self._lookup(f"{endpoint}/{item_id}")
+            if hit:
+                found[item_id] = body
+
+        missing = [item_id for item_id in dict.fromkeys(ids) if item_id not in found]
+        if missing and self.cache_mode == 'replay':
+            logger.warning(f"⚠️ No recorded {endpoint} for {len(missing)} ids, skipping (replay mode)")
+            missing = []
+
+        limit = BATCH_LIMITS[endpoint]
+        key = endpoint.replace('-', '_')
+        for start in range(0, len(missing), limit):
+            chunk = missing[start:start + limit]
+            response = self._make_request(endpoint, {'ids': ','.join(chunk)}, use_cache=False)
+            if response is None:
+                continue
+            for item_id, item in zip(chunk, response.get(key) or []):
+                found[item_id] = item
+                self._store(f"{endpoint}/{item_id}", None, 200 if item else 404, item)
+        return found
+
+    def _get_several(self, endpoint, ids):
+        """
+        Пакетный запрос объектов по id (см. _fetch_several)
+
+        Returns:
+            list: Объекты в порядке ids; None - не найден или запрос не удался
+        """
+        ids = list(ids)
+        found = self._fetch_several(endpoint, ids)
+        return [found.get(item_id) for item_id in ids]
+
+    def _get_one(self, endpoint, item_id):
+        """Один объект: через пакетный запрос вместе с соседними потоками, если он включен"""
+        coalescer = self._coalescers.get(endpoint)
+        if coalescer:
+            return coalescer.get(item_id)
+        return self._make_request(f"{endpoint}/{item_id}")
+
     def get_track(self, track_id):
         """Получить информацию о треке"""
-        return self._make_request(f"tracks/{track_id}")
+        return self._get_one('tracks', track_id)
+
+    def get_tracks(self, track_ids):
+        """Получить несколько треков (по 50 за запрос)"""
+        return self._get_several('tracks', track_ids)
 
     def get_track_audio_features(self, track_id):
         """Получить аудио-характеристики трека"""
-        return self._make_request(f"audio-features/{track_id}")
+        return self._get_one('audio-features', track_id)
+
+    def get_tracks_audio_features(self, track_ids):
+        """Получить аудио-характеристики нескольких треков (по 100 за запрос)"""
+        return self._get_several('audio-features', track_ids)
+
+    def get_tracks_audio_features_by_id(self, track_ids):
+        """Аудио-характеристики по id: None - их нет; id, запрос по которым не удался, отсутствуют"""
+        return self._fetch_several('audio-features', track_ids)
 
     def get_artist(self, artist_id):
         """Получить информацию об артисте"""
-        return self._make_request(f"artists/{artist_id}")
+        return self._get_one('artists', artist_id)
+
+    def get_artists(self, artist_ids):
+        """Получить несколько артистов (по 50 за запрос)"""
+        return self._get_several('artists', artist_ids)
+
+    def get_artists_by_id(self, artist_ids):
+        """Артисты по id: None - не найден; id, запрос по которым не удался, отсутствуют"""
+        return self._fetch_several('artists', artist_ids)
 
     def get_artist_top_tracks(self, artist_id, country='US'):
         """Получить топ треков артиста"""
@@ -124,7 +306,20 @@ class SpotifyService:
 
     def get_album(self, album_id):
         """Получить информацию об альбоме"""
-        return self._make_request(f"albums/{album_id}")
+        return self._get_one('albums', album_id)
+
+    def get_albums(self, album_ids):
+        """Получить несколько альбомов (по 20 за запрос)"""
+        return self._get_several('albums', album_ids)
+
+    def cache_stats(self):
+        """Режим и счетчики кэша ответов"""
+        stats = self.cache.stats() if self.cache else {}
+        return dict(stats, mode=self.cache_mode, requests=self.request_count)
+
+    def coalescing_stats(self):
+        """Сколько одиночных запросов свернулось в пакеты, по эндпоинтам"""
+        return {endpoint: coalescer.stats() for endpoint, coalescer in self._coalescers.items()}
 
     def get_album_tracks(self, album_id, limit=50, offset=0):
         """Получить треки альбома"""
@@ -0,0 +1,99 @@
+# services/track_index.py
+from abc import ABC, abstractmethod
+from config import config
+import logging
+import threading
+import time
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+
+def normalize(text):
+    """Нижний регистр, без диакритики и лишних пробелов: 'Beyoncé ' -> 'beyonce'"""
+    if not text:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return ' '.join(stripped.split())
+
+
+class TrackIndex(ABC):
+    """Базовый класс индексов каталога в памяти процесса
+
+    Загружает треки из БД серверным курсором и дальше подгружает только
+    новые (track_id больше уже загруженного). Наследник задает запрос
+    load_query (один параметр - последний track_id) и add_tracks().
+    Пока идет load(), флаг _loading поднят: наследник может только копить
+    порции в add_tracks() и достроить индекс один раз в _finish_load().
+    """
+
+    load_query = None
+    name = 'track index'
+
+    def __init__(self):
+        self._write_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self.loaded = False
+        self._loading = False
+        self.max_track_id = 0
+        self.last_refresh = 0.0
+
+    @abstractmethod
+    def add_tracks(self, tracks):
+        """Добавить порцию треков (dict - строки load_query)"""
+
+    def _finish_load(self):
+        """Вызывается в конце load() после всех порций add_tracks()"""
+
+    def load(self, batch_size=5000, rows=None):
+        """
+        Загрузить из БД треки, которых еще нет в индексе (инкрементально по track_id)
+
+        Args:
+            batch_size (int): Строк в одной порции add_tracks()
+            rows (iterable): Готовые строки вместо запроса к БД (для бенчмарка)
+        """
+        with self._refresh_lock:
+            started = time.perf_counter()
+            added = 0
+            batch = []
+            if rows is None:
+                # Импорт здесь: индекс из готовых строк (бенчмарк) не подключается к БД
+                from database.connection import db
+                rows = db.iter_query(self.load_query, (self.max_track_id,))
+            self._loading = True
+            try:
+                for row in rows:
+                    batch.append(row)
+                    if len(batch) >= batch_size:
+                        self.add_tracks(batch)
+                        added += len(batch)
+                        batch = []
+                self.add_tracks(batch)
+                added += len(batch)
+            finally:
+                self._loading = False
+                self._finish_load()
+
+            self.loaded = True
+            self.last_refresh = time.monotonic()
+            if added:
+                logger.info(f"🔤 {self.name}: +{added} tracks in {time.perf_counter() - started:.2f}s")
+            return added
+
+    def refresh_async(self):
+        """Подгрузить новые треки в фоне, если индекс устарел (не блокирует запрос)"""
+        if self._refresh_lock.locked():
+            return
+        if self.loaded and time.monotonic() - self.last_refresh < config.SEARCH_INDEX_REFRESH_SECONDS:
+            return
+
+        def run():
+            try:
+                self.load()
+            except Exception as e:
+                logger.error(f"{self.name} refresh failed: {e}")
+                self.last_refresh = time.monotonic()
+
+        threading.Thread(target=run, name=f"{self.name.replace(' ', '-')}-refresh", daemon=True).start()
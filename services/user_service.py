@@ -6,6 +6,7 @@ from database.connection import db
 from database.queries.users import *
 from database.queries.analytics import *
 import bcrypt
+from config import config
 
 
 logger = logging.getLogger(__name__)
@@ -46,35 +47,35 @@ class UserService:
                 if not user_data.get(field):
                     return None
 
-            # Проверяем уникальность username и email
-            existing_user = self.db.execute_query(
-                "SELECT user_id FROM users WHERE username = %s OR email = %s",
-                (user_data['username'], user_data['email']),
-                fetch_one=True
-            )
+            # Хешируем пароль заранее, чтобы не держать соединение во время хеширования
+            hashed_password = hash_password(user_data['password'])
 
-            if existing_user:
-                return None
+            # Проверка уникальности, пользователь и его плейлист - одной транзакцией
+            with self.db.transaction() as tx:
+                existing_user = tx.execute(
+                    "SELECT user_id FROM users WHERE username = %s OR email = %s",
+                    (user_data['username'], user_data['email']),
+                    fetch_one=True
+                )
 
-            # Хешируем пароль
-            hashed_password = hash_password(user_data['password'])
+                if existing_user:
+                    return None
 
-            # Создаем пользователя
-            user_id = self.db.execute_query(
-                "INSERT INTO users (username, email, password_hash, first_name, last_name, role_id) VALUES (%s, %s, %s, %s, %s, 1) RETURNING user_id",
-                (
-                    user_data['username'],
-                    user_data['email'],
-                    hashed_password,
-                    user_data.get('first_name', ''),
-                    user_data.get('last_name', '')
+                # Создаем пользователя
+                user_id = tx.execute(
+                    "INSERT INTO users (username, email, password_hash, first_name, last_name, role_id) VALUES (%s, %s, %s, %s, %s, 1) RETURNING user_id",
+                    (
+                        user_data['username'],
+                        user_data['email'],
+                        hashed_password,
+                        user_data.get('first_name', ''),
+                        user_data.get('last_name', '')
+                    )
                 )
-            )
 
-            # Создаем плейлист "Избранное" для нового пользователя
-            if user_id:
-                self.db.execute_query(
-                    "INSERT INTO playlists (user_id, playlist_title, is_favorite_playlist) VALUES (%s, 'Избранное', true)",
+                # Создаем плейлист "Избранное" для нового пользователя
+                tx.execute(
+                    "INSERT INTO playlists (user_id, playlist_name, is_favorite) VALUES (%s, 'Избранное', true)",
                     (user_id,)
                 )
 
@@ -102,19 +103,17 @@ class UserService:
     def get_user_stats(self, user_id):
         """Получить статистику пользователя - ИСПРАВЛЕННАЯ ВЕРСИЯ"""
         try:
-            # Статистика прослушиваний - используем правильные названия таблиц и полей
-            listen_stats = self.db.execute_query(
-                """
-                SELECT 
-                    COUNT(DISTINCT track_id) as unique_tracks,
-                    COUNT(*) as total_listens,
-                    COALESCE(SUM(listen_duration_ms), 0) as total_seconds
-                FROM listening_history
-                WHERE user_id = %s
-                """,
+            # Итоги прослушиваний - из агрегатов (одна строка), а не по всей истории
+            totals = self.db.execute_query(
+                USER_LISTENING_TOTALS,
                 (user_id,),
                 fetch_one=True
             )
+            listen_stats = {
+                'unique_tracks': totals['unique_tracks'],
+                'total_listens': totals['total_listens'],
+                'total_seconds': totals['total_duration_ms'],
+            } if totals else None
 
             # Количество плейлистов
             playlist_count = self.db.execute_query(
@@ -145,24 +144,34 @@ class UserService:
                     'total_time': '0ч 0м'}
 
     def get_user_top_genres(self, user_id, limit=5):
-        """Получить топ жанров пользователя - ИСПРАВЛЕННАЯ ВЕРСИЯ"""
+        """Получить топ жанров пользователя (из агрегатов user_genre_listens)"""
         try:
             results = self.db.execute_query(
-                """
-                SELECT g.genre_name, COUNT(*) as listen_count
-                FROM listening_history lh  
-                JOIN tracks t ON lh.track_id = t.track_id
-                JOIN track_genres tg ON t.track_id = tg.track_id 
-                JOIN genres g ON tg.genre_id = g.genre_id
-                WHERE lh.user_id = %s
-                GROUP BY g.genre_id, g.genre_name
-                ORDER BY listen_count DESC
-                LIMIT %s
-                """,
+                USER_TOP_GENRES,
                 (user_id, limit),
                 fetch=True
             )
             return results if results else []
         except Exception as e:
             logger.error(f"Error getting user top genres: {e}")
-            return []
\ No newline at end of file
+            return []
+
+    def get_system_stats(self):
+        """Системная статистика для админки (кэшируется на STATS_CACHE_TTL)"""
+        try:
+            result = self.db.execute_query(
+                SYSTEM_STATS,
+                fetch_one=True,
+                cache_ttl=config.STATS_CACHE_TTL,
+                # Без listening_history/user_listening_totals: прослушивания пишутся
+                # каждую секунду и сбрасывали бы кэш; total_listens отстает не больше TTL
+                cache_tags={'users', 'tracks', 'artists'}
+            )
+            return result if result else {}
+        except Exception as e:
+            logger.error(f"Error getting system stats: {e}")
+            return {}
+
+    def iter_all_users(self):
+        """Потоково перебрать всех пользователей (для выгрузок в админке)"""
+        return self.db.iter_query(GET_ALL_USERS)
@@ -0,0 +1,82 @@
+# utils/batching.py
+"""Объединение одиночных запросов к внешним API в пакетные"""
+import threading
+from concurrent.futures import Future
+
+
+class RequestCoalescer:
+    """Собирает одиночные запросы из разных потоков в один пакетный
+
+    Первый поток, пришедший в пустое окно, становится ведущим: ждет до
+    max_wait секунд (или пока не наберется max_batch ключей), забирает все
+    накопленные ключи и делает один вызов fetch_many. Остальные потоки
+    просто ждут свой результат. Одинаковые ключи в окне запрашиваются один раз.
+
+    fetch_many(keys) должен вернуть список значений в порядке keys
+    (None - объект не найден).
+    """
+
+    def __init__(self, fetch_many, max_batch, max_wait=0.02):
+        self.fetch_many = fetch_many
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._full = threading.Event()
+        self._leader_active = False
+
+        self.requested = 0
+        self.batches = 0
+        self.fetched = 0
+
+    def get(self, key):
+        """Значение для одного ключа (блокирует до выполнения пакета)"""
+        with self._lock:
+            self.requested += 1
+            future = self._pending.get(key)
+            if future is None:
+                future = self._pending[key] = Future()
+            if len(self._pending) >= self.max_batch:
+                self._full.set()
+            leader = not self._leader_active
+            if leader:
+                self._leader_active = True
+                full = self._full
+
+        if leader:
+            full.wait(self.max_wait)
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                self._full = threading.Event()
+                self._leader_active = False
+            self._flush(batch)
+
+        return future.result()
+
+    def _flush(self, batch):
+        keys = list(batch)
+        try:
+            values = self.fetch_many(keys)
+        except Exception as e:
+            for future in batch.values():
+                future.set_exception(e)
+            return
+
+        with self._lock:
+            self.batches += 1
+            self.fetched += len(keys)
+        for key, value in zip(keys, values):
+            batch[key].set_result(value)
+        for key in keys[len(values):]:
+            batch[key].set_result(None)
+
+    def stats(self):
+        """Сколько одиночных запросов пришло и во сколько пакетов они свернулись"""
+        with self._lock:
+            return {
+                'requested': self.requested,
+                'fetched': self.fetched,
+                'batches': self.batches,
+                'avg_batch': round(self.fetched / self.batches, 1) if self.batches else 0.0,
+            }
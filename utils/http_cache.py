@@ -0,0 +1,96 @@
+# utils/http_cache.py
+"""Кэш ответов внешних API на диске
+
+Ключ записи - sha256 от (эндпоинт, отсортированные параметры), файл лежит
+в <каталог>/<первые 2 символа ключа>/<ключ>.json. Запись: статус, тело
+(JSON), ETag/Last-Modified для перепроверки и время сохранения для TTL.
+Запись на диск атомарна (временный файл + os.replace), поэтому кэш можно
+использовать из нескольких потоков и процессов.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+class ResponseCache:
+    """Кэш JSON-ответов с TTL на диске"""
+
+    def __init__(self, directory, ttl):
+        self.directory = directory
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    @staticmethod
+    def key(endpoint, params=None):
+        """Ключ запроса: одинаковые запросы дают одинаковый ключ"""
+        payload = json.dumps([endpoint, sorted((params or {}).items())], separators=(',', ':'), default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f'{key}.json')
+
+    def get(self, endpoint, params=None):
+        """Запись для запроса или None"""
+        try:
+            with open(self._path(self.key(endpoint, params)), encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            entry = None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return entry
+
+    def is_fresh(self, entry):
+        return time.time() - entry.get('stored_at', 0) < self.ttl
+
+    def put(self, endpoint, params, status, body, etag=None, last_modified=None):
+        """Сохранить ответ (перезаписывает прежний)"""
+        entry = {
+            'endpoint': endpoint,
+            'params': params,
+            'status': status,
+            'etag': etag,
+            'last_modified': last_modified,
+            'stored_at': time.time(),
+            'body': body,
+        }
+        path = self._path(self.key(endpoint, params))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        with self._lock:
+            self.writes += 1
+        return entry
+
+    def touch(self, entry):
+        """Ответ подтвержден сервером (304) - продлить TTL записи"""
+        return self.put(entry['endpoint'], entry['params'], entry['status'], entry['body'],
+                        entry.get('etag'), entry.get('last_modified'))
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'directory': self.directory,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'writes': self.writes,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            }
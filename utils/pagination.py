@@ -0,0 +1,64 @@
+# utils/pagination.py
+"""Непрозрачные курсоры для keyset-пагинации"""
+import base64
+import json
+
+
+def encode_cursor(direction, key):
+    """
+    Упаковать позицию страницы в строку для URL
+
+    Args:
+        direction (str): 'next' - страница после key, 'prev' - до key
+        key (list): Значения ключа сортировки последней/первой строки
+    """
+    payload = json.dumps({'d': direction, 'k': list(key)}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Распаковать курсор: (direction, key) или None, если курсор битый"""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        direction, key = payload['d'], payload['k']
+    except (ValueError, KeyError, TypeError):
+        return None
+    if direction not in ('next', 'prev') or not isinstance(key, list):
+        return None
+    return direction, key
+
+
+def paginate(fetch_page, cursor, limit, key_of):
+    """
+    Общая логика keyset-страницы
+
+    Args:
+        fetch_page: функция (direction, key, limit) -> строки; для 'prev'
+            строки идут в обратном порядке, для key=None - первая страница
+        cursor (str): Курсор из URL (или None для первой страницы)
+        limit (int): Размер страницы
+        key_of: функция строка -> список значений ключа сортировки
+
+    Returns:
+        tuple: (строки страницы, курсор следующей, курсор предыдущей)
+    """
+    decoded = decode_cursor(cursor)
+    direction, key = decoded if decoded else ('next', None)
+
+    # Берем на одну строку больше, чтобы узнать, есть ли еще страница
+    rows = fetch_page(direction, key, limit + 1) or []
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    if direction == 'prev':
+        rows.reverse()
+        has_next, has_prev = True, has_more
+    else:
+        has_next, has_prev = has_more, key is not None
+
+    next_cursor = encode_cursor('next', key_of(rows[-1])) if rows and has_next else None
+    prev_cursor = encode_cursor('prev', key_of(rows[0])) if rows and has_prev else None
+    return rows, next_cursor, prev_cursor
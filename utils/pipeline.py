@@ -0,0 +1,180 @@
+# utils/pipeline.py
+"""Потоковый конвейер из стадий с ограниченными очередями между ними
+
+Каждая стадия работает в своих потоках и берет элементы из входной очереди
+ограниченного размера: если следующая стадия не успевает, очередь перед
+ней заполняется и предыдущая стадия ждет (backpressure). Поэтому общая
+скорость конвейера равна скорости самой медленной стадии, а память не
+растет. По счетчикам стадий (stats) видно, какая из них узкое место.
+"""
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Маркер конца потока: каждый поток стадии получает свой
+_DONE = object()
+
+
+class Stage:
+    """Стадия конвейера
+
+    function(item) возвращает итерируемое с результатами (0, 1 или много
+    элементов - они уходят в следующую стадию). Если задан batch_size,
+    function получает список до batch_size элементов: пачка отправляется,
+    когда набралась или когда новых элементов нет max_wait секунд.
+    Исключение в function считается ошибкой элемента (пачки): оно
+    логируется, элемент пропускается, конвейер продолжает работу.
+    """
+
+    def __init__(self, name, function, workers=1, batch_size=None, max_wait=1.0):
+        self.name = name
+        self.function = function
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+
+        self._lock = threading.Lock()
+        self.items_in = 0
+        self.items_out = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+
+    def process(self, item, emit):
+        """Обработать элемент (пачку) и передать результаты в emit"""
+        started = time.perf_counter()
+        produced = 0
+        try:
+            for result in self.function(item) or ():
+                emit(result)
+                produced += 1
+            failed = 0
+        except Exception as e:
+            logger.error(f"❌ Pipeline stage {self.name} failed: {e}")
+            failed = 1
+        with self._lock:
+            self.items_in += len(item) if self.batch_size else 1
+            self.items_out += produced
+            self.errors += failed
+            self.busy_seconds += time.perf_counter() - started
+
+    def stats(self, elapsed):
+        with self._lock:
+            return {
+                'stage': self.name,
+                'workers': self.workers,
+                'items_in': self.items_in,
+                'items_out': self.items_out,
+                'errors': self.errors,
+                'rate': round(self.items_in / elapsed, 2) if elapsed > 0 else 0.0,
+                # Доля времени, которую потоки стадии были заняты работой (а не ждали очередь)
+                'utilization': round(self.busy_seconds / (elapsed * self.workers), 3) if elapsed > 0 else 0.0,
+            }
+
+
+class Pipeline:
+    """Источник -> стадия 1 -> ... -> стадия N, все стадии работают одновременно
+
+    Пример:
+        pipeline = Pipeline([
+            Stage('fetch', fetch, workers=4),
+            Stage('write', write_batch, batch_size=50),
+        ], queue_size=100)
+        stats = pipeline.run(ids)
+    """
+
+    def __init__(self, stages, queue_size=100):
+        self.stages = stages
+        self.queue_size = queue_size
+        self._started = None
+        self._finished = None
+
+    def run(self, source):
+        """
+        Прогнать все элементы источника через стадии
+
+        Returns:
+            list[dict]: Счетчики по стадиям (см. stats)
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        remaining = [stage.workers for stage in self.stages]
+        remaining_lock = threading.Lock()
+
+        def finish_worker(index):
+            # Последний поток стадии закрывает вход следующей
+            with remaining_lock:
+                remaining[index] -= 1
+                last = remaining[index] == 0
+            if last and index + 1 < len(self.stages):
+                for _ in range(self.stages[index + 1].workers):
+                    queues[index + 1].put(_DONE)
+
+        def worker(index):
+            stage = self.stages[index]
+            inbox = queues[index]
+            emit = queues[index + 1].put if index + 1 < len(self.stages) else (lambda result: None)
+            try:
+                if stage.batch_size:
+                    self._run_batches(stage, inbox, emit)
+                else:
+                    while True:
+                        item = inbox.get()
+                        if item is _DONE:
+                            break
+                        stage.process(item, emit)
+            finally:
+                finish_worker(index)
+
+        def feed():
+            try:
+                for item in source:
+                    queues[0].put(item)
+            except Exception as e:
+                logger.error(f"❌ Pipeline source failed: {e}")
+            finally:
+                for _ in range(self.stages[0].workers):
+                    queues[0].put(_DONE)
+
+        self._started = time.perf_counter()
+        self._finished = None
+        threads = [threading.Thread(target=feed, name='pipeline-source', daemon=True)]
+        for index, stage in enumerate(self.stages):
+            threads.extend(
+                threading.Thread(target=worker, args=(index,), name=f'pipeline-{stage.name}-{n}', daemon=True)
+                for n in range(stage.workers)
+            )
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self._finished = time.perf_counter()
+        return self.stats()
+
+    @staticmethod
+    def _run_batches(stage, inbox, emit):
+        """Поток стадии с пачками: копит элементы до batch_size или паузы max_wait"""
+        batch = []
+        while True:
+            try:
+                item = inbox.get(timeout=stage.max_wait) if batch else inbox.get()
+            except queue.Empty:
+                stage.process(batch, emit)
+                batch = []
+                continue
+            if item is _DONE:
+                break
+            batch.append(item)
+            if len(batch) >= stage.batch_size:
+                stage.process(batch, emit)
+                batch = []
+        if batch:
+            stage.process(batch, emit)
+
+    def stats(self):
+        """Счетчики стадий: сколько элементов принято/отдано, скорость и загрузка"""
+        if self._started is None:
+            return []
+        elapsed = (self._finished or time.perf_counter()) - self._started
+        return [stage.stats(elapsed) for stage in self.stages]
@@ -0,0 +1,67 @@
+# utils/progress.py
+"""Прогресс длинных фоновых прогонов: доля выполненного, скорость и ETA в лог"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def format_duration(seconds):
+    """Длительность в виде 1h02m, 3m05s или 12s"""
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds}s"
+
+
+class Progress:
+    """Потокобезопасный счетчик прогресса
+
+    advance() вызывают рабочие потоки; строка в лог пишется не чаще раза в
+    log_interval секунд и обязательно на последнем элементе. done может
+    начинаться не с нуля (продолжение прерванного прогона) - скорость и ETA
+    считаются только по элементам, сделанным в этом процессе.
+    """
+
+    def __init__(self, label, total, done=0, log_interval=10.0):
+        self.label = label
+        self.total = total
+        self.done = done
+        self.log_interval = log_interval
+        self._initial = done
+        self._started = time.monotonic()
+        self._logged = self._started
+        self._lock = threading.Lock()
+
+    def advance(self, count=1):
+        with self._lock:
+            self.done += count
+            now = time.monotonic()
+            if now - self._logged < self.log_interval and self.done < self.total:
+                return
+            self._logged = now
+            message = self._format(now)
+        logger.info(message)
+
+    def _format(self, now):
+        elapsed = now - self._started
+        rate = (self.done - self._initial) / elapsed if elapsed > 0 else 0.0
+        percent = 100.0 * self.done / self.total if self.total else 100.0
+        remaining = max(0, self.total - self.done)
+        eta = format_duration(remaining / rate) if rate > 0 else '?'
+        return (f"⏱️ {self.label}: {self.done}/{self.total} ({percent:.1f}%), "
+                f"{rate:.2f}/s, elapsed {format_duration(elapsed)}, ETA {eta}")
+
+    def stats(self):
+        with self._lock:
+            elapsed = time.monotonic() - self._started
+            return {
+                'label': self.label,
+                'done': self.done,
+                'total': self.total,
+                'elapsed_seconds': round(elapsed, 1),
+                'rate': round((self.done - self._initial) / elapsed, 3) if elapsed > 0 else 0.0,
+            }
@@ -0,0 +1,90 @@
+# utils/rate_limit.py
+"""Ограничение частоты запросов к внешним API"""
+import threading
+import time
+
+
+class TokenBucket:
+    """Потокобезопасный token bucket, общий для всех потоков процесса
+
+    Запас пополняется со скоростью rate токенов в секунду до capacity
+    (допустимый всплеск). Каждый запрос забирает токен; если токенов нет,
+    поток ждет ровно столько, сколько нужно до следующего.
+
+    pause() останавливает всех (например, по Retry-After из ответа 429):
+    до конца паузы токены не выдаются никому, после нее запас пустой, и
+    запросы возобновляются с обычной скоростью, а не всплеском.
+    """
+
+    def __init__(self, rate, capacity=None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._lock = threading.Lock()
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+
+        self.acquired = 0
+        self.pauses = 0
+        self.waited_seconds = 0.0
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens=1, timeout=None):
+        """
+        Забрать токены, при необходимости подождав
+
+        Returns:
+            bool: False, если за timeout секунд токены не освободились
+        """
+        started = time.monotonic()
+        deadline = None if timeout is None else started + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                else:
+                    self._refill(now)
+                    if self._tokens >= tokens:
+                        self._tokens -= tokens
+                        self.acquired += tokens
+                        self.waited_seconds += now - started
+                        return True
+                    wait = (tokens - self._tokens) / self.rate
+
+            if deadline is not None:
+                if now + wait > deadline:
+                    return False
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Не выдавать токены seconds секунд (паузы не сокращают друг друга)"""
+        with self._lock:
+            now = time.monotonic()
+            until = now + seconds
+            if until > self._paused_until:
+                self._paused_until = until
+                self.pauses += 1
+            self._tokens = 0.0
+            self._updated = max(now, self._paused_until)
+
+    def stats(self):
+        """Текущий запас и счетчики"""
+        with self._lock:
+            now = time.monotonic()
+            if now >= self._paused_until:
+                self._refill(now)
+            return {
+                'rate': self.rate,
+                'capacity': self.capacity,
+                'tokens': round(self._tokens, 2),
+                'paused_for': round(max(0.0, self._paused_until - now), 3),
+                'acquired': self.acquired,
+                'pauses': self.pauses,
+                'waited_seconds': round(self.waited_seconds, 3),
+            }